@@ -34,7 +34,7 @@ from xorq.expr.udf import ExprScalarUDF
 from xorq.internal import (
     DataFrame,
     SessionConfig,
-    SessionContext,
+    SynchronizedSessionContext,
     Table,
     WindowEvaluator,
     udwf,
@@ -211,7 +211,7 @@ class Backend(SQLBackend, CanCreateCatalog, CanCreateDatabase, CanCreateSchema,
             "datafusion.sql_parser.dialect", "PostgreSQL"
         )
 
-        self.con = SessionContext(config=config)
+        self.con = SynchronizedSessionContext(config=config)
 
         self._register_builtin_udfs()
 
@@ -8,4 +8,5 @@ def test_version():
 
 def test_context_name():
     con = xo.connect()
-    assert "let.SessionContext" in str(type(con.con))
+    # the context may be a python subclass of the native let.SessionContext
+    assert any("let.SessionContext" in str(typ) for typ in type(con.con).__mro__)
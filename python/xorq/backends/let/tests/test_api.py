@@ -1,8 +1,10 @@
 from pathlib import Path
 
+import pyarrow.compute as pc
 import pytest
 
 import xorq as xo
+from xorq.vendor.ibis import udf
 
 
 @pytest.fixture(scope="session")
@@ -108,3 +110,90 @@ def test_with_config(
 
     assert isinstance(result, pd.DataFrame)
     assert len(result) == 10
+
+
+@pytest.fixture
+def result_cache(monkeypatch):
+    import xorq.expr.api as api
+
+    monkeypatch.setattr(xo.options.result_cache, "enabled", True)
+    api.result_cache.clear()
+    yield api.result_cache
+    api.result_cache.clear()
+
+
+@pytest.fixture
+def result_cache_table():
+    import pandas as pd
+
+    con = xo.connect()
+    return con.register(
+        pd.DataFrame({"a": range(100), "b": range(100)}), table_name="result_cache"
+    )
+
+
+def test_result_cache(result_cache, result_cache_table, mocker):
+    import xorq.expr.api as api
+
+    spy = mocker.spy(api, "to_pyarrow_batches")
+    expr = result_cache_table.filter(result_cache_table.a > 10)
+    stats = result_cache.stats()
+
+    first = xo.execute(expr)
+    second = xo.execute(expr)
+    assert xo.to_pyarrow(expr).num_rows == len(first)
+
+    assert first.equals(second)
+    assert spy.call_count == 1
+    assert result_cache.hits == stats["hits"] + 2
+    assert result_cache.misses == stats["misses"] + 1
+
+
+def test_result_cache_max_entry_bytes(
+    result_cache, result_cache_table, monkeypatch, mocker
+):
+    import xorq.expr.api as api
+
+    monkeypatch.setattr(xo.options.result_cache, "max_entry_bytes", 1)
+    spy = mocker.spy(api, "to_pyarrow_batches")
+
+    xo.execute(result_cache_table)
+    xo.execute(result_cache_table)
+
+    assert spy.call_count == 2
+    assert not len(result_cache)
+
+
+def test_result_cache_bypasses_volatile(result_cache, result_cache_table, mocker):
+    import xorq.expr.api as api
+
+    @udf.scalar.pyarrow
+    def add_one(x: int) -> int:
+        return pc.add(x, 1)
+
+    spy = mocker.spy(api, "_get_result_cache_key")
+    for expr in (
+        result_cache_table.mutate(r=xo.random()),
+        result_cache_table.mutate(c=add_one(result_cache_table.a)),
+    ):
+        xo.execute(expr)
+        xo.execute(expr)
+
+    assert not spy.called
+    assert not len(result_cache)
+
+
+def test_result_cache_bypasses_nested_volatile(
+    result_cache, result_cache_table, mocker
+):
+    import xorq.expr.api as api
+
+    con = xo.connect()
+    remote = result_cache_table.mutate(r=xo.random()).into_backend(con)
+    spy = mocker.spy(api, "_get_result_cache_key")
+    for expr in (remote.filter(xo._.a > 10), remote.cache().filter(xo._.a > 10)):
+        xo.execute(expr)
+        xo.execute(expr)
+
+    assert not spy.called
+    assert not len(result_cache)
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import inspect
 import pathlib
+import threading
 import time
 import uuid
 
@@ -9,22 +10,29 @@ import dask
 import pandas as pd
 import pyarrow as pa
 import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import pytest
 import toolz
 
 import xorq as xo
+import xorq.expr.api as api
 import xorq.vendor.ibis.expr.datatypes as dt
 from xorq.backends.conftest import (
     get_storage_uncached,
 )
 from xorq.caching import (
+    IncrementalParquetStorage,
     ParquetSnapshotStorage,
     ParquetStorage,
+    PartitionedParquetStorage,
     SourceSnapshotStorage,
     SourceStorage,
+    TieredStorage,
+    diff_token_trees,
 )
 from xorq.common.utils.inspect_utils import get_python_version_no_dot
 from xorq.common.utils.postgres_utils import (
+    StatsProbe,
     do_analyze,
     get_postgres_n_scans,
 )
@@ -331,7 +339,14 @@ def test_postgres_cache_invalidation(pg, con):
         INSERT INTO "{name}"
         DEFAULT VALUES
         """
+        token = StatsProbe().get_token(dt)
         con.raw_sql(statement)
+        for _attempt in range(20):
+            # give postgres some time to publish the statistics of the insert
+            time.sleep(0.1)
+            if StatsProbe().get_token(dt) != token:
+                return
+        raise AssertionError("the statistics of the insert weren't published")
 
     def assert_n_scans_changes(dt, n_scans_before):
         do_analyze(dt.source, dt.name)
@@ -955,3 +970,269 @@ def test_cache_find_backend(con, cls):
         storage=storage
     )
     assert expr._find_backend().name == "let"
+
+
+@pytest.fixture
+def independent_cached(ls_con, tmp_path):
+    df = pd.DataFrame({"a": range(100), "b": [i % 5 for i in range(100)]})
+    t = ls_con.register(df, table_name="independent")
+    storage = ParquetStorage(source=ls_con, path=tmp_path)
+    inner = t.filter(t.a > 10).cache(storage=storage)
+    left = inner.mutate(c=inner.b * 2).cache(storage=storage)
+    right = t.filter(t.b == 1).cache(storage=storage)
+    return (inner, left, right)
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_cached_nodes_materialized(independent_cached, max_workers, monkeypatch):
+    monkeypatch.setattr(xo.options.cache, "max_workers", max_workers)
+    (inner, left, right) = independent_cached
+    expr = left.join(right, "a")
+
+    assert not any(cached.ls.exists() for cached in independent_cached)
+    actual = xo.execute(expr)
+    assert all(cached.ls.exists() for cached in independent_cached)
+
+    expected = xo.execute(expr.ls.uncached)
+    assert_frame_equal(
+        actual.sort_values("a", ignore_index=True),
+        expected.sort_values("a", ignore_index=True),
+    )
+
+
+def test_independent_cached_nodes_materialized_concurrently(
+    independent_cached, monkeypatch
+):
+    monkeypatch.setattr(xo.options.cache, "max_workers", 2)
+    (_, left, right) = independent_cached
+    # both branches must be in flight at the same time to get past the barrier
+    barrier = threading.Barrier(2, timeout=10)
+    set_default_cached_node = api._set_default_cached_node
+
+    def wait_for_sibling(node):
+        if node in (left.op(), right.op()):
+            barrier.wait()
+        return set_default_cached_node(node)
+
+    monkeypatch.setattr(api, "_set_default_cached_node", wait_for_sibling)
+    (results, timings) = api._materialize_cached_nodes(
+        left.join(right, "a").op(),
+    )
+    assert set(results) == set(timings)
+    assert {left.op(), right.op()} <= set(results)
+
+
+def test_cache_keys_computed_once_per_execution(
+    independent_cached, monkeypatch, mocker
+):
+    from xorq.caching import Cache, key_memo
+
+    monkeypatch.setattr(xo.options.cache, "max_workers", 2)
+    (_, left, right) = independent_cached
+    spy = mocker.spy(Cache, "_get_key")
+
+    with key_memo() as memo:
+        xo.execute(left.join(right, "a"))
+
+    # one key for each of inner, left and right, even from the worker threads
+    assert spy.call_count == 3
+    assert memo.hits > 0
+    assert memo.calls == memo.hits + spy.call_count
+
+
+@pytest.mark.parametrize("con", [xo.connect(), xo.duckdb.connect()])
+def test_partitioned_parquet_storage(con, tmp_path):
+    df = pd.DataFrame(
+        {
+            "a": range(100),
+            "b": [i % 5 for i in range(100)],
+            "c": [str(i) for i in range(100)],
+        }
+    )
+    t = con.create_table("partitioned", df, overwrite=True)
+    storage = PartitionedParquetStorage(
+        source=con,
+        path=tmp_path,
+        partition_by=("b",),
+        sort_by=("a",),
+        row_group_size=7,
+    )
+    uncached = t.filter(t.a > 10)
+    expr = uncached.cache(storage=storage)
+
+    assert not expr.ls.exists()
+    actual = expr.execute()
+    assert expr.ls.exists()
+    assert expr.schema() == uncached.schema()
+    assert_frame_equal(actual.sort_values("a", ignore_index=True), uncached.execute())
+
+    (loc,) = (path for path in tmp_path.iterdir() if path.is_dir())
+    assert sorted(path.name for path in loc.iterdir()) == [
+        "_common_metadata",
+        *(f"b={b}" for b in range(5)),
+    ]
+    metadata = pq.ParquetFile(next(loc.joinpath("b=0").glob("*.parquet"))).metadata
+    assert metadata.num_row_groups == 3
+    assert metadata.row_group(0).column(0).statistics.has_min_max
+
+    filtered = expr.filter(expr.b == 2).execute()
+    assert (filtered.b == 2).all() and len(filtered) == 18
+
+
+@pytest.mark.parametrize("con", [xo.connect(), xo.duckdb.connect()])
+def test_incremental_parquet_storage(con, tmp_path):
+    def make_df(start, stop):
+        return pd.DataFrame(
+            {"ts": range(start, stop), "b": [i % 3 for i in range(start, stop)]}
+        )
+
+    t = con.create_table("incremental", make_df(0, 10), overwrite=True)
+    storage = IncrementalParquetStorage(
+        source=con, watermark="ts", path=tmp_path, partition_by=("b",)
+    )
+    uncached = t.filter(t.b > 0).select("ts", "b", c=t.ts * 2)
+    expr = uncached.cache(storage=storage)
+    key = storage.get_key(uncached)
+
+    actual = expr.execute()
+    assert_frame_equal(actual.sort_values("ts", ignore_index=True), uncached.execute())
+
+    con.create_table("incremental", make_df(0, 15), overwrite=True)
+    assert storage.get_key(uncached) == key
+    actual = expr.execute()
+    assert_frame_equal(actual.sort_values("ts", ignore_index=True), uncached.execute())
+    # only the new rows were computed, into files of their own
+    appended = pq.ParquetDataset(
+        [path for path in storage.storage.get_loc(key).rglob("part-*-*.parquet")]
+    ).read()
+    assert sorted(appended["ts"].to_pylist()) == [10, 11, 13, 14]
+
+    # nothing new: the watermark is read back without scanning the dataset
+    assert storage.storage.append(key, uncached, "ts") == 0
+    assert storage.storage.get_watermark(key, "ts").as_py() == 14
+
+
+def test_incremental_parquet_storage_unsupported(ls_con, tmp_path):
+    t = ls_con.register(pd.DataFrame({"ts": range(10), "b": 0}), table_name="incr")
+    storage = IncrementalParquetStorage(source=ls_con, watermark="ts", path=tmp_path)
+    with pytest.raises(ValueError, match="Aggregate"):
+        t.group_by("b").agg(ts=t.ts.max()).cache(storage=storage).execute()
+    with pytest.raises(ValueError, match="unchanged"):
+        t.mutate(ts=t.ts + 1).cache(storage=storage).execute()
+    with pytest.raises(ValueError, match="window"):
+        t.filter(t.ts > t.ts.mean()).cache(storage=storage).execute()
+
+
+def test_parquet_storage_concurrent_writers_compute_once(ls_con, tmp_path, mocker):
+    storage = ParquetStorage(source=ls_con, path=tmp_path)
+    t = ls_con.register(pd.DataFrame({"a": range(10)}), table_name="concurrent")
+    expr = t.filter(t.a > 3)
+    to_parquet = xo.to_parquet
+    barrier = threading.Barrier(2, timeout=10)
+
+    def slow_to_parquet(*args, **kwargs):
+        time.sleep(0.2)
+        return to_parquet(*args, **kwargs)
+
+    spy = mocker.patch.object(xo, "to_parquet", side_effect=slow_to_parquet)
+
+    def set_default():
+        barrier.wait()
+        return storage.set_default(expr, expr.op())
+
+    threads = [threading.Thread(target=set_default) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert spy.call_count == 1
+    assert storage.exists(expr)
+    # no temporary file is left behind
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == [
+        ".lock",
+        ".parquet",
+        ".sqlite",
+    ]
+
+
+def test_parquet_storage_failed_write_leaves_no_entry(ls_con, tmp_path, mocker):
+    storage = ParquetStorage(source=ls_con, path=tmp_path)
+    t = ls_con.register(pd.DataFrame({"a": range(10)}), table_name="failed_write")
+    expr = t.filter(t.a > 3)
+
+    def failing_to_parquet(expr, path, **kwargs):
+        path.write_bytes(b"truncated")
+        raise KeyboardInterrupt
+
+    mocker.patch.object(xo, "to_parquet", side_effect=failing_to_parquet)
+    with pytest.raises(KeyboardInterrupt):
+        storage.set_default(expr, expr.op())
+
+    assert not storage.exists(expr)
+    assert not list(tmp_path.glob("*parquet*"))
+
+
+@pytest.mark.parametrize("con", [xo.connect(), xo.duckdb.connect()])
+@pytest.mark.parametrize("max_entry_bytes", [None, 1])
+def test_tiered_storage(con, max_entry_bytes, tmp_path, mocker):
+    from xorq.caching import _ParquetStorage
+    from xorq.common.utils.lru_utils import ArrowLRUCache
+
+    df = pd.DataFrame({"a": range(100), "b": [i % 5 for i in range(100)]})
+    t = con.create_table("tiered", df, overwrite=True)
+    storage = TieredStorage(
+        ParquetStorage(source=con, path=tmp_path), max_entry_bytes=max_entry_bytes
+    )
+    uncached = t.filter(t.a > 10)
+    expr = uncached.cache(storage=storage)
+    spy = mocker.spy(_ParquetStorage, "_get")
+    put = mocker.spy(ArrowLRUCache, "put")
+
+    for i in range(2):
+        assert_frame_equal(
+            expr.execute().sort_values("a", ignore_index=True), uncached.execute()
+        )
+
+    assert storage.exists(uncached)
+    assert tmp_path.joinpath(storage.get_key(uncached) + ".parquet").exists()
+    memory = storage.stats()["memory"]
+    if max_entry_bytes is None:
+        # promoted after being written through, then read from memory
+        assert spy.call_count == 1
+        assert (memory["entries"], memory["hits"]) == (1, 1)
+    else:
+        assert spy.call_count == 2
+        assert memory["entries"] == 0
+        # too large by its parquet metadata: never read into memory
+        assert put.call_count == 0
+
+
+def test_explain_key(tmp_path):
+    con = xo.connect()
+    t = con.register(pd.DataFrame({"a": [1, 2], "b": [3, 4]}), "explained")
+    storage = ParquetStorage(source=con, path=tmp_path)
+    expr = t.filter(t.a > 0)
+
+    tree = storage.explain(expr)
+    assert tree.token == storage.get_key(expr)
+    assert not diff_token_trees(tree, storage.explain(expr))
+
+    con.register(pd.DataFrame({"a": [1, 3], "b": [3, 4]}), "explained")
+    (diff,) = diff_token_trees(tree, storage.explain(expr))
+    assert diff.path[-1] == "DatabaseTable(explained)"
+    assert diff.left.value != diff.right.value
+
+
+def test_modification_time_key_prefetched(pg, tmp_path, mocker, monkeypatch):
+    tables = [pg.table(name) for name in ("batting", "awards_players")]
+    expr = tables[0].join(tables[1], "playerID")
+    storage = ParquetStorage(source=pg, path=tmp_path)
+    monkeypatch.setattr(xo.options.cache, "leaf_workers", 1)
+    expected = storage.get_key(expr)
+
+    monkeypatch.setattr(xo.options.cache, "leaf_workers", 8)
+    spy = mocker.spy(StatsProbe, "get_token")
+    assert storage.get_key(expr) == expected
+    # fetched ahead of tokenizing, once per table
+    assert spy.call_count == 2
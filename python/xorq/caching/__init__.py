@@ -1,35 +1,63 @@
 from __future__ import annotations
 
 import contextlib
+import contextvars
 import functools
 import operator
+import os
 import pathlib
+import shutil
+import threading
+import uuid
 from abc import (
     abstractmethod,
 )
+from time import perf_counter
 
 import dask
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import toolz
 from attr import (
     field,
     frozen,
 )
 from attr.validators import (
+    deep_iterable,
     instance_of,
+    optional,
 )
 from public import public
 
 import xorq as xo
 import xorq.common.utils.dask_normalize  # noqa: F401
 import xorq.vendor.ibis.expr.operations as ops
+from xorq.caching.eviction import (
+    CacheIndex,
+    EvictionPolicy,
+    LFUPolicy,  # noqa: F401
+    LRUPolicy,  # noqa: F401
+    TTLPolicy,  # noqa: F401
+)
+from xorq.caching.explain import (
+    TokenNode,
+    diff_token_trees,  # noqa: F401
+    trace_tokens,
+)
 from xorq.common.utils.dask_normalize.dask_normalize_expr import (
     normalize_backend,
     normalize_read,
     normalize_remote_table,
+    prefetch_leaves,
 )
 from xorq.common.utils.dask_normalize.dask_normalize_utils import (
     patch_normalize_token,
 )
+from xorq.common.utils.lock_utils import file_lock
+from xorq.common.utils.logging_utils import get_logger
+from xorq.common.utils.lru_utils import ArrowLRUCache
 from xorq.expr.relations import (
     Read,
     RemoteTable,
@@ -41,6 +69,102 @@ from xorq.vendor.ibis.expr import types as ir
 abs_path_converter = toolz.compose(
     operator.methodcaller("expanduser"), operator.methodcaller("absolute"), pathlib.Path
 )
+str_tuple_field = functools.partial(
+    field,
+    validator=deep_iterable(instance_of(str), instance_of(tuple)),
+    converter=tuple,
+    factory=tuple,
+)
+# strategies patch dask's global normalize_token dispatch while computing a key:
+#     key computations from concurrently materialized expressions must not interleave
+get_key_lock = threading.RLock()
+logger = get_logger(__name__)
+
+
+class KeyMemo:
+    """The cache keys computed within one `key_memo` context"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = {}
+        self.values = {}
+        self.calls = 0
+        self.hits = 0
+        self.elapsed = 0.0
+
+    def get_key(self, cache, expr):
+        with self.lock:
+            self.calls += 1
+            if (key := self.keys.get((cache, expr))) is not None:
+                self.hits += 1
+                return key
+        start = perf_counter()
+        key = cache._get_key(expr)
+        elapsed = perf_counter() - start
+        with self.lock:
+            self.keys[(cache, expr)] = key
+            self.elapsed += elapsed
+        return key
+
+    def memoize(self, key, f):
+        with self.lock:
+            if key in self.values:
+                return self.values[key]
+        value = f()
+        with self.lock:
+            return self.values.setdefault(key, value)
+
+
+_key_memo = contextvars.ContextVar("key_memo", default=None)
+
+
+def key_memoized(key, f):
+    """`f()`, computed once per `key` within a `key_memo` context and on every call outside of one"""
+    if (memo := _key_memo.get()) is None:
+        return f()
+    return memo.memoize(key, f)
+
+
+@contextlib.contextmanager
+def key_memo():
+    """Compute each distinct cache key only once within the context
+
+    Keys are only valid as long as the data they fingerprint doesn't change: the context
+    should be scoped to a single execution. Nested contexts share the outermost memo.
+    """
+    if (memo := _key_memo.get()) is not None:
+        yield memo
+        return
+    memo = KeyMemo()
+    token = _key_memo.set(memo)
+    try:
+        yield memo
+    finally:
+        _key_memo.reset(token)
+        if memo.calls:
+            logger.info(
+                "computed cache keys",
+                calls=memo.calls,
+                hits=memo.hits,
+                elapsed=memo.elapsed,
+            )
+
+
+@contextlib.contextmanager
+def atomic_loc(loc):
+    """A temporary sibling of `loc` that is renamed to `loc` if the block succeeds
+
+    Readers never see a partially written `loc`, even if the writer is killed
+    """
+    tmp = loc.with_name(f".{loc.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, loc)
+    finally:
+        if tmp.is_dir():
+            shutil.rmtree(tmp)
+        elif tmp.exists():
+            tmp.unlink()
 
 
 @frozen
@@ -49,9 +173,28 @@ class CacheStrategy:
     def calc_key(self, expr):
         pass
 
+    def refresh(self, storage, key, expr):
+        """The stored value of `key`, once brought up to date with `expr`"""
+        return storage._get(key)
+
+
+def validate_eviction(storage, attribute, eviction):
+    if eviction is not None and eviction.max_bytes is not None:
+        if not storage.measures_nbytes:
+            raise ValueError(
+                f"{type(storage).__name__} can't tell the size of its entries: "
+                "max_bytes can't be enforced"
+            )
+
 
 @frozen
 class CacheStorage:
+    eviction = field(
+        validator=[optional(instance_of(EvictionPolicy)), validate_eviction],
+        default=None,
+        kw_only=True,
+    )
+
     @abstractmethod
     def key_exists(self, key):
         pass
@@ -68,6 +211,71 @@ class CacheStorage:
     def _drop(self, expr):
         pass
 
+    def get_index_loc(self):
+        """Where to keep the access index, None keeps it in memory"""
+        return None
+
+    @property
+    def measures_nbytes(self):
+        """Whether `get_nbytes` tells the size of the entries"""
+        return False
+
+    def get_nbytes(self, key):
+        return 0
+
+    def get_table_nbytes(self, key):
+        """The size of `key` once read into memory, None if it can't be told without reading it"""
+        return None
+
+    @functools.cached_property
+    def index(self):
+        return CacheIndex(self.get_index_loc())
+
+    def record_hit(self, key):
+        self.index.increment("hits")
+        if not self.index.touch(key):
+            self.index.add(key, self.get_nbytes(key))
+
+    def record_miss(self, key):
+        self.index.increment("misses")
+
+    def record_put(self, key):
+        self.index.add(key, self.get_nbytes(key))
+        self.gc(keep=(key,))
+
+    def gc(self, keep=()):
+        """Evict the entries selected by the eviction policy
+
+        Returns
+        -------
+        tuple[str, ...]
+            The keys of the evicted entries
+        """
+        if self.eviction is None:
+            return ()
+        keys = self.eviction.select(self.index.entries(), keep=keep)
+        for key in keys:
+            self.evict(key)
+        return keys
+
+    def evict(self, key):
+        """Drop the entry of `key` and its table registered with the backend
+
+        The lock file of `key` is left in place: another process may hold
+        a lock on it, and a new file would let a second writer in.
+        """
+        if self.key_exists(key):
+            try:
+                self._drop(key)
+            except Exception:
+                # the table may not be registered by this process
+                logger.debug("table not dropped", key=key, exc_info=True)
+        self.index.remove(key)
+
+    def stats(self):
+        """The number of entries, their size in bytes and the hit rate"""
+        return self.index.stats()
+
 
 @frozen
 class Cache:
@@ -86,34 +294,72 @@ class Cache:
         return self.storage.key_exists(key)
 
     def get_key(self, expr):
+        if (memo := _key_memo.get()) is not None:
+            return memo.get_key(self, expr)
+        return self._get_key(expr)
+
+    def _prepare(self, expr):
         # the order here matters: must check is_cached before calling maybe_prevent_cross_source_caching
         if expr.ls.is_cached and expr.ls.storage.cache is self:
             expr = expr.ls.uncached_one
-        expr = maybe_prevent_cross_source_caching(expr, self)
+        return maybe_prevent_cross_source_caching(expr, self)
+
+    def _get_key(self, expr):
+        expr = self._prepare(expr)
         # FIXME: let strategy solely determine key by giving it key_prefix
-        return self.key_prefix + self.strategy.get_key(expr)
+        with get_key_lock:
+            return self.key_prefix + self.strategy.get_key(expr)
+
+    def explain(self, expr):
+        """The cache key of `expr` with the components it is computed from
+
+        Each component (expressions, tables, reads, backends and UDFs) is
+        reported with its token and the time spent computing it. The key is
+        computed afresh, even within a `key_memo` context.
+
+        Returns
+        -------
+        TokenNode
+            The root has the key as its token, trees of two keys can be
+            compared with `diff_token_trees`
+        """
+        with get_key_lock, trace_tokens() as components:
+            start = perf_counter()
+            key = self._get_key(expr)
+            elapsed = perf_counter() - start
+        return TokenNode(label="key", token=key, elapsed=elapsed, children=components)
+
+    def _refresh(self, key, expr):
+        return self.strategy.refresh(self.storage, key, self._prepare(expr))
 
     def get(self, expr: ir.Expr):
         key = self.get_key(expr)
         if not self.key_exists(key):
+            self.storage.record_miss(key)
             raise KeyError
         else:
-            return self.storage._get(key)
+            self.storage.record_hit(key)
+            return self._refresh(key, expr)
 
     def put(self, expr: ir.Expr, value):
         key = self.get_key(expr)
         if self.key_exists(key):
             raise ValueError
         else:
-            key = self.get_key(expr)
-            return self.storage._put(key, value)
+            result = self.storage._put(key, value)
+            self.storage.record_put(key)
+            return result
 
     def set_default(self, expr: ir.Expr, default):
         key = self.get_key(expr)
         if not self.key_exists(key):
-            return self.storage._put(key, default)
+            self.storage.record_miss(key)
+            result = self.storage._put(key, default)
+            self.storage.record_put(key)
+            return result
         else:
-            return self.storage._get(key)
+            self.storage.record_hit(key)
+            return self._refresh(key, expr)
 
     def drop(self, expr: ir.Expr):
         key = self.get_key(expr)
@@ -121,6 +367,7 @@ class Cache:
             raise KeyError
         else:
             self.storage._drop(key)
+            self.storage.index.remove(key)
 
 
 @frozen
@@ -132,7 +379,10 @@ class ModificationTimeStragegy(CacheStrategy):
 
     def get_key(self, expr: ir.Expr):
         expr = self.replace_remote_table(expr)
-        return self.key_prefix + dask.base.tokenize(expr)
+        with key_memo():
+            # the freshness of each table is asked for concurrently, and reused by tokenize
+            prefetch_leaves(expr)
+            return self.key_prefix + dask.base.tokenize(expr)
 
     @staticmethod
     @functools.cache
@@ -239,6 +489,80 @@ class SnapshotStrategy(CacheStrategy):
             )
 
 
+def _check_incremental(op, watermark):
+    """Raise unless `op` only filters and projects the rows of its tables, keeping `watermark`"""
+    forbidden = (ops.Reduction, ops.WindowFunction, ops.Analytic, ops.Subquery)
+    if isinstance(op, RemoteTable):
+        _check_incremental(op.remote_expr.op(), watermark)
+    elif isinstance(op, (ops.DatabaseTable, ops.InMemoryTable, Read)):
+        if watermark not in op.schema:
+            raise ValueError(f"watermark column {watermark!r} is not in {op.name!r}")
+    elif isinstance(op, ops.Filter):
+        if any(pred.find(forbidden) for pred in op.predicates):
+            raise ValueError(
+                "incremental caching doesn't support aggregates, window functions "
+                "or subqueries in filters"
+            )
+        _check_incremental(op.parent, watermark)
+    elif isinstance(op, ops.Project):
+        if any(value.find(forbidden) for value in op.values.values()):
+            raise ValueError(
+                "incremental caching doesn't support aggregates, window functions "
+                "or subqueries in projections"
+            )
+        value = op.values.get(watermark)
+        if not (isinstance(value, ops.Field) and value.name == watermark):
+            raise ValueError(
+                f"watermark column {watermark!r} must be selected unchanged"
+            )
+        _check_incremental(op.parent, watermark)
+    else:
+        raise ValueError(
+            f"incremental caching only supports filters and projections, not {type(op).__name__}"
+        )
+
+
+@frozen
+class IncrementalStrategy(SnapshotStrategy):
+    """Key expressions like `SnapshotStrategy`, appending the rows past a watermark on every hit
+
+    The watermark column must only ever grow as rows are added to the tables of
+    the expression, which must only filter and project their rows.
+    """
+
+    watermark = field(validator=instance_of(str))
+
+    @staticmethod
+    def normalize_read(read):
+        # unlike a snapshot, appending to the files of a read keeps the key
+        return dask.tokenize._normalize_seq_func(
+            (
+                ("method_name", read.method_name),
+                ("schema", read.schema),
+                ("read_kwargs", read.read_kwargs),
+            )
+        )
+
+    @contextlib.contextmanager
+    def normalization_context(self, expr):
+        with super().normalization_context(expr):
+            with patch_normalize_token(Read, f=self.normalize_read):
+                yield
+
+    def get_key(self, expr: ir.Expr):
+        _check_incremental(expr.op(), self.watermark)
+        tokenized = dask.base.tokenize(self.watermark, super().get_key(expr))
+        return "-".join(("incremental", tokenized))
+
+    def refresh(self, storage, key, expr):
+        if not hasattr(storage, "append"):
+            raise ValueError(
+                f"{type(storage).__name__} doesn't support incremental caching"
+            )
+        storage.append(key, expr, self.watermark)
+        return storage._get(key)
+
+
 @frozen
 class _ParquetStorage(CacheStorage):
     source = field(
@@ -257,16 +581,35 @@ class _ParquetStorage(CacheStorage):
     def get_loc(self, key):
         return self.path.joinpath(key + ".parquet")
 
+    def get_lock_loc(self, key):
+        return self.path.joinpath(f".{key}.lock")
+
     def key_exists(self, key):
         return self.get_loc(key).exists()
 
+    def get_index_loc(self):
+        return self.path.joinpath(".index.sqlite")
+
+    @property
+    def measures_nbytes(self):
+        return True
+
+    def get_nbytes(self, key):
+        return self.get_loc(key).stat().st_size
+
+    def get_table_nbytes(self, key):
+        return get_parquet_nbytes(self.get_loc(key))
+
     def _get(self, key):
         op = self.source.read_parquet(self.get_loc(key), key).op()
         return op
 
     def _put(self, key, value):
-        loc = self.get_loc(key)
-        xo.to_parquet(value.to_expr(), loc)
+        # writers of the same key, in any process, wait for the first one and reuse its result
+        with file_lock(self.get_lock_loc(key)):
+            if not self.key_exists(key):
+                with atomic_loc(self.get_loc(key)) as tmp:
+                    xo.to_parquet(value.to_expr(), tmp)
         return self._get(key)
 
     def _drop(self, key):
@@ -276,6 +619,195 @@ class _ParquetStorage(CacheStorage):
         self.source.drop_table(key)
 
 
+@frozen
+class _PartitionedParquetStorage(CacheStorage):
+    source = field(
+        validator=instance_of(ibis.backends.BaseBackend),
+        factory=xorq.config._backend_init,
+    )
+    path = field(
+        validator=instance_of(pathlib.Path),
+        converter=abs_path_converter,
+        factory=functools.partial(xorq.options.get, "cache.default_path"),
+    )
+    partition_by = str_tuple_field()
+    sort_by = str_tuple_field()
+    row_group_size = field(validator=instance_of(int), default=1_000_000)
+    max_rows_per_file = field(validator=optional(instance_of(int)), default=None)
+    compression = field(validator=instance_of(str), default="zstd")
+    write_statistics = field(validator=instance_of(bool), default=True)
+
+    def __attrs_post_init__(self):
+        self.path.mkdir(exist_ok=True, parents=True)
+
+    def get_loc(self, key):
+        return self.path.joinpath(key)
+
+    def get_lock_loc(self, key):
+        return self.path.joinpath(f".{key}.lock")
+
+    def get_schema_loc(self, key):
+        # no .parquet extension: readers of the dataset skip it
+        return self.get_loc(key).joinpath("_common_metadata")
+
+    def key_exists(self, key):
+        # the schema is written last
+        return self.get_schema_loc(key).exists()
+
+    def get_index_loc(self):
+        return self.path.joinpath(".index.sqlite")
+
+    @property
+    def measures_nbytes(self):
+        return True
+
+    def get_nbytes(self, key):
+        return sum(
+            path.stat().st_size
+            for path in self.get_loc(key).rglob("*")
+            if path.is_file()
+        )
+
+    def get_table_nbytes(self, key):
+        # the partition columns aren't stored in the files
+        return sum(map(get_parquet_nbytes, self.get_loc(key).rglob("*.parquet")))
+
+    def _read_dataset(self, key):
+        loc = self.get_loc(key)
+        match self.source.name:
+            case "let" | "datafusion":
+                return self.source.read_parquet(
+                    loc,
+                    key,
+                    table_partition_cols=[
+                        (name, "string") for name in self.partition_by
+                    ],
+                )
+            case "duckdb":
+                return self.source.read_parquet(
+                    loc.joinpath("**", "*.parquet"),
+                    key,
+                    hive_partitioning=bool(self.partition_by),
+                )
+            case _:
+                return self.source.read_parquet(loc, key)
+
+    def _get(self, key):
+        schema = ibis.Schema.from_pyarrow(pq.read_schema(self.get_schema_loc(key)))
+        t = self._read_dataset(key)
+        if t.schema() == schema:
+            return t.op()
+        # hive partition columns are read back as strings and moved last
+        return t.select(
+            *(
+                t[name] if t[name].type() == typ else t[name].cast(typ).name(name)
+                for name, typ in schema.items()
+            )
+        ).op()
+
+    def _put(self, key, value):
+        with file_lock(self.get_lock_loc(key)):
+            if not self.key_exists(key):
+                loc = self.get_loc(key)
+                if loc.exists():
+                    # left behind by a writer that didn't write atomically
+                    shutil.rmtree(loc)
+                with atomic_loc(loc) as tmp:
+                    self._write_dataset(value, tmp)
+        return self._get(key)
+
+    def _write_dataset(self, value, loc):
+        expr = value.to_expr()
+        if self.sort_by:
+            expr = expr.order_by(self.sort_by)
+        with xo.to_pyarrow_batches(expr) as reader:
+            self._write_batches(reader, loc)
+            pq.write_metadata(reader.schema, loc.joinpath("_common_metadata"))
+
+    def _write_batches(self, reader, loc, basename_template="part-{i}.parquet"):
+        file_options = ds.ParquetFileFormat().make_write_options(
+            compression=self.compression,
+            write_statistics=self.write_statistics,
+        )
+        ds.write_dataset(
+            reader,
+            loc,
+            format="parquet",
+            file_options=file_options,
+            partitioning=list(self.partition_by) or None,
+            partitioning_flavor="hive" if self.partition_by else None,
+            basename_template=basename_template,
+            min_rows_per_group=self.row_group_size,
+            max_rows_per_group=self.row_group_size,
+            max_rows_per_file=self.max_rows_per_file,
+            # writing with several threads doesn't keep the order of the rows
+            use_threads=not self.sort_by,
+        )
+
+    def get_watermark_loc(self, key):
+        return self.get_loc(key).joinpath("_watermark")
+
+    def get_watermark(self, key, watermark):
+        """The greatest value of the `watermark` column that is stored, as a pyarrow scalar"""
+        loc = self.get_watermark_loc(key)
+        mtimes = (path.stat().st_mtime for path in self.get_loc(key).rglob("*.parquet"))
+        # files appended after the watermark was written, by an append that didn't finish
+        if loc.exists() and loc.stat().st_mtime >= max(mtimes, default=0):
+            return pq.read_table(loc)[watermark][0]
+        dataset = ds.dataset(self.get_loc(key), format="parquet")
+        return pc.max(dataset.to_table(columns=[watermark])[watermark])
+
+    def append(self, key, expr, watermark):
+        """Append the rows of `expr` past the stored watermark
+
+        Returns
+        -------
+        int
+            The number of rows appended
+        """
+        loc = self.get_loc(key)
+        with file_lock(self.get_lock_loc(key)):
+            last = self.get_watermark(key, watermark)
+            if last.is_valid:
+                column = expr[watermark]
+                expr = expr.filter(column > ibis.literal(last.as_py(), column.type()))
+            (maxes, counts) = ([], [])
+
+            def gen(reader):
+                for batch in reader:
+                    if batch.num_rows:
+                        maxes.append(pc.max(batch[watermark]).as_py())
+                        counts.append(batch.num_rows)
+                        yield batch
+
+            tmp = loc.with_name(f".{loc.name}.{uuid.uuid4().hex}.tmp")
+            try:
+                with xo.to_pyarrow_batches(expr) as reader:
+                    schema = reader.schema
+                    self._write_batches(
+                        pa.RecordBatchReader.from_batches(schema, gen(reader)),
+                        tmp,
+                        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                    )
+                # each file is complete once it's moved into the dataset
+                for path in tmp.rglob("*.parquet"):
+                    dst = loc.joinpath(path.relative_to(tmp))
+                    dst.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(path, dst)
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+            if maxes:
+                field = schema.field(watermark)
+                table = pa.table({watermark: pa.array([max(maxes)], type=field.type)})
+                with atomic_loc(self.get_watermark_loc(key)) as wm_tmp:
+                    pq.write_table(table, wm_tmp)
+        return sum(counts)
+
+    def _drop(self, key):
+        shutil.rmtree(self.get_loc(key))
+        self.source.drop_table(key)
+
+
 # named with underscore prefix until we swap out SourceStorage
 @frozen
 class _SourceStorage(CacheStorage):
@@ -298,6 +830,98 @@ class _SourceStorage(CacheStorage):
         self.source.drop_table(key)
 
 
+# backends that can register an Arrow table without copying it out of the process
+in_process_backend_names = ("let", "datafusion", "duckdb")
+
+
+def register_arrow_table(source, table, name):
+    match source.name:
+        case "let" | "datafusion":
+            return source.register(table, table_name=name)
+        case "duckdb":
+            # replace the view of the tier behind
+            source.drop_view(name, force=True)
+            source.con.register(name, table)
+            return source.table(name)
+        case _:
+            raise ValueError(source.name)
+
+
+def get_parquet_nbytes(path):
+    """The uncompressed size of the row groups of the parquet file at `path`"""
+    metadata = pq.read_metadata(path)
+    return sum(
+        metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups)
+    )
+
+
+@frozen
+class _TieredStorage(CacheStorage):
+    """An in-memory tier of Arrow tables in front of `storage`
+
+    Entries are promoted to memory when read and written through to `storage`.
+    The memory tier is only used when the source is an in-process backend.
+    """
+
+    storage = field(validator=instance_of(CacheStorage))
+    max_bytes = field(validator=instance_of(int), default=256 * 2**20)
+    max_entry_bytes = field(validator=optional(instance_of(int)), default=None)
+
+    @property
+    def source(self):
+        return self.storage.source
+
+    @functools.cached_property
+    def tables(self):
+        return ArrowLRUCache(self.max_bytes, self.max_entry_bytes)
+
+    @property
+    def has_memory_tier(self):
+        return self.source.name in in_process_backend_names
+
+    def key_exists(self, key):
+        return key in self.tables or self.storage.key_exists(key)
+
+    def get_index_loc(self):
+        return self.storage.get_index_loc()
+
+    @property
+    def measures_nbytes(self):
+        return self.storage.measures_nbytes
+
+    def get_nbytes(self, key):
+        return self.storage.get_nbytes(key)
+
+    def promote(self, key, op):
+        """Keep the table of `op`, read from the tier behind, in memory"""
+        if not self.has_memory_tier:
+            return op
+        # don't read what is known to be too large to be kept
+        nbytes = self.storage.get_table_nbytes(key)
+        if nbytes is not None and not self.tables.fits(nbytes):
+            return op
+        table = xo.to_pyarrow(op.to_expr())
+        if not self.tables.put(key, table):
+            return op
+        return register_arrow_table(self.source, table, key).op()
+
+    def _get(self, key):
+        if (table := self.tables.get(key)) is None:
+            return self.promote(key, self.storage._get(key))
+        return register_arrow_table(self.source, table, key).op()
+
+    def _put(self, key, value):
+        return self.promote(key, self.storage._put(key, value))
+
+    def _drop(self, key):
+        self.tables.pop(key)
+        if self.storage.key_exists(key):
+            self.storage._drop(key)
+
+    def stats(self):
+        return {**super().stats(), "memory": self.tables.stats()}
+
+
 ###############
 ###############
 # drop in replacements for previous versions
@@ -331,6 +955,9 @@ class ParquetSnapshotStorage:
     path : pathlib.Path
         The directory where Parquet files will be stored. Defaults to
         xorq.options.cache.default_path.
+    eviction : EvictionPolicy, optional
+        Which entries to evict, and when. Their accesses are indexed in `path`,
+        shared by every process using it.
     """
 
     source = field(
@@ -342,6 +969,7 @@ class ParquetSnapshotStorage:
         converter=abs_path_converter,
         factory=functools.partial(xorq.options.get, "cache.default_path"),
     )
+    eviction = field(validator=optional(instance_of(EvictionPolicy)), default=None)
     cache = field(validator=instance_of(Cache), init=False)
 
     def __attrs_post_init__(self):
@@ -350,6 +978,7 @@ class ParquetSnapshotStorage:
             storage=_ParquetStorage(
                 self.source,
                 self.path,
+                eviction=self.eviction,
             ),
         )
         object.__setattr__(self, "cache", cache)
@@ -389,6 +1018,9 @@ class ParquetStorage:
     path : pathlib.Path
         The directory where Parquet files will be stored. Defaults to
         xorq.options.cache.default_path.
+    eviction : EvictionPolicy, optional
+        Which entries to evict, and when. Their accesses are indexed in `path`,
+        shared by every process using it.
     """
 
     source = field(
@@ -400,6 +1032,7 @@ class ParquetStorage:
         converter=abs_path_converter,
         factory=functools.partial(xorq.options.get, "cache.default_path"),
     )
+    eviction = field(validator=optional(instance_of(EvictionPolicy)), default=None)
     cache = field(validator=instance_of(Cache), init=False)
 
     def __attrs_post_init__(self):
@@ -408,6 +1041,154 @@ class ParquetStorage:
             storage=_ParquetStorage(
                 self.source,
                 self.path,
+                eviction=self.eviction,
+            ),
+        )
+        object.__setattr__(self, "cache", cache)
+
+    __getattr__ = chained_getattr
+
+
+@public
+@frozen
+class PartitionedParquetStorage:
+    """Storage that caches expressions as partitioned Parquet datasets using a modification time strategy.
+
+    Like `ParquetStorage`, but each expression is written as a directory of Parquet
+    files, optionally hive-partitioned by some of its columns, by several writer
+    threads. The dataset is registered as a single table, so that filters on the
+    partition columns and the row group statistics can prune what is read.
+
+    Parameters
+    ----------
+    source : ibis.backends.BaseBackend
+        The backend to use for execution. Defaults to xorq's default backend.
+    path : pathlib.Path
+        The directory where the datasets will be stored. Defaults to
+        xorq.options.cache.default_path.
+    partition_by : tuple[str, ...]
+        The columns to hive-partition the dataset by.
+    sort_by : tuple[str, ...]
+        The columns to sort the dataset by before writing it.
+    row_group_size : int
+        The number of rows in each row group.
+    max_rows_per_file : int, optional
+        The maximum number of rows in each file, unbounded by default.
+    compression : str
+        The Parquet compression codec.
+    write_statistics : bool
+        Whether to write the row group statistics.
+    eviction : EvictionPolicy, optional
+        Which entries to evict, and when. Their accesses are indexed in `path`,
+        shared by every process using it.
+    """
+
+    source = field(
+        validator=instance_of(ibis.backends.BaseBackend),
+        factory=xorq.config._backend_init,
+    )
+    path = field(
+        validator=instance_of(pathlib.Path),
+        converter=abs_path_converter,
+        factory=functools.partial(xorq.options.get, "cache.default_path"),
+    )
+    partition_by = str_tuple_field()
+    sort_by = str_tuple_field()
+    row_group_size = field(validator=instance_of(int), default=1_000_000)
+    max_rows_per_file = field(validator=optional(instance_of(int)), default=None)
+    compression = field(validator=instance_of(str), default="zstd")
+    write_statistics = field(validator=instance_of(bool), default=True)
+    eviction = field(validator=optional(instance_of(EvictionPolicy)), default=None)
+    cache = field(validator=instance_of(Cache), init=False)
+
+    def __attrs_post_init__(self):
+        cache = Cache(
+            strategy=ModificationTimeStragegy(),
+            storage=_PartitionedParquetStorage(
+                self.source,
+                self.path,
+                partition_by=self.partition_by,
+                sort_by=self.sort_by,
+                row_group_size=self.row_group_size,
+                max_rows_per_file=self.max_rows_per_file,
+                compression=self.compression,
+                write_statistics=self.write_statistics,
+                eviction=self.eviction,
+            ),
+        )
+        object.__setattr__(self, "cache", cache)
+
+    __getattr__ = chained_getattr
+
+
+@public
+@frozen
+class IncrementalParquetStorage:
+    """Storage that caches expressions as Parquet datasets, appending new rows on every hit.
+
+    Like `PartitionedParquetStorage`, but the key doesn't change as rows are added
+    to the tables of the expression: each time the cached expression is executed,
+    only the rows whose `watermark` is greater than the greatest stored one are
+    computed and appended to the dataset. The watermark column must only ever
+    grow, and the expression may only filter and project rows: anything else
+    raises a ValueError.
+
+    Parameters
+    ----------
+    source : ibis.backends.BaseBackend
+        The backend to use for execution. Defaults to xorq's default backend.
+    watermark : str
+        The monotonically increasing column that tells new rows apart.
+    path : pathlib.Path
+        The directory where the datasets will be stored. Defaults to
+        xorq.options.cache.default_path.
+    partition_by : tuple[str, ...]
+        The columns to hive-partition the dataset by, not including `watermark`.
+    row_group_size : int
+        The number of rows in each row group.
+    max_rows_per_file : int, optional
+        The maximum number of rows in each file, unbounded by default.
+    compression : str
+        The Parquet compression codec.
+    write_statistics : bool
+        Whether to write the row group statistics.
+    eviction : EvictionPolicy, optional
+        Which entries to evict, and when. Their accesses are indexed in `path`,
+        shared by every process using it.
+    """
+
+    source = field(
+        validator=instance_of(ibis.backends.BaseBackend),
+        factory=xorq.config._backend_init,
+    )
+    watermark = field(validator=instance_of(str), kw_only=True)
+    path = field(
+        validator=instance_of(pathlib.Path),
+        converter=abs_path_converter,
+        factory=functools.partial(xorq.options.get, "cache.default_path"),
+    )
+    partition_by = str_tuple_field()
+    row_group_size = field(validator=instance_of(int), default=1_000_000)
+    max_rows_per_file = field(validator=optional(instance_of(int)), default=None)
+    compression = field(validator=instance_of(str), default="zstd")
+    write_statistics = field(validator=instance_of(bool), default=True)
+    eviction = field(validator=optional(instance_of(EvictionPolicy)), default=None)
+    cache = field(validator=instance_of(Cache), init=False)
+
+    def __attrs_post_init__(self):
+        if self.watermark in self.partition_by:
+            raise ValueError("the watermark column can't be a partition column")
+        cache = Cache(
+            strategy=IncrementalStrategy(self.watermark),
+            storage=_PartitionedParquetStorage(
+                self.source,
+                self.path,
+                partition_by=self.partition_by,
+                row_group_size=self.row_group_size,
+                max_rows_per_file=self.max_rows_per_file,
+                compression=self.compression,
+                write_statistics=self.write_statistics,
+                eviction=self.eviction,
             ),
         )
         object.__setattr__(self, "cache", cache)
@@ -429,17 +1210,24 @@ class SourceStorage:
     ----------
     source : ibis.backends.BaseBackend
         The backend to use for both execution and storage. Defaults to xorq's default backend.
+    eviction : EvictionPolicy, optional
+        Which entries to evict, and when. Their accesses are indexed in memory:
+        the eviction order and the stats only cover the current process, while
+        the cached tables outlive it. The size of the tables isn't known, so
+        `max_bytes` isn't supported.
     """
 
     source = field(
         validator=instance_of(ibis.backends.BaseBackend),
         factory=xorq.config._backend_init,
     )
+    eviction = field(validator=optional(instance_of(EvictionPolicy)), default=None)
     cache = field(validator=instance_of(Cache), init=False)
 
     def __attrs_post_init__(self):
         cache = Cache(
-            strategy=ModificationTimeStragegy(), storage=_SourceStorage(self.source)
+            strategy=ModificationTimeStragegy(),
+            storage=_SourceStorage(self.source, eviction=self.eviction),
         )
         object.__setattr__(self, "cache", cache)
 
@@ -461,16 +1249,79 @@ class SourceSnapshotStorage:
     ----------
     source : ibis.backends.BaseBackend
         The backend to use for both execution and storage. Defaults to xorq's default backend.
+    eviction : EvictionPolicy, optional
+        Which entries to evict, and when. Their accesses are indexed in memory:
+        the eviction order and the stats only cover the current process, while
+        the cached tables outlive it. The size of the tables isn't known, so
+        `max_bytes` isn't supported.
     """
 
     source = field(
         validator=instance_of(ibis.backends.BaseBackend),
         factory=xorq.config._backend_init,
     )
+    eviction = field(validator=optional(instance_of(EvictionPolicy)), default=None)
+    cache = field(validator=instance_of(Cache), init=False)
+
+    def __attrs_post_init__(self):
+        cache = Cache(
+            strategy=SnapshotStrategy(),
+            storage=_SourceStorage(self.source, eviction=self.eviction),
+        )
+        object.__setattr__(self, "cache", cache)
+
+    __getattr__ = chained_getattr
+
+
+@public
+@frozen
+class TieredStorage:
+    """Storage that keeps the most recently used entries of another storage in memory.
+
+    Cached results are kept as Arrow tables, up to `max_bytes`, in front of `storage`,
+    so that reading a hit doesn't go back to disk or to the source backend. Entries are
+    promoted to memory when read and written through to `storage`, which also
+    determines the invalidation strategy. The memory tier is only used when the
+    source of `storage` is an in-process backend (let, datafusion or duckdb).
+
+    Parameters
+    ----------
+    storage : ParquetStorage | ParquetSnapshotStorage | PartitionedParquetStorage | SourceStorage | SourceSnapshotStorage
+        The storage behind the memory tier.
+    max_bytes : int
+        The maximum total size of the tables in memory, the least recently used
+        are evicted beyond it.
+    max_entry_bytes : int, optional
+        Tables larger than this are only kept by `storage`.
+    """
+
+    storage = field(
+        validator=instance_of(
+            (
+                ParquetSnapshotStorage,
+                ParquetStorage,
+                PartitionedParquetStorage,
+                SourceStorage,
+                SourceSnapshotStorage,
+            )
+        )
+    )
+    max_bytes = field(validator=instance_of(int), default=256 * 2**20)
+    max_entry_bytes = field(validator=optional(instance_of(int)), default=None)
     cache = field(validator=instance_of(Cache), init=False)
 
     def __attrs_post_init__(self):
-        cache = Cache(strategy=SnapshotStrategy(), storage=_SourceStorage(self.source))
+        inner = self.storage.cache
+        cache = Cache(
+            strategy=inner.strategy,
+            storage=_TieredStorage(
+                inner.storage,
+                max_bytes=self.max_bytes,
+                max_entry_bytes=self.max_entry_bytes,
+                eviction=inner.storage.eviction,
+            ),
+            key_prefix=inner.key_prefix,
+        )
         object.__setattr__(self, "cache", cache)
 
     __getattr__ = chained_getattr
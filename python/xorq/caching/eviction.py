@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import atexit
+import contextlib
+import sqlite3
+import threading
+import time
+import weakref
+from abc import (
+    ABC,
+    abstractmethod,
+)
+
+from attr import (
+    field,
+    frozen,
+)
+from attr.validators import (
+    instance_of,
+    optional,
+)
+from public import public
+
+
+@frozen
+class CacheEntry:
+    key = field(validator=instance_of(str))
+    nbytes = field(validator=instance_of(int))
+    created = field(validator=instance_of(float))
+    accessed = field(validator=instance_of(float))
+    hits = field(validator=instance_of(int))
+
+
+persistent_indexes = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_indexes():
+    for index in tuple(persistent_indexes):
+        with contextlib.suppress(sqlite3.Error):
+            index.flush()
+
+
+class CacheIndex:
+    """Sidecar sqlite index of the entries of a storage and how they are accessed
+
+    An index without a path lives in memory and only covers the current process.
+    Hits are buffered in memory and written in a single transaction at most
+    every `flush_interval` seconds, and whenever the entries or stats are read.
+    """
+
+    def __init__(self, path=None, flush_interval=5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        # key -> (accessed, hits) and name -> count, not yet written
+        self.pending_touches = {}
+        self.pending_counts = {}
+        self.known = set()
+        self.flushed = time.monotonic()
+        self.con = sqlite3.connect(
+            ":memory:" if path is None else str(path),
+            timeout=30,
+            check_same_thread=False,
+        )
+        with self.transaction() as cur:
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, nbytes INTEGER, created REAL, accessed REAL, hits INTEGER"
+                ")"
+            )
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)"
+            )
+        if path is not None:
+            persistent_indexes.add(self)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.lock, self.con:
+            yield self.con.cursor()
+
+    def add(self, key, nbytes):
+        now = time.time()
+        with self.transaction() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, 0)",
+                (key, nbytes, now, now),
+            )
+            self.pending_touches.pop(key, None)
+            self.known.add(key)
+
+    def touch(self, key):
+        """Record an access to `key`, returning whether it is indexed"""
+        with self.lock:
+            if key not in self.known:
+                row = self.con.execute(
+                    "SELECT 1 FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return False
+                self.known.add(key)
+            (_, hits) = self.pending_touches.get(key, (None, 0))
+            self.pending_touches[key] = (time.time(), hits + 1)
+        self.maybe_flush()
+        return True
+
+    def remove(self, key):
+        with self.transaction() as cur:
+            cur.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.pending_touches.pop(key, None)
+            self.known.discard(key)
+
+    def increment(self, name):
+        with self.lock:
+            self.pending_counts[name] = self.pending_counts.get(name, 0) + 1
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if time.monotonic() - self.flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered hits and counters"""
+        with self.transaction() as cur:
+            cur.executemany(
+                "UPDATE entries SET accessed = max(accessed, ?), hits = hits + ? WHERE key = ?",
+                (
+                    (accessed, hits, key)
+                    for key, (accessed, hits) in self.pending_touches.items()
+                ),
+            )
+            cur.executemany(
+                "INSERT INTO counters VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                tuple(self.pending_counts.items()),
+            )
+            self.pending_touches.clear()
+            self.pending_counts.clear()
+            self.flushed = time.monotonic()
+
+    def entries(self):
+        self.flush()
+        with self.transaction() as cur:
+            rows = cur.execute("SELECT * FROM entries").fetchall()
+        return tuple(CacheEntry(*row) for row in rows)
+
+    def stats(self):
+        self.flush()
+        with self.transaction() as cur:
+            (entries, nbytes) = cur.execute(
+                "SELECT count(*), coalesce(sum(nbytes), 0) FROM entries"
+            ).fetchone()
+            counters = dict(cur.execute("SELECT * FROM counters").fetchall())
+        (hits, misses) = (counters.get("hits", 0), counters.get("misses", 0))
+        return {
+            "entries": entries,
+            "nbytes": nbytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+        }
+
+
+@frozen
+class EvictionPolicy(ABC):
+    """Which entries to evict once a storage goes over its limits
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        The total size of the entries to stay within.
+    max_entries : int, optional
+        The number of entries to stay within.
+    ttl : float, optional
+        The number of seconds after which an entry is evicted, regardless of the limits.
+    """
+
+    max_bytes = field(validator=optional(instance_of(int)), default=None)
+    max_entries = field(validator=optional(instance_of(int)), default=None)
+    ttl = field(validator=optional(instance_of((int, float))), default=None)
+
+    @abstractmethod
+    def sort_key(self, entry):
+        """Entries are evicted in ascending order of their sort key"""
+
+    def select(self, entries, now=None, keep=()):
+        """The keys of `entries` to evict, never selecting those in `keep`"""
+        now = time.time() if now is None else now
+        expired = tuple(
+            entry
+            for entry in entries
+            if self.ttl is not None and now - entry.created > self.ttl
+        )
+        rest = sorted(
+            (entry for entry in entries if entry not in expired),
+            key=self.sort_key,
+        )
+        nbytes = sum(entry.nbytes for entry in rest)
+        count = len(rest)
+        evicted = [entry for entry in expired if entry.key not in keep]
+        for entry in rest:
+            if not (
+                (self.max_bytes is not None and nbytes > self.max_bytes)
+                or (self.max_entries is not None and count > self.max_entries)
+            ):
+                break
+            if entry.key in keep:
+                continue
+            evicted.append(entry)
+            nbytes -= entry.nbytes
+            count -= 1
+        return tuple(entry.key for entry in evicted)
+
+
+@public
+@frozen
+class LRUPolicy(EvictionPolicy):
+    """Evict the least recently accessed entries first"""
+
+    def sort_key(self, entry):
+        return entry.accessed
+
+
+@public
+@frozen
+class LFUPolicy(EvictionPolicy):
+    """Evict the least frequently accessed entries first, the least recently accessed among equals"""
+
+    def sort_key(self, entry):
+        return (entry.hits, entry.accessed)
+
+
+@public
+@frozen
+class TTLPolicy(EvictionPolicy):
+    """Evict entries `ttl` seconds after they were written, the oldest first when over the limits"""
+
+    ttl = field(validator=instance_of((int, float)), kw_only=True)
+
+    def sort_key(self, entry):
+        return entry.created
@@ -0,0 +1,190 @@
+import contextlib
+import contextvars
+import functools
+import itertools
+from time import perf_counter
+from unittest.mock import patch
+
+import dask
+from attr import (
+    field,
+    frozen,
+)
+from attr.validators import (
+    deep_iterable,
+    instance_of,
+)
+
+import xorq.vendor.ibis.expr.operations as ops
+from xorq.expr.relations import Read
+from xorq.vendor import ibis
+from xorq.vendor.ibis.expr.operations.udf import (
+    AggUDF,
+    ScalarUDF,
+)
+
+
+# the components of a cache key worth reporting: everything else is folded into them
+traced_types = (
+    ibis.expr.types.Expr,
+    ops.DatabaseTable,
+    Read,
+    ibis.backends.BaseBackend,
+    AggUDF,
+    ScalarUDF,
+)
+# the components traced by the current context, None outside of `trace_tokens`
+_components = contextvars.ContextVar("_components", default=None)
+
+
+@frozen
+class TokenNode:
+    """A component of a cache key: its token, the time spent computing it and its own components"""
+
+    label = field(validator=instance_of(str))
+    token = field(validator=instance_of(str))
+    elapsed = field(validator=instance_of(float))
+    value = field(validator=instance_of(str), default="")
+    children = field(
+        validator=deep_iterable(instance_of(object), instance_of(tuple)),
+        converter=tuple,
+        factory=tuple,
+    )
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "token": self.token,
+            "elapsed": self.elapsed,
+            "value": self.value,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+    @classmethod
+    def from_dict(cls, dct):
+        return cls(
+            **{
+                **dct,
+                "children": tuple(map(cls.from_dict, dct.get("children", ()))),
+            }
+        )
+
+    def render(self, indent=0):
+        lines = [
+            f"{'  ' * indent}{self.label} {self.token} ({self.elapsed * 1000:.1f} ms)"
+        ]
+        for child in self.children:
+            lines.append(child.render(indent + 1))
+        return "\n".join(lines)
+
+
+@frozen
+class TokenDiff:
+    path = field(validator=deep_iterable(instance_of(str), instance_of(tuple)))
+    left = field(validator=instance_of((TokenNode, type(None))))
+    right = field(validator=instance_of((TokenNode, type(None))))
+
+    def render(self):
+        (left, right) = (
+            node.token if node is not None else "<missing>"
+            for node in (self.left, self.right)
+        )
+        lines = [f"{' / '.join(self.path)}: {left} -> {right}"]
+        for prefix, node in (("-", self.left), ("+", self.right)):
+            if node is not None and node.value:
+                lines.append(f"  {prefix} {node.value}")
+        return "\n".join(lines)
+
+
+def get_label(obj):
+    match obj:
+        case ops.DatabaseTable() | Read():
+            return f"{type(obj).__name__}({obj.name})"
+        case ibis.backends.BaseBackend():
+            return f"Backend({obj.name})"
+        case _:
+            return type(obj).__name__
+
+
+def trace(impl):
+    @functools.wraps(impl)
+    def traced(obj, *args, **kwargs):
+        if (parent := _components.get()) is None:
+            return impl(obj, *args, **kwargs)
+        children = []
+        token = _components.set(children)
+        start = perf_counter()
+        try:
+            value = impl(obj, *args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            _components.reset(token)
+        parent.append(
+            TokenNode(
+                label=get_label(obj),
+                token=dask.base.tokenize(value),
+                elapsed=elapsed,
+                value=repr(value),
+                children=children,
+            )
+        )
+        return value
+
+    return traced
+
+
+@contextlib.contextmanager
+def trace_tokens():
+    """Record the components tokenized by `normalize_token` within the context
+
+    Yields the list the top-level components are appended to.
+    """
+    normalize_token = dask.base.normalize_token
+    dispatch = normalize_token.dispatch
+
+    def traced_dispatch(cls):
+        impl = dispatch(cls)
+        return trace(impl) if issubclass(cls, traced_types) else impl
+
+    components = []
+    token = _components.set(components)
+    try:
+        with patch.object(normalize_token, "dispatch", traced_dispatch):
+            yield components
+    finally:
+        _components.reset(token)
+
+
+def diff_token_trees(left, right):
+    """The innermost components whose tokens differ between two trees of `Cache.explain`
+
+    Components are matched by their label, and in order among those with the same one.
+    """
+
+    def group(nodes):
+        return {
+            label: tuple(grouped)
+            for label, grouped in itertools.groupby(
+                sorted(nodes, key=lambda node: node.label), key=lambda node: node.label
+            )
+        }
+
+    def diff(left, right, path):
+        if left is None or right is None:
+            yield TokenDiff((*path, (left or right).label), left, right)
+            return
+        if left.token == right.token:
+            return
+        path = (*path, left.label)
+        (lefts, rights) = (group(left.children), group(right.children))
+        inner = tuple(
+            found
+            for label in sorted(set(lefts) | set(rights))
+            for pair in itertools.zip_longest(
+                lefts.get(label, ()), rights.get(label, ())
+            )
+            for found in diff(*pair, path)
+        )
+        yield from inner or (TokenDiff(path, left, right),)
+
+    return tuple(diff(left, right, ()))
@@ -106,21 +106,7 @@ def _import_jupyter_notebook(path, module_name):
     return module
 
 
-def build_command(script_path, expression, target_dir="build"):
-    """
-    Generate artifacts from an expression in a given Python script
-
-    Parameters
-    ----------
-    script_path : Path to the Python script
-    expression : The name of the expression to build
-    target_dir : Directory where artifacts will be generated
-
-    Returns
-    -------
-
-    """
-
+def load_expr(script_path, expression):
     if len(expression) > 1 or len(expression) == 0:
         print("Expected one, and only one expression", file=sys.stderr)
         sys.exit(1)
@@ -131,10 +117,6 @@ def build_command(script_path, expression, target_dir="build"):
         print(f"Error: Script not found at {script_path}", file=sys.stderr)
         sys.exit(1)
 
-    print(f"Building {expression} from {script_path}")
-
-    build_manager = BuildManager(target_dir)
-
     vars_module = import_from_path(script_path)
 
     if not hasattr(vars_module, expression):
@@ -150,12 +132,75 @@ def build_command(script_path, expression, target_dir="build"):
         )
         sys.exit(1)
 
+    return (expression, expr)
+
+
+def build_command(script_path, expression, target_dir="build"):
+    """
+    Generate artifacts from an expression in a given Python script
+
+    Parameters
+    ----------
+    script_path : Path to the Python script
+    expression : The name of the expression to build
+    target_dir : Directory where artifacts will be generated
+
+    Returns
+    -------
+
+    """
+
+    (expression, expr) = load_expr(script_path, expression)
+
+    print(f"Building {expression} from {script_path}")
+
+    build_manager = BuildManager(target_dir)
+
     expr_hash = build_manager.compile_expr(expr)
     print(
         f"Written '{expression}' to {build_manager.artifact_store.get_path(expr_hash)}"
     )
 
 
+def explain_key_command(script_path, expression, json_path=None, diff_path=None):
+    """
+    Print the cache key of a cached expression and the components it is computed from
+
+    Parameters
+    ----------
+    script_path : Path to the Python script
+    expression : The name of the cached expression
+    json_path : Where to write the components, for a later --diff
+    diff_path : Components written by an earlier --json, to compare against
+
+    Returns
+    -------
+
+    """
+    from xorq.caching.explain import (
+        TokenNode,
+        diff_token_trees,
+    )
+
+    (expression, expr) = load_expr(script_path, expression)
+
+    if not expr.ls.is_cached:
+        print(f"Expression {expression} is not cached", file=sys.stderr)
+        sys.exit(1)
+
+    tree = expr.ls.storage.explain(expr.ls.uncached_one)
+    print(tree.render())
+
+    if json_path is not None:
+        Path(json_path).write_text(json.dumps(tree.to_dict(), indent=2))
+
+    if diff_path is not None:
+        other = TokenNode.from_dict(json.loads(Path(diff_path).read_text()))
+        diffs = diff_token_trees(other, tree)
+        print()
+        print("\n".join(diff.render() for diff in diffs) or "No differences")
+
+
 def main():
     """Main entry point for the xorq CLI."""
     parser = argparse.ArgumentParser(description="xorq - build and run expressions")
@@ -179,6 +224,25 @@ def main():
         "--target-dir", default="build", help="Directory for all generated artifacts"
     )
 
+    # Create parser for the "explain-key" command
+    explain_key_parser = subparsers.add_parser(
+        "explain-key",
+        help="Print the cache key of an expression and the components it is computed from",
+    )
+    explain_key_parser.add_argument("script_path", help="Path to the Python script")
+    explain_key_parser.add_argument(
+        "-e",
+        "--expressions",
+        nargs="?",
+        help="Name of the cached expression variable in the Python script",
+    )
+    explain_key_parser.add_argument(
+        "--json", help="Write the components to this file, for a later --diff"
+    )
+    explain_key_parser.add_argument(
+        "--diff", help="Compare against the components written by an earlier --json"
+    )
+
     # Parse the arguments
     args = parser.parse_args()
 
@@ -186,6 +250,9 @@ def main():
     if args.command == "build":
         expressions = [args.expressions] if args.expressions else []
         build_command(args.script_path, expressions, args.target_dir)
+    elif args.command == "explain-key":
+        expressions = [args.expressions] if args.expressions else []
+        explain_key_command(args.script_path, expressions, args.json, args.diff)
 
 
 if __name__ == "__main__":
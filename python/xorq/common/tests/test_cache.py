@@ -1,10 +1,22 @@
 from pathlib import Path
 
+import pandas as pd
 import pytest
 
 import xorq as xo
 import xorq.backends.let
-from xorq.caching import ParquetStorage
+from xorq.caching import (
+    LFUPolicy,
+    LRUPolicy,
+    ParquetStorage,
+    SourceStorage,
+    TTLPolicy,
+)
+from xorq.caching.eviction import (
+    CacheEntry,
+    CacheIndex,
+    EvictionPolicy,
+)
 
 
 @pytest.fixture(scope="session")
@@ -47,3 +59,97 @@ def test_default_connection(tmp_path, parquet_dir):
     assert get_node.source.name == con.name
     assert xorq.options.backend is not None
     assert get_node.to_expr().execute is not None
+
+
+entries = (
+    CacheEntry(key="a", nbytes=10, created=0.0, accessed=5.0, hits=3),
+    CacheEntry(key="b", nbytes=10, created=1.0, accessed=2.0, hits=1),
+    CacheEntry(key="c", nbytes=10, created=2.0, accessed=3.0, hits=0),
+)
+
+
+@pytest.mark.parametrize(
+    "policy,expected",
+    [
+        (LRUPolicy(max_entries=2), ("b",)),
+        (LRUPolicy(max_bytes=10), ("b", "c")),
+        (LFUPolicy(max_entries=1), ("c", "b")),
+        (TTLPolicy(ttl=9), ("a",)),
+        (TTLPolicy(ttl=20, max_entries=2), ("a",)),
+        (LRUPolicy(max_entries=3), ()),
+    ],
+)
+def test_eviction_policy_select(policy, expected):
+    assert policy.select(entries, now=10.0) == expected
+
+
+def test_eviction_policy_select_keep():
+    assert LRUPolicy(max_entries=1).select(entries, keep=("b",)) == ("c", "a")
+
+
+def test_eviction_policy_abstract():
+    with pytest.raises(TypeError):
+        EvictionPolicy(max_entries=1)
+
+
+def test_source_storage_max_bytes():
+    with pytest.raises(ValueError, match="max_bytes"):
+        SourceStorage(source=xo.connect(), eviction=LRUPolicy(max_bytes=10))
+
+
+@pytest.mark.parametrize("storage_cls", [ParquetStorage, SourceStorage])
+def test_storage_eviction(tmp_path, storage_cls):
+    con = xo.connect()
+    kwargs = {"path": tmp_path} if storage_cls is ParquetStorage else {}
+    storage = storage_cls(source=con, eviction=LRUPolicy(max_entries=2), **kwargs)
+    t = con.register(pd.DataFrame({"a": range(10)}), table_name="evicted")
+    (first, second, third) = (t.filter(t.a > i) for i in range(3))
+
+    for expr in (first, second):
+        storage.set_default(expr, expr.op())
+    # a hit makes first the most recently used
+    storage.set_default(first, first.op())
+    storage.set_default(third, third.op())
+
+    assert storage.exists(first) and storage.exists(third)
+    assert not storage.exists(second)
+    assert storage.get_key(second) not in con.list_tables()
+    stats = storage.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (2, 1, 3)
+    assert stats["hit_rate"] == 0.25
+    if storage_cls is ParquetStorage:
+        assert stats["nbytes"] == sum(
+            path.stat().st_size for path in tmp_path.glob("*.parquet")
+        )
+        # other processes may hold a lock on it
+        assert storage.storage.get_lock_loc(storage.get_key(second)).exists()
+
+
+def test_cache_index_buffers_hits(tmp_path):
+    path = tmp_path.joinpath(".index.sqlite")
+    index = CacheIndex(path, flush_interval=60.0)
+    index.add("a", 10)
+    assert not index.touch("b")
+    for _ in range(3):
+        assert index.touch("a")
+        index.increment("hits")
+
+    other = CacheIndex(path)
+    assert other.entries()[0].hits == 0
+    assert other.stats()["hits"] == 0
+    index.flush()
+    assert other.entries()[0].hits == 3
+    assert other.stats()["hits"] == 3
+
+
+def test_storage_gc(tmp_path):
+    con = xo.connect()
+    storage = ParquetStorage(source=con, path=tmp_path, eviction=TTLPolicy(ttl=0))
+    t = con.register(pd.DataFrame({"a": range(10)}), table_name="collected")
+
+    storage.set_default(t, t.op())
+    assert storage.exists(t)
+
+    assert storage.gc() == (storage.get_key(t),)
+    assert not storage.exists(t)
+    assert storage.stats()["entries"] == 0
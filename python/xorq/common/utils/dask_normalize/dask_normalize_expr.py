@@ -1,9 +1,17 @@
+import collections
+import contextvars
+import functools
+import glob
 import pathlib
 import re
+import threading
 import types
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 
 import dask
 import sqlglot as sg
+import toolz
 
 import xorq as xo
 import xorq.vendor.ibis.expr.datatypes as dat
@@ -14,11 +22,25 @@ from xorq.common.utils.dask_normalize.dask_normalize_utils import (
 from xorq.common.utils.defer_utils import (
     Read,
 )
+from xorq.common.utils.fingerprint_utils import (
+    fingerprint_databasetable,
+    fingerprint_paths,
+    get_persisted_token,
+    persistently_memoized,
+)
+from xorq.common.utils.object_store_utils import (
+    fingerprint_urls,
+    is_object_store_url,
+)
 from xorq.expr.relations import (
     RemoteTable,
     make_native_op,
 )
 from xorq.vendor import ibis
+from xorq.vendor.ibis.common.graph import (
+    Graph,
+    Node,
+)
 from xorq.vendor.ibis.expr.operations.udf import (
     AggUDF,
     ScalarUDF,
@@ -45,10 +67,7 @@ def normalize_memory_databasetable(dt):
         # dt.source,
         dt.schema.to_pandas(),
         # in memory: so we can assume it's reasonable to hash the data
-        tuple(
-            dask.base.tokenize(el.serialize().to_pybytes())
-            for el in xo.to_pyarrow_batches(dt.to_expr())
-        ),
+        fingerprint_databasetable(dt),
     )
 
 
@@ -92,8 +111,6 @@ def normalize_remote_databasetable(dt):
 
 
 def normalize_postgres_databasetable(dt):
-    from xorq.common.utils.postgres_utils import get_postgres_n_reltuples
-
     if dt.source.name != "postgres":
         raise ValueError
     return normalize_seq_with_caller(
@@ -101,13 +118,27 @@ def normalize_postgres_databasetable(dt):
         dt.schema,
         dt.source,
         dt.namespace,
-        get_postgres_n_reltuples(dt),
+        get_postgres_freshness_token(dt),
     )
 
 
-def normalize_snowflake_databasetable(dt):
+def get_postgres_freshness_token(dt):
+    from xorq.common.utils.postgres_utils import get_postgres_freshness_token
+
+    return get_postgres_freshness_token(dt)
+
+
+def get_snowflake_last_modification_time(dt):
+    from xorq.caching import key_memoized
     from xorq.common.utils.snowflake_utils import get_snowflake_last_modification_time
 
+    return key_memoized(
+        ("snowflake_last_modification_time", dt),
+        lambda: get_snowflake_last_modification_time(dt),
+    )
+
+
+def normalize_snowflake_databasetable(dt):
     if dt.source.name != "snowflake":
         raise ValueError
     return normalize_seq_with_caller(
@@ -119,22 +150,32 @@ def normalize_snowflake_databasetable(dt):
     )
 
 
-def normalize_bigquery_databasetable(dt):
-    # https://stackoverflow.com/questions/44288261/get-the-last-modified-date-for-all-bigquery-tables-in-a-bigquery-project/44290543#44290543
-    if dt.source.name != "bigquery":
-        raise ValueError
+def get_bigquery_last_modified_time(dt):
+    from xorq.caching import key_memoized
+
     # https://stackoverflow.com/a/44290543
     query = f"""
     SELECT last_modified_time
     FROM `{dt.namespace.database}.__TABLES__` where table_id = '{dt.name}'
     """
-    ((last_modified_time,),) = dt.source.raw_sql(query).to_dataframe()
+
+    def get_last_modified_time():
+        ((last_modified_time,),) = dt.source.raw_sql(query).to_dataframe()
+        return last_modified_time
+
+    return key_memoized(("bigquery_last_modified_time", dt), get_last_modified_time)
+
+
+def normalize_bigquery_databasetable(dt):
+    # https://stackoverflow.com/questions/44288261/get-the-last-modified-date-for-all-bigquery-tables-in-a-bigquery-project/44290543#44290543
+    if dt.source.name != "bigquery":
+        raise ValueError
     return normalize_seq_with_caller(
         dt.name,
         dt.schema,
         dt.source,
         dt.namespace,
-        last_modified_time,
+        get_bigquery_last_modified_time(dt),
     )
 
 
@@ -213,9 +254,8 @@ def normalize_ibis_datatype(datatype):
     return normalize_seq_with_caller(datatype.name.lower(), *datatype.args)
 
 
-@dask.base.normalize_token.register(Read)
-def normalize_read(read):
-    path = next(
+def get_read_path(read):
+    return next(
         el
         for el in (
             dict(read.read_kwargs).get(name)
@@ -227,24 +267,25 @@ def normalize_read(read):
         )
         if el
     )
+
+
+def get_url_fingerprints(urls):
+    from xorq.caching import key_memoized
+
+    urls = str(urls) if isinstance(urls, (str, pathlib.Path)) else tuple(map(str, urls))
+    return key_memoized(("fingerprint_urls", urls), lambda: fingerprint_urls(urls))
+
+
+@dask.base.normalize_token.register(Read)
+def normalize_read(read):
+    path = get_read_path(read)
     if isinstance(path, (str, pathlib.Path)):
         path = str(path)
-        if path.startswith("http") or path.startswith("https:"):
-            import requests
-
-            resp = requests.head(path)
-            resp.raise_for_status()
-            tpls = tuple(
-                (k, resp.headers[k])
-                for k in (
-                    "Last-Modified",
-                    "Content-Length",
-                    "Content-Type",
-                )
-            )
-        elif path.startswith("s3"):
-            raise NotImplementedError
-        elif (path := pathlib.Path(path)).exists():
+        if is_object_store_url(path):
+            tpls = get_url_fingerprints(path)
+        elif (
+            path := pathlib.Path(path)
+        ).is_file() and xo.options.cache.read_fingerprint == "stat":
             stat = path.stat()
             tpls = tuple(
                 (attrname, getattr(stat, attrname))
@@ -255,10 +296,19 @@ def normalize_read(read):
                     "st_ino",
                 )
             )
+        elif path.exists() or glob.has_magic(str(path)):
+            tpls = fingerprint_paths(path)
         else:
             raise NotImplementedError(f'Don\'t know how to deal with path "{path}"')
-    elif isinstance(path, (list, tuple)) and all(isinstance(el, str) for el in path):
-        raise NotImplementedError
+    elif isinstance(path, (list, tuple)) and all(
+        isinstance(el, (str, pathlib.Path)) for el in path
+    ):
+        if all(map(is_object_store_url, path)):
+            tpls = get_url_fingerprints(path)
+        elif any(map(is_object_store_url, path)):
+            raise NotImplementedError
+        else:
+            tpls = fingerprint_paths(path)
     else:
         raise NotImplementedError
     return normalize_seq_with_caller(
@@ -267,22 +317,138 @@ def normalize_read(read):
     )
 
 
+# the tokens of these backends' tables are stable across processes: their
+# connections are tokenized by host rather than by the id of a client object
+persistent_backends = ("postgres", "snowflake", "bigquery")
+
+
+databasetable_handlers = {
+    "pandas": normalize_pandas_databasetable,
+    "datafusion": normalize_datafusion_databasetable,
+    "postgres": normalize_postgres_databasetable,
+    "snowflake": normalize_snowflake_databasetable,
+    "let": normalize_letsql_databasetable,
+    "duckdb": normalize_duckdb_databasetable,
+    "trino": normalize_remote_databasetable,
+    "bigquery": normalize_bigquery_databasetable,
+}
+
+
+def get_persistent_key(dt):
+    f = databasetable_handlers[dt.source.name]
+    return dask.base.tokenize(
+        f.__name__,
+        dt.name,
+        dt.schema,
+        dt.source,
+        dt.namespace,
+        *get_persistent_key_options(dt),
+    )
+
+
+def get_persistent_key_options(dt):
+    """The options the token of `dt` depends on: a token persisted under others doesn't apply"""
+    if dt.source.name == "postgres":
+        from xorq.common.utils.postgres_utils import get_freshness_probe
+
+        # attrs reprs are stable across processes
+        return (repr(get_freshness_probe()),)
+    return ()
+
+
 @dask.base.normalize_token.register(ir.DatabaseTable)
 def normalize_databasetable(dt):
-    dct = {
-        "pandas": normalize_pandas_databasetable,
-        "datafusion": normalize_datafusion_databasetable,
-        "postgres": normalize_postgres_databasetable,
-        "snowflake": normalize_snowflake_databasetable,
-        "let": normalize_letsql_databasetable,
-        "duckdb": normalize_duckdb_databasetable,
-        "trino": normalize_remote_databasetable,
-        "bigquery": normalize_bigquery_databasetable,
-    }
-    f = dct[dt.source.name]
+    f = databasetable_handlers[dt.source.name]
+    if dt.source.name in persistent_backends:
+        return persistently_memoized(get_persistent_key(dt), functools.partial(f, dt))
     return f(dt)
 
 
+# the round-trips made by the handlers of these backends' tables, each memoized
+# with `key_memoized`
+leaf_fetchers = {
+    "postgres": get_postgres_freshness_token,
+    "snowflake": get_snowflake_last_modification_time,
+    "bigquery": get_bigquery_last_modified_time,
+}
+
+
+def get_leaves(op):
+    """The distinct tables and reads of `op`, those behind remote tables and the let backend included"""
+    from xorq.expr.relations import make_native_op
+
+    leaves = {}
+    for node in op.find((ir.DatabaseTable, Read)):
+        match node:
+            case RemoteTable():
+                leaves.update(dict.fromkeys(get_leaves(node.remote_expr.op())))
+            case ir.DatabaseTable(source=source) if (
+                source.name == "let"
+                and type(node) is ir.DatabaseTable
+                and source._sources.get_backend(node).name != "let"
+            ):
+                leaves.update(dict.fromkeys(get_leaves(make_native_op(node).op())))
+            case _:
+                leaves[node] = None
+    return tuple(leaves)
+
+
+def get_leaf_fetch(leaf):
+    """The backend and the round-trip made when tokenizing `leaf`, or None if it makes none"""
+    match leaf:
+        case Read():
+            path = get_read_path(leaf)
+            paths = (path,) if isinstance(path, (str, pathlib.Path)) else path
+            if all(map(is_object_store_url, paths)):
+                return (None, functools.partial(get_url_fingerprints, path))
+        case ir.DatabaseTable(source=source) if source.name in leaf_fetchers:
+            if not (
+                xo.options.cache.table_token_ttl
+                and get_persisted_token(get_persistent_key(leaf))
+            ):
+                return (source, functools.partial(leaf_fetchers[source.name], leaf))
+    return None
+
+
+def prefetch_leaves(expr, max_workers=None):
+    """Make the round-trips of the tables and reads of `expr` concurrently
+
+    Must be called within a `key_memo` context: the results are memoized there
+    and reused when `expr` is tokenized. At most `max_workers` round-trips are
+    made at once per backend.
+
+    Parameters
+    ----------
+    expr : ir.Expr
+    max_workers : int, optional
+        Defaults to xo.options.cache.leaf_workers.
+    """
+    max_workers = max_workers or xo.options.cache.leaf_workers
+    fetches = tuple(filter(None, map(get_leaf_fetch, get_leaves(expr.op()))))
+    if len(fetches) < 2 or max_workers < 2:
+        for _, fetch in fetches:
+            fetch()
+        return
+    semaphores = {id(source): threading.Semaphore(max_workers) for source, _ in fetches}
+
+    def run(semaphore, fetch):
+        with semaphore:
+            return fetch()
+
+    with ThreadPoolExecutor(
+        max_workers=min(len(fetches), max_workers * len(semaphores))
+    ) as executor:
+        futures = tuple(
+            # the key_memo is a context variable: each fetch runs in a copy of ours
+            executor.submit(
+                contextvars.copy_context().run, run, semaphores[id(source)], fetch
+            )
+            for source, fetch in fetches
+        )
+        for future in futures:
+            future.result()
+
+
 @dask.base.normalize_token.register(RemoteTable)
 def normalize_remote_table(dt):
     if not isinstance(dt, RemoteTable):
@@ -374,8 +540,136 @@ def normalize_agg_udf(udf):
     )
 
 
+class StructuralTokenizer:
+    """Merkle-style digests of op graphs, without compiling them to SQL
+
+    The digest of a node is the hash of its type and the digests of its
+    arguments: each node is hashed once per graph, and the digests are stable
+    across processes. Leaves (tables, reads and nodes that hold a backend) are
+    tokenized with `normalize_token`, so with the patches of the current cache
+    strategy, on every call. The digest of every other node is memoized across
+    calls, together with the tokens of the leaves it depends on, and is reused
+    while those tokens don't change.
+    """
+
+    def __init__(self, maxsize=2**16):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        # node -> (leaves, leaf_tokens, digest)
+        self.memo = collections.OrderedDict()
+
+    @staticmethod
+    def is_leaf(node):
+        return isinstance(node, (ir.DatabaseTable, Read)) or any(
+            isinstance(arg, ibis.backends.BaseBackend) for arg in node.__args__
+        )
+
+    def get_memo(self, node):
+        with self.lock:
+            if (entry := self.memo.get(node)) is not None:
+                self.memo.move_to_end(node)
+            return entry
+
+    def set_memo(self, node, entry):
+        with self.lock:
+            self.memo[node] = entry
+            while len(self.memo) > self.maxsize:
+                self.memo.popitem(last=False)
+
+    def arg_token(self, arg, digests):
+        match arg:
+            case Node():
+                return digests[arg]
+            case tuple() | list():
+                return ("seq", tuple(self.arg_token(el, digests) for el in arg))
+            case Mapping():
+                return (
+                    "map",
+                    tuple((k, self.arg_token(v, digests)) for k, v in arg.items()),
+                )
+            case dat.DataType():
+                # normalize_ibis_datatype inspects the stack: too slow per node
+                return ("dtype", str(arg))
+            case _:
+                return dask.base.normalize_token(arg)
+
+    def node_digest(self, node, digests):
+        if isinstance(node, ir.InMemoryTable):
+            # these should have been replaced by the time we get to them
+            raise ValueError(f"{node}")
+        typ = type(node)
+        parts = [f"{typ.__module__}.{typ.__qualname__}"]
+        if isinstance(node, (AggUDF, ScalarUDF)):
+            # the function and the types, but not the arguments
+            parts.append(dask.base.normalize_token(node))
+        try:
+            parts.extend(self.arg_token(arg, digests) for arg in node.__args__)
+        except ValueError:
+            if not isinstance(node, ir.Relation):
+                raise
+            # opaque: an argument without a deterministic token
+            parts = [unbound_expr_to_default_sql(node.to_expr().unbind())]
+        return dask.base.tokenize(*parts)
+
+    def tokenize(self, op):
+        leaf_tokens = {}
+
+        def get_leaf_tokens(leaves):
+            for leaf in leaves:
+                if leaf not in leaf_tokens:
+                    leaf_tokens[leaf] = dask.base.tokenize(leaf)
+            return tuple(leaf_tokens[leaf] for leaf in leaves)
+
+        match self.get_memo(op):
+            case (leaves, tokens, digest) if (
+                all(isinstance(leaf, (ir.DatabaseTable, Read)) for leaf in leaves)
+                and get_leaf_tokens(leaves) == tokens
+            ):
+                return digest
+
+        (digests, node_leaves) = ({}, {})
+        (graph, _) = Graph.from_bfs(op).toposort()
+        for node, children in graph.items():
+            if self.is_leaf(node):
+                node_leaves[node] = (node,)
+                if not isinstance(node, (ir.DatabaseTable, Read)):
+                    # e.g. a SQL query: its backend is tokenized on every call
+                    leaf_tokens[node] = self.node_digest(node, digests)
+                digests[node] = get_leaf_tokens((node,))[0]
+                continue
+            leaves = node_leaves[node] = tuple(
+                toolz.unique(leaf for child in children for leaf in node_leaves[child])
+            )
+            tokens = get_leaf_tokens(leaves)
+            match self.get_memo(node):
+                case (_, memo_tokens, digest) if memo_tokens == tokens:
+                    pass
+                case _:
+                    digest = self.node_digest(node, digests)
+                    self.set_memo(node, (leaves, tokens, digest))
+            digests[node] = digest
+        return digests[op]
+
+
+structural_tokenizer = StructuralTokenizer()
+
+
+def normalize_expr_structural(expr):
+    return normalize_seq_with_caller(
+        structural_tokenizer.tokenize(expr.ls.uncached.op()),
+    )
+
+
 @dask.base.normalize_token.register(ibis.expr.types.Expr)
 def normalize_expr(expr):
+    match xo.options.cache.tokenizer:
+        case "structural":
+            return normalize_expr_structural(expr)
+        case "sql":
+            pass
+        case tokenizer:
+            raise ValueError(f"unknown tokenizer {tokenizer!r}")
+
     # FIXME: replace bound table names with their hashes
     sql = unbound_expr_to_default_sql(expr.ls.uncached.unbind())
 
@@ -0,0 +1,430 @@
+import contextlib
+import functools
+import glob
+import hashlib
+import mmap
+import pathlib
+import sqlite3
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import dask
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import xorq as xo
+
+
+# buffers are hashed in chunks of this size, so that a large one isn't held by a single hasher call
+CHUNK_SIZE = 64 * 2**20
+
+
+def hash_buffer(buffer):
+    """Hash the memory of `buffer` in place, without copying it into Python bytes"""
+    if buffer is None:
+        return None
+    view = memoryview(buffer)
+    return tuple(
+        dask.hashing.hash_buffer_hex(view[start : start + CHUNK_SIZE])
+        for start in range(0, view.nbytes, CHUNK_SIZE)
+    )
+
+
+# columns are hashed in windows of this many rows, whatever their chunks
+WINDOW_ROWS = 2**16
+
+
+def get_plain_width(typ):
+    """The width of the values of `typ`, if they are fixed-width and byte aligned"""
+    if pa.types.is_primitive(typ) and not pa.types.is_boolean(typ):
+        return typ.bit_width // 8
+    return None
+
+
+def iter_window_buffers(pieces):
+    """The buffers to hash for the window of rows made of the array slices `pieces`
+
+    Null-free fixed-width values are hashed in place. Anything else is copied into
+    a new array and written as an IPC message, which rebases offsets and realigns
+    bitmaps, so that the same rows are hashed the same whatever their layout
+    """
+    width = get_plain_width(pieces[0].type)
+    if width is not None and not any(piece.null_count for piece in pieces):
+        for piece in pieces:
+            view = memoryview(piece.buffers()[1])
+            yield view[piece.offset * width : (piece.offset + len(piece)) * width]
+        return
+    if pa.types.is_dictionary(pieces[0].type):
+        # chunks may each come with their own dictionary
+        pieces = [piece.dictionary_decode() for piece in pieces]
+    # a copy: the IPC writer doesn't trim the data of a sliced array
+    array = pa.concat_arrays(pieces)
+    yield pa.RecordBatch.from_arrays([array], names=["_"]).serialize()
+
+
+class ColumnHasher:
+    """Hash the rows of a column as they come, independently of how they are chunked"""
+
+    def __init__(self, typ):
+        self.type = typ
+        self.hasher = hashlib.blake2b()
+        self.length = 0
+        self.pieces = []
+        self.pending = 0
+
+    def update(self, array):
+        if isinstance(array, pa.ChunkedArray):
+            for chunk in array.chunks:
+                self.update(chunk)
+            return
+        start = 0
+        while start < len(array):
+            piece = array.slice(start, WINDOW_ROWS - self.pending)
+            self.pieces.append(piece)
+            self.pending += len(piece)
+            start += len(piece)
+            if self.pending == WINDOW_ROWS:
+                self.flush()
+
+    def flush(self):
+        if self.pieces:
+            for buffer in iter_window_buffers(self.pieces):
+                self.hasher.update(buffer)
+            self.length += self.pending
+            (self.pieces, self.pending) = ([], 0)
+
+    def hexdigest(self):
+        self.flush()
+        return (str(self.type), self.length, self.hasher.hexdigest())
+
+
+def fingerprint_array(array):
+    """A token of the contents of `array`, the same whatever its offset and chunks"""
+    hasher = ColumnHasher(array.type)
+    hasher.update(array)
+    return hasher.hexdigest()
+
+
+def fingerprint_batches(batches, max_workers=None):
+    """A token of the contents of `batches`, holding on to one batch at a time
+
+    The token only depends on the rows, not on how they are split into batches, so
+    that the same data gets the same token in every backend
+    """
+    hashers = None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # empty batches are skipped, as backends may or may not produce them
+        for batch in filter(len, batches):
+            if hashers is None:
+                hashers = tuple(ColumnHasher(field.type) for field in batch.schema)
+            # each column is hashed by one thread at a time
+            tuple(executor.map(ColumnHasher.update, hashers, batch.columns))
+        return tuple(hasher.hexdigest() for hasher in hashers or ())
+
+
+def fingerprint_table(table, max_workers=None):
+    """A token of the contents of `table`, hashing its columns in parallel"""
+    return fingerprint_batches(table.to_batches(), max_workers=max_workers)
+
+
+def get_buffer_addresses(batches):
+    return tuple(
+        (buffer.address, buffer.size)
+        for batch in batches
+        for column in batch.columns
+        for buffer in column.buffers()
+        if buffer is not None
+    )
+
+
+# DataFusion context -> table name -> (batches, buffer addresses, fingerprint)
+registered_fingerprints = weakref.WeakKeyDictionary()
+registered_fingerprints_lock = threading.Lock()
+
+
+def prune_registered_fingerprints(con):
+    """Forget the tables of `con` that were dropped or now hold other buffers"""
+    with registered_fingerprints_lock:
+        memo = dict(registered_fingerprints.get(con, {}))
+    for name, (_, addresses, _) in memo.items():
+        if (
+            not con.table_exist(name)
+            or get_buffer_addresses(con.table(name).collect()) != addresses
+        ):
+            with registered_fingerprints_lock:
+                entries = registered_fingerprints.get(con, {})
+                # unless another thread memoized it again meanwhile
+                if entries.get(name, (None, addresses))[1] == addresses:
+                    entries.pop(name, None)
+
+
+def fingerprint_registered_table(con, name):
+    """A token of the contents of the memory table `name` of the DataFusion context `con`
+
+    Collecting a memory table hands back the batches it holds without copying them,
+    so the token is memoized until the table holds other buffers. The memo keeps the
+    batches it was computed from, so that their memory isn't reused meanwhile: those
+    of tables since dropped or replaced are let go on the next call for `con`
+    """
+    prune_registered_fingerprints(con)
+    batches = con.table(name).collect()
+    addresses = get_buffer_addresses(batches)
+    with registered_fingerprints_lock:
+        match registered_fingerprints.setdefault(con, {}).get(name):
+            case (_, memo_addresses, fingerprint) if memo_addresses == addresses:
+                return fingerprint
+    fingerprint = fingerprint_batches(batches)
+    with registered_fingerprints_lock:
+        registered_fingerprints.setdefault(con, {})[name] = (
+            batches,
+            addresses,
+            fingerprint,
+        )
+    return fingerprint
+
+
+def fingerprint_databasetable(dt):
+    """A token of the contents of the in-memory table `dt`
+
+    Tables of DataFusion contexts are hashed in place and memoized, see
+    `fingerprint_registered_table`. Those of other backends (pandas, duckdb) are
+    read and hashed one batch at a time, on every call
+    """
+    if dt.source.name in ("let", "datafusion"):
+        return fingerprint_registered_table(dt.source.con, dt.name)
+    with xo.to_pyarrow_batches(dt.to_expr()) as reader:
+        return fingerprint_batches(reader)
+
+
+# like pyarrow datasets: files whose names start with these aren't data
+ignore_prefixes = (".", "_")
+
+
+def expand_paths(paths):
+    """The files of `paths`: each may be a file, a directory or a glob pattern"""
+    if isinstance(paths, (str, pathlib.Path)):
+        paths = (paths,)
+
+    def expand(path):
+        if glob.has_magic(str(path)):
+            matches = map(pathlib.Path, glob.glob(str(path), recursive=True))
+        elif (path := pathlib.Path(path)).is_dir():
+            matches = path.rglob("*")
+        elif path.exists():
+            return (path,)
+        else:
+            raise FileNotFoundError(path)
+        return tuple(
+            match
+            for match in matches
+            if match.is_file() and not match.name.startswith(ignore_prefixes)
+        )
+
+    return tuple(sorted(set(match for path in paths for match in expand(path))))
+
+
+def get_stat(path):
+    stat = path.stat()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def hash_file(path):
+    with path.open("rb") as fh:
+        if not path.stat().st_size:
+            return hash_buffer(b"")
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            return hash_buffer(view)
+
+
+def fingerprint_parquet_footer(path):
+    metadata = pq.read_metadata(path)
+    row_groups = tuple(
+        (
+            row_group.num_rows,
+            row_group.total_byte_size,
+            tuple(
+                (
+                    column.path_in_schema,
+                    column.statistics.to_dict() if column.is_stats_set else None,
+                )
+                for column in map(row_group.column, range(row_group.num_columns))
+            ),
+        )
+        for row_group in map(metadata.row_group, range(metadata.num_row_groups))
+    )
+    schema = str(metadata.schema.to_arrow_schema())
+    return dask.base.tokenize(schema, metadata.num_rows, row_groups)
+
+
+def fingerprint_file(path, method):
+    match method:
+        case "content":
+            return dask.base.tokenize(hash_file(path))
+        case "footer" if path.suffix in (".parquet", ".parq"):
+            return fingerprint_parquet_footer(path)
+        case "footer":
+            # not a parquet file: it has no footer to go by
+            return dask.base.tokenize(hash_file(path))
+        case _:
+            raise ValueError(f"unknown fingerprint method {method!r}")
+
+
+class SQLiteIndex:
+    """A table of a sqlite file, shared by the threads of a process and by processes"""
+
+    create_statement = None
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.con = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        with self.transaction() as cur:
+            cur.execute(self.create_statement)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.lock, self.con:
+            yield self.con.cursor()
+
+
+class FingerprintIndex(SQLiteIndex):
+    """On-disk index of file fingerprints, keyed by the path, modification time and size of each file"""
+
+    create_statement = (
+        "CREATE TABLE IF NOT EXISTS fingerprints ("
+        "path TEXT, mtime_ns INTEGER, size INTEGER, method TEXT, fingerprint TEXT, "
+        "PRIMARY KEY (path, mtime_ns, size, method)"
+        ")"
+    )
+
+    def get(self, path, stat, method):
+        with self.transaction() as cur:
+            row = cur.execute(
+                "SELECT fingerprint FROM fingerprints "
+                "WHERE path = ? AND mtime_ns = ? AND size = ? AND method = ?",
+                (str(path), *stat, method),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, rows):
+        with self.transaction() as cur:
+            # stale fingerprints of a path are replaced
+            cur.executemany(
+                "DELETE FROM fingerprints WHERE path = ? AND method = ?",
+                ((str(path), method) for (path, _, method, _) in rows),
+            )
+            cur.executemany(
+                "INSERT INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+                (
+                    (str(path), *stat, method, fingerprint)
+                    for (path, stat, method, fingerprint) in rows
+                ),
+            )
+
+
+class TokenIndex(SQLiteIndex):
+    """On-disk memo of tokens, each returned up to `ttl` seconds after it was put"""
+
+    create_statement = (
+        "CREATE TABLE IF NOT EXISTS tokens ("
+        "key TEXT PRIMARY KEY, token TEXT, created REAL"
+        ")"
+    )
+
+    def get(self, key, ttl):
+        with self.transaction() as cur:
+            row = cur.execute(
+                "SELECT token FROM tokens WHERE key = ? AND created > ?",
+                # wall clock time: the entries are shared between processes
+                (key, time.time() - ttl),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, token):
+        with self.transaction() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)",
+                (key, token, time.time()),
+            )
+
+
+@functools.cache
+def get_fingerprint_index(path):
+    path = pathlib.Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    return FingerprintIndex(path.joinpath(".fingerprints.sqlite"))
+
+
+@functools.cache
+def get_token_index(path):
+    path = pathlib.Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    return TokenIndex(path.joinpath(".tokens.sqlite"))
+
+
+def persistently_memoized(key, f, ttl=None):
+    """The token of `f()`, reused for `ttl` seconds by every process sharing the cache directory
+
+    Parameters
+    ----------
+    key : str
+        Identifies the result of `f` across processes.
+    f : Callable[[], Any]
+    ttl : float, optional
+        Defaults to xo.options.cache.table_token_ttl. `f()` itself is returned
+        if it is 0.
+    """
+    ttl = xo.options.cache.table_token_ttl if ttl is None else ttl
+    if not ttl:
+        return f()
+    if (token := get_persisted_token(key, ttl)) is None:
+        token = dask.base.tokenize(f())
+        get_token_index(xo.options.cache.default_path).put(key, token)
+    return token
+
+
+def get_persisted_token(key, ttl=None):
+    """The token of `key` put by `persistently_memoized` within the last `ttl` seconds, or None"""
+    ttl = xo.options.cache.table_token_ttl if ttl is None else ttl
+    if not ttl:
+        return None
+    return get_token_index(xo.options.cache.default_path).get(key, ttl)
+
+
+def fingerprint_paths(paths, method=None, max_workers=None):
+    """The (path, fingerprint) of each file of `paths`
+
+    Parameters
+    ----------
+    paths : str | pathlib.Path | Sequence[str | pathlib.Path]
+        Files, directories or glob patterns.
+    method : str, optional
+        "stat", "footer" or "content", defaults to xo.options.cache.read_fingerprint.
+    max_workers : int, optional
+        Defaults to xo.options.cache.fingerprint_workers.
+    """
+    method = method or xo.options.cache.read_fingerprint
+    max_workers = max_workers or xo.options.cache.fingerprint_workers
+    paths = expand_paths(paths)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        stats = tuple(executor.map(get_stat, paths))
+        if method == "stat":
+            return tuple(zip(map(str, paths), stats))
+        index = get_fingerprint_index(xo.options.cache.default_path)
+        fingerprints = [
+            index.get(path, stat, method) for path, stat in zip(paths, stats)
+        ]
+        missing = tuple(
+            i for i, fingerprint in enumerate(fingerprints) if fingerprint is None
+        )
+        computed = executor.map(
+            functools.partial(fingerprint_file, method=method),
+            (paths[i] for i in missing),
+        )
+        for i, fingerprint in zip(missing, computed):
+            fingerprints[i] = fingerprint
+    if missing:
+        index.put(tuple((paths[i], stats[i], method, fingerprints[i]) for i in missing))
+    return tuple(zip(map(str, paths), fingerprints))
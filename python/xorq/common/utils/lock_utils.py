@@ -0,0 +1,28 @@
+import contextlib
+import fcntl
+import threading
+
+
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+def _get_thread_lock(path):
+    with _thread_locks_lock:
+        return _thread_locks.setdefault(str(path), threading.Lock())
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on `path`, across threads and processes
+
+    POSIX record locks are used because, unlike flock, they are honoured over NFS.
+    They are owned by the process, so threads of the same process are serialized separately.
+    """
+    with _get_thread_lock(path):
+        with open(path, "a") as fh:
+            fcntl.lockf(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(fh, fcntl.LOCK_UN)
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+
+class ArrowLRUCache:
+    """Thread-safe mapping of keys to Arrow tables, evicting the least recently used beyond `max_bytes`"""
+
+    def __init__(self, max_bytes, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.lock = threading.Lock()
+        self.tables = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.tables
+
+    def __len__(self):
+        with self.lock:
+            return len(self.tables)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if (table := self.tables.get(key)) is None:
+                self.misses += 1
+                return default
+            self.tables.move_to_end(key)
+            self.hits += 1
+            return table
+
+    def fits(self, nbytes):
+        """Whether a table of `nbytes` is small enough to be kept"""
+        return nbytes <= min(self.max_entry_bytes or self.max_bytes, self.max_bytes)
+
+    def put(self, key, table):
+        """Cache `table`, returning whether it was small enough to be kept"""
+        nbytes = table.nbytes
+        if not self.fits(nbytes):
+            return False
+        with self.lock:
+            self._pop(key)
+            self.tables[key] = table
+            self.nbytes += nbytes
+            self._evict()
+        return True
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self._pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self.tables.clear()
+            self.nbytes = 0
+
+    def resize(self, max_bytes, max_entry_bytes=None):
+        with self.lock:
+            (self.max_bytes, self.max_entry_bytes) = (max_bytes, max_entry_bytes)
+            self._evict()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.tables),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _pop(self, key, default=None):
+        if (table := self.tables.pop(key, None)) is None:
+            return default
+        self.nbytes -= table.nbytes
+        return table
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes:
+            (_, table) = self.tables.popitem(last=False)
+            self.nbytes -= table.nbytes
+            self.evictions += 1
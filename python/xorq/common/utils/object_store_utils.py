@@ -0,0 +1,276 @@
+import asyncio
+import datetime
+import fnmatch
+import glob
+import hashlib
+import hmac
+import os
+import threading
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+from attr import (
+    field,
+    frozen,
+)
+from attr.validators import (
+    instance_of,
+    optional,
+)
+
+import xorq as xo
+from xorq.common.utils.aws_utils import make_s3_credentials_defaults
+
+
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+S3_NAMESPACE = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+
+@frozen
+class ObjectStat:
+    url = field(validator=instance_of(str))
+    etag = field(validator=optional(instance_of(str)))
+    size = field(validator=optional(instance_of(int)))
+    last_modified = field(validator=optional(instance_of(str)))
+
+    def to_tuple(self):
+        return (self.url, self.etag, self.size, self.last_modified)
+
+
+class TTLCache:
+    """Thread-safe mapping whose entries are only returned up to `ttl` seconds after they were put"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, key, ttl):
+        with self.lock:
+            match self.entries.get(key):
+                case (put, value) if time.monotonic() - put < ttl:
+                    return value
+                case _:
+                    return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+stat_cache = TTLCache()
+
+
+def is_object_store_url(path):
+    return str(path).startswith(("http://", "https://", "s3://"))
+
+
+def get_s3_region():
+    return os.environ.get("AWS_REGION", "us-east-1")
+
+
+def get_s3_url(bucket, key="", query=None):
+    """The HTTP url of `key` in `bucket`, path-style on AWS_ENDPOINT_URL if it is set"""
+    quoted = urllib.parse.quote(key, safe="/~")
+    if endpoint := os.environ.get("AWS_ENDPOINT_URL"):
+        url = f"{endpoint.rstrip('/')}/{bucket}/{quoted}"
+    else:
+        url = f"https://{bucket}.s3.{get_s3_region()}.amazonaws.com/{quoted}"
+    if query:
+        url += "?" + urllib.parse.urlencode(query, quote_via=urllib.parse.quote)
+    return url
+
+
+def sign_s3_request(method, url, credentials, region, now=None):
+    """The headers of an AWS signature version 4 signed request without a body"""
+    parsed = urllib.parse.urlsplit(url)
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    headers = {
+        "host": parsed.netloc,
+        "x-amz-content-sha256": EMPTY_SHA256,
+        "x-amz-date": amz_date,
+    }
+    if token := credentials.get("aws.session_token"):
+        headers["x-amz-security-token"] = token
+    query = "&".join(
+        f"{urllib.parse.quote(k, safe='-_.~')}={urllib.parse.quote(v, safe='-_.~')}"
+        for k, v in sorted(urllib.parse.parse_qsl(parsed.query, keep_blank_values=True))
+    )
+    signed_headers = ";".join(sorted(headers))
+    canonical_request = "\n".join(
+        (
+            method,
+            parsed.path or "/",
+            query,
+            "".join(f"{k}:{headers[k]}\n" for k in sorted(headers)),
+            signed_headers,
+            EMPTY_SHA256,
+        )
+    )
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join(
+        (
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        )
+    )
+    key = f"AWS4{credentials['aws.secret_access_key']}".encode()
+    for part in (amz_date[:8], region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    headers["Authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={credentials['aws.access_key_id']}/{scope}, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+    del headers["host"]
+    return headers
+
+
+def s3_request(session, method, url):
+    credentials = {
+        **make_s3_credentials_defaults(),
+        "aws.session_token": os.environ.get("AWS_SESSION_TOKEN"),
+    }
+    headers = (
+        sign_s3_request(method, url, credentials, get_s3_region())
+        if credentials["aws.access_key_id"] and credentials["aws.secret_access_key"]
+        # anonymous access, e.g. to a public bucket
+        else {}
+    )
+    return session.request(method, url, headers=headers)
+
+
+def head(session, url):
+    if url.startswith("s3://"):
+        (bucket, key) = split_s3_url(url)
+        resp = s3_request(session, "HEAD", get_s3_url(bucket, key))
+    else:
+        resp = session.head(url, allow_redirects=True)
+    if resp.status_code == 404 and url.startswith("s3://"):
+        # not an object: maybe a prefix
+        return list_s3(session, url.rstrip("/") + "/")
+    resp.raise_for_status()
+    content_length = resp.headers.get("Content-Length")
+    return (
+        ObjectStat(
+            url=url,
+            etag=resp.headers.get("ETag"),
+            size=int(content_length) if content_length is not None else None,
+            last_modified=resp.headers.get("Last-Modified"),
+        ),
+    )
+
+
+def split_s3_url(url):
+    parsed = urllib.parse.urlsplit(url)
+    return (parsed.netloc, parsed.path.lstrip("/"))
+
+
+def list_s3(session, url):
+    """The objects under the prefix, or matching the glob pattern, of the s3 `url`"""
+    (bucket, pattern) = split_s3_url(url)
+    if glob.has_magic(pattern):
+        prefix = pattern[: min(pattern.index(c) for c in "*?[" if c in pattern)]
+    else:
+        (prefix, pattern) = (pattern, None)
+    (stats, token) = ([], None)
+    while True:
+        query = {"list-type": "2", "prefix": prefix}
+        if token:
+            query["continuation-token"] = token
+        resp = s3_request(session, "GET", get_s3_url(bucket, query=query))
+        resp.raise_for_status()
+        root = ET.fromstring(resp.content)
+        for contents in root.iter(f"{S3_NAMESPACE}Contents"):
+            key = contents.findtext(f"{S3_NAMESPACE}Key")
+            if pattern is None or fnmatch.fnmatchcase(key, pattern):
+                stats.append(
+                    ObjectStat(
+                        url=f"s3://{bucket}/{key}",
+                        etag=contents.findtext(f"{S3_NAMESPACE}ETag"),
+                        size=int(contents.findtext(f"{S3_NAMESPACE}Size")),
+                        last_modified=contents.findtext(f"{S3_NAMESPACE}LastModified"),
+                    )
+                )
+        if root.findtext(f"{S3_NAMESPACE}IsTruncated") != "true":
+            break
+        token = root.findtext(f"{S3_NAMESPACE}NextContinuationToken")
+    if not stats:
+        raise FileNotFoundError(url)
+    return tuple(stats)
+
+
+def stat_url(session, url):
+    if url.startswith("s3://") and (
+        url.endswith("/") or glob.has_magic(split_s3_url(url)[1])
+    ):
+        return list_s3(session, url)
+    return head(session, url)
+
+
+async def stat_urls_async(urls, max_workers):
+    import requests
+
+    semaphore = asyncio.Semaphore(max_workers)
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+    with requests.Session() as session:
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        async def run(url):
+            async with semaphore:
+                # requests blocks: each request waits on a thread of its own
+                return await asyncio.to_thread(stat_url, session, url)
+
+        return await asyncio.gather(*map(run, urls))
+
+
+def run_sync(coro):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # called from a running loop, e.g. in a notebook: asyncio.run would fail
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+def fingerprint_urls(urls, ttl=None, max_workers=None):
+    """The (url, etag, size, last_modified) of each object of `urls`
+
+    The HEAD (and, for s3 prefixes and glob patterns, list) requests are made
+    concurrently, their results are reused for `ttl` seconds
+
+    Parameters
+    ----------
+    urls : str | Sequence[str]
+        http(s) urls, s3 urls of objects or prefixes ending with "/", or s3 glob patterns.
+    ttl : float, optional
+        Defaults to xo.options.cache.object_store_ttl.
+    max_workers : int, optional
+        Defaults to xo.options.cache.fingerprint_workers.
+    """
+    if isinstance(urls, str):
+        urls = (urls,)
+    ttl = xo.options.cache.object_store_ttl if ttl is None else ttl
+    max_workers = max_workers or xo.options.cache.fingerprint_workers
+    urls = tuple(map(str, urls))
+    cached = {url: stat_cache.get(url, ttl) for url in urls}
+    missing = tuple(url for url, stats in cached.items() if stats is None)
+    if missing:
+        for url, stats in zip(missing, run_sync(stat_urls_async(missing, max_workers))):
+            stat_cache.put(url, stats)
+            cached[url] = stats
+    return tuple(
+        sorted(
+            {stat.to_tuple() for url in urls for stat in cached[url]},
+        )
+    )
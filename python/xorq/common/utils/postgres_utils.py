@@ -1,6 +1,12 @@
 import os
+import threading
+import weakref
+from abc import (
+    abstractmethod,
+)
 
 import adbc_driver_postgresql.dbapi
+import psycopg2.extensions
 import sqlglot as sg
 import sqlglot.expressions as sge
 import toolz
@@ -13,9 +19,11 @@ from attr.validators import (
     optional,
 )
 
+import xorq as xo
 from xorq.backends.postgres import (
     Backend as PGBackend,
 )
+from xorq.caching import key_memoized
 from xorq.vendor import ibis
 
 
@@ -151,6 +159,133 @@ def get_postgres_n_reltuples(dt):
     return n_reltuples
 
 
+def get_qualified_name(dt):
+    # unqualified names are resolved with the search path, like the queries of the table
+    return sg.table(dt.name, db=dt.namespace.database, quoted=True).sql(
+        dialect="postgres"
+    )
+
+
+# psycopg2 connection -> the lock of the probes switching its autocommit
+probe_locks = weakref.WeakKeyDictionary()
+probe_locks_lock = threading.Lock()
+
+
+def get_probe_lock(con):
+    with probe_locks_lock:
+        return probe_locks.setdefault(con, threading.Lock())
+
+
+@frozen
+class FreshnessProbe:
+    """How to tell whether the rows of a postgres table changed, with a single query"""
+
+    @abstractmethod
+    def get_query(self, dt):
+        """The query, and its parameters, whose result changes whenever the rows of `dt` do"""
+        pass
+
+    def get_token(self, dt):
+        (query, params) = self.get_query(dt)
+        con = dt.source.con
+        with get_probe_lock(con):
+            if con.status != psycopg2.extensions.STATUS_READY:
+                # the statistics are snapshotted once per transaction: drop that snapshot
+                with con.cursor() as cur:
+                    cur.execute("SELECT pg_stat_clear_snapshot()")
+                    cur.execute(query, params)
+                    return cur.fetchall()
+            # don't leave a transaction open behind us
+            (prev_autocommit, con.autocommit) = (con.autocommit, True)
+            try:
+                with con.cursor() as cur:
+                    cur.execute(query, params)
+                    return cur.fetchall()
+            finally:
+                con.autocommit = prev_autocommit
+
+
+@frozen
+class StatsProbe(FreshnessProbe):
+    """The change counters of the cumulative statistics of the table
+
+    The counters are only published once the writing session has been idle
+    for a moment (up to a second), and a rollback still counts as a change.
+    TRUNCATE and VACUUM FULL are detected by the change of the relation file.
+    """
+
+    def get_query(self, dt):
+        query = """
+            SELECT c.relfilenode, s.n_tup_ins, s.n_tup_upd, s.n_tup_del
+            FROM pg_class c
+            LEFT JOIN pg_stat_all_tables s ON s.relid = c.oid
+            WHERE c.oid = to_regclass(%s)
+        """
+        return (query, (get_qualified_name(dt),))
+
+
+@frozen
+class WALProbe(FreshnessProbe):
+    """The position in the write-ahead log: any write to the database changes it
+
+    Never misses a change, but invalidates every table on each write to any of them.
+    """
+
+    def get_query(self, dt):
+        query = """
+            SELECT CASE WHEN pg_is_in_recovery()
+                THEN pg_last_wal_replay_lsn()
+                ELSE pg_current_wal_lsn()
+            END
+        """
+        return (query, ())
+
+
+@frozen
+class UpdatedAtProbe(FreshnessProbe):
+    """The greatest value of a column set on every insert and update, e.g. `updated_at`
+
+    Deletes aren't detected. Tables without the column are probed with `fallback`.
+    The column should be indexed, so that its maximum is cheap to query.
+    """
+
+    column = field(validator=instance_of(str))
+    fallback = field(validator=instance_of(FreshnessProbe), factory=StatsProbe)
+
+    def get_query(self, dt):
+        if self.column not in dt.schema:
+            return self.fallback.get_query(dt)
+        query = sg.select(sge.Max(this=sg.column(self.column, quoted=True))).from_(
+            get_qualified_name(dt)
+        )
+        return (query.sql(dialect="postgres"), ())
+
+
+freshness_probes = {
+    "stats": StatsProbe(),
+    "wal": WALProbe(),
+}
+
+
+def get_freshness_probe():
+    match probe := xo.options.cache.postgres_freshness:
+        case str():
+            return freshness_probes[probe]
+        case FreshnessProbe():
+            return probe
+        case _:
+            raise ValueError(f"unknown postgres freshness probe {probe!r}")
+
+
+def get_postgres_freshness_token(dt):
+    """A token that changes with the rows of `dt`, probed once per execution"""
+    probe = get_freshness_probe()
+    return key_memoized(
+        ("postgres_freshness", dt, probe),
+        lambda: probe.get_token(dt),
+    )
+
+
 def get_postgres_n_scans(dt):
     (con, name, schemaname) = (dt.source, dt.name, dt.namespace.catalog or "public")
     sql = f"""
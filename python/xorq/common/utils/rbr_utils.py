@@ -1,5 +1,10 @@
 import itertools
+import math
+import queue
+import tempfile
+import threading
 import traceback
+import weakref
 
 import pyarrow as pa
 import pyarrow.compute as pc
@@ -39,6 +44,224 @@ def instrument_reader(reader, prefix=""):
     return pa.RecordBatchReader.from_batches(reader.schema, gen(reader))
 
 
+def prefetch_reader(make_reader, schema, max_batches):
+    """Pull the batches of `make_reader()` on a background thread, buffering at most `max_batches`"""
+    return merge_readers((make_reader,), schema, max_batches=max_batches)
+
+
+def merge_readers(make_readers, schema, ordered=False, max_batches=16):
+    """Pull the batches of each of `make_readers` concurrently, on a thread each, as one reader
+
+    With `ordered`, the batches of a reader follow those of the previous one,
+    otherwise they are yielded as they arrive. Each reader buffers at most `max_batches`.
+    """
+    n = len(make_readers)
+    buffers = (
+        tuple(queue.Queue(maxsize=max_batches) for _ in range(n))
+        if ordered
+        else (queue.Queue(maxsize=max_batches * n),) * n
+    )
+    stopped = threading.Event()
+    done = object()
+
+    def put(buffer, item):
+        # give up once the consumer went away so the thread doesn't block forever
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce(make_reader, buffer):
+        try:
+            for batch in make_reader():
+                if not put(buffer, batch):
+                    return
+        except Exception as e:
+            put(buffer, e)
+        else:
+            put(buffer, done)
+
+    def drain(buffer, n_readers):
+        while n_readers:
+            item = buffer.get()
+            if item is done:
+                n_readers -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+
+    def gen():
+        try:
+            if ordered:
+                for buffer in buffers:
+                    yield from drain(buffer, 1)
+            else:
+                yield from drain(buffers[0], n)
+        finally:
+            stopped.set()
+
+    batches = gen()
+    # gen's finally only runs once it started: stop too if the reader is dropped unread
+    weakref.finalize(batches, stopped.set)
+    for make_reader, buffer in zip(make_readers, buffers):
+        threading.Thread(
+            target=produce, args=(make_reader, buffer), daemon=True
+        ).start()
+    return pa.RecordBatchReader.from_batches(schema, batches)
+
+
+def combine_batches(batches):
+    if len(batches) == 1:
+        return batches[0]
+    (batch,) = pa.Table.from_batches(batches).combine_chunks().to_batches()
+    return batch
+
+
+def rechunk_batches(batches, nbytes):
+    """Re-chunk `batches` into batches of about `nbytes` each
+
+    Larger batches are sliced, without copying, smaller consecutive ones are combined
+    """
+    (pending, pending_nbytes) = ([], 0)
+    for batch in batches:
+        if not batch.num_rows:
+            continue
+        row_nbytes = max(batch.nbytes / batch.num_rows, 1)
+        n_rows = max(math.ceil(nbytes / row_nbytes), 1)
+        for offset in range(0, batch.num_rows, n_rows):
+            piece = batch.slice(offset, n_rows)
+            pending.append(piece)
+            # the nbytes of a slice may count all of its buffers
+            pending_nbytes += piece.num_rows * row_nbytes
+            if pending_nbytes >= nbytes:
+                yield combine_batches(pending)
+                (pending, pending_nbytes) = ([], 0)
+    if pending:
+        yield combine_batches(pending)
+
+
+class _SpillBuffer:
+    """The batches shared by the replicas of a `SpillingTee`
+
+    Batches not yet read by every replica are held in memory, up to `max_batches`,
+    past that they are appended to a temp file, each as an Arrow IPC stream of its own
+    so that it carries its dictionaries, and read back from a memory map of it by offset
+    """
+
+    def __init__(self, iterator, n, max_batches, spill_dir=None):
+        self.iterator = iterator
+        self.max_batches = max_batches
+        self.spill_dir = spill_dir
+        self.lock = threading.Lock()
+        self.positions = [0] * n
+        self.n_produced = 0
+        self.exhausted = False
+        self.in_memory = {}
+        self.spilled = {}
+        self.spill_file = None
+        self.spill_map = None
+
+    def produce(self):
+        batch = next(self.iterator)
+        if len(self.in_memory) < self.max_batches:
+            self.in_memory[self.n_produced] = batch
+        else:
+            self.spill(self.n_produced, batch)
+        self.n_produced += 1
+        return batch
+
+    def spill(self, seq, batch):
+        if self.spill_file is None:
+            self.spill_file = tempfile.NamedTemporaryFile(
+                dir=self.spill_dir, suffix=".arrows"
+            )
+        offset = self.spill_file.tell()
+        with pa.ipc.new_stream(self.spill_file, batch.schema) as writer:
+            writer.write_batch(batch)
+        self.spill_file.flush()
+        self.spilled[seq] = (offset, self.spill_file.tell() - offset)
+
+    def get_spill_map(self, end):
+        # the file grows as batches are spilled: map it again once it outgrew the map,
+        # the batches read from the previous one keep it alive
+        if self.spill_map is None or self.spill_map.size() < end:
+            self.spill_map = pa.memory_map(self.spill_file.name)
+        return self.spill_map
+
+    @staticmethod
+    def read_spilled(spill_map, offset, size):
+        # read_at is safe to call from several threads at once, and doesn't copy
+        buf = spill_map.read_at(size, offset)
+        return pa.ipc.open_stream(buf).read_next_batch()
+
+    def release(self):
+        # drop what every replica has already read
+        lowest = min(self.positions)
+        for seq in tuple(self.in_memory):
+            if seq < lowest:
+                del self.in_memory[seq]
+        for seq in tuple(self.spilled):
+            if seq < lowest:
+                del self.spilled[seq]
+        if self.exhausted and lowest == self.n_produced and self.spill_file:
+            self.spill_file.close()
+            (self.spill_map, self.spill_file) = (None, None)
+
+    def get(self, index):
+        seq = self.positions[index]
+        # only producing and the bookkeeping are serialized, reading back spilled batches isn't
+        with self.lock:
+            if seq == self.n_produced:
+                if self.exhausted:
+                    raise StopIteration
+                try:
+                    batch = self.produce()
+                except StopIteration:
+                    self.exhausted = True
+                    self.release()
+                    raise
+            else:
+                batch = self.in_memory.get(seq)
+            if batch is None:
+                (offset, size) = self.spilled[seq]
+                spill_map = self.get_spill_map(offset + size)
+        if batch is None:
+            # our position still holds on to the spilled batch while we read it
+            batch = self.read_spilled(spill_map, offset, size)
+        with self.lock:
+            self.positions[index] += 1
+            self.release()
+        return batch
+
+
+class SpillingTee:
+    """Thread-safe tee of record batches that bounds the memory used by replicas that lag behind
+
+    Each replica reads at its own pace, the batches a slower replica still needs beyond
+    `max_batches` are spilled to disk instead of accumulating in memory
+    """
+
+    def __init__(self, buffer, index):
+        self.buffer = buffer
+        self.index = index
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.buffer.get(self.index)
+
+    @classmethod
+    def tee(cls, iterable, n=2, max_batches=16, spill_dir=None):
+        """tuple of n independent thread-safe iterators"""
+        buffer = _SpillBuffer(iter(iterable), n, max_batches, spill_dir=spill_dir)
+        return tuple(cls(buffer, index) for index in range(n))
+
+
 @excepts_print_exc
 def streaming_split_exchange(
     split_key, f, context, reader, writer, options=None, **kwargs
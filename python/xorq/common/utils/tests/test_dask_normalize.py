@@ -1,14 +1,24 @@
+import functools
 import hashlib
 import pathlib
 import re
+import threading
+import time
 
 import dask
+import pandas as pd
 import pytest
 
 import xorq as xo
 import xorq.common.utils.dask_normalize  # noqa: F401
+import xorq.common.utils.dask_normalize.dask_normalize_expr as dask_normalize_expr
 from xorq.caching import (
     SourceSnapshotStorage,
+    key_memo,
+)
+from xorq.common.utils.dask_normalize.dask_normalize_expr import (
+    StructuralTokenizer,
+    prefetch_leaves,
 )
 from xorq.common.utils.dask_normalize.dask_normalize_utils import (
     patch_normalize_token,
@@ -94,3 +104,68 @@ def test_duckdb_snapshot_key(batting, snapshot):
     storage = SourceSnapshotStorage(source=con)
     actual = storage.get_key(t)
     snapshot.assert_match(actual, "duckdb_snapshot_key.txt")
+
+
+def make_wide_expr(t, n_columns):
+    return t.mutate(
+        **{f"c{i}": (t.a + i) * t.b - xo.literal(i) for i in range(n_columns)}
+    ).filter(lambda t: t.c0 > 0)
+
+
+def test_structural_tokenizer(mocker, monkeypatch):
+    monkeypatch.setattr(xo.options.cache, "tokenizer", "structural")
+    con = xo.connect()
+    t = con.register(pd.DataFrame({"a": [1, 2], "b": [3, 4]}), "structural")
+    other = con.register(pd.DataFrame({"a": [1, 2], "c": [5, 6]}), "other")
+    expr = make_wide_expr(t, 10)
+
+    assert dask.base.tokenize(expr) == dask.base.tokenize(make_wide_expr(t, 10))
+    assert dask.base.tokenize(expr) != dask.base.tokenize(make_wide_expr(t, 11))
+    assert dask.base.tokenize(t.join(other, "a")) != dask.base.tokenize(
+        other.join(t, "a")
+    )
+
+    # the digests are reused while the tables don't change
+    spy = mocker.spy(StructuralTokenizer, "node_digest")
+    first = dask.base.tokenize(expr)
+    assert spy.call_count == 0
+    con.register(pd.DataFrame({"a": [1, 3], "b": [3, 4]}), "structural")
+    assert dask.base.tokenize(expr) != first
+    assert spy.call_count > 0
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("tokenizer", ["structural", "sql"])
+def test_tokenize_wide_expr(tokenizer, monkeypatch):
+    monkeypatch.setattr(xo.options.cache, "tokenizer", tokenizer)
+    # a tokenizer of its own: the digests of other tests aren't reused
+    monkeypatch.setattr(
+        dask_normalize_expr, "structural_tokenizer", StructuralTokenizer()
+    )
+    con = xo.connect()
+    t = con.register(pd.DataFrame({"a": [1, 2], "b": [3, 4]}), "wide")
+    dask.base.tokenize(make_wide_expr(t, 300))
+
+
+def test_prefetch_leaves(monkeypatch):
+    con = xo.connect()
+    tables = [
+        con.register(pd.DataFrame({"a": [i]}), f"prefetched_{i}") for i in range(4)
+    ]
+    expr = functools.reduce(lambda left, right: left.union(right), tables + tables)
+    (lock, running, fetched) = (threading.Lock(), [], [])
+
+    def fetch(dt):
+        with lock:
+            running.append(dt)
+            fetched.append((dt.name, len(running)))
+        time.sleep(0.1)
+        with lock:
+            running.remove(dt)
+
+    monkeypatch.setitem(dask_normalize_expr.leaf_fetchers, "let", fetch)
+    with key_memo():
+        prefetch_leaves(expr, max_workers=2)
+    # once per table, at most two at a time for the one backend
+    assert sorted(name for name, _ in fetched) == [t.op().name for t in tables]
+    assert max(n for _, n in fetched) == 2
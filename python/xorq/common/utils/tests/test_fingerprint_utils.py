@@ -0,0 +1,185 @@
+import os
+import time
+
+import dask
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import xorq as xo
+import xorq.common.utils.dask_normalize  # noqa: F401
+import xorq.common.utils.fingerprint_utils as fingerprint_utils
+from xorq.common.utils.defer_utils import deferred_read_parquet
+from xorq.common.utils.fingerprint_utils import (
+    expand_paths,
+    fingerprint_array,
+    fingerprint_paths,
+    fingerprint_table,
+    persistently_memoized,
+)
+
+
+def test_fingerprint_array():
+    array = pa.array([{"a": [1, 2], "b": "x"}, None, {"a": [], "b": "y"}])
+    same = pa.array([{"a": [1, 2], "b": "x"}, None, {"a": [], "b": "y"}])
+    assert dask.base.tokenize(fingerprint_array(array)) == dask.base.tokenize(
+        fingerprint_array(same)
+    )
+    tokens = {
+        dask.base.tokenize(fingerprint_array(other))
+        for other in (
+            array,
+            array.slice(1),
+            pa.array(["x", "y", "x"]).dictionary_encode(),
+            pa.array(["x", "y", "y"]).dictionary_encode(),
+            pa.array([[("k", 1)]], type=pa.map_(pa.string(), pa.int64())),
+            pa.array([[("k", 2)]], type=pa.map_(pa.string(), pa.int64())),
+        )
+    }
+    assert len(tokens) == 6
+
+
+def test_fingerprint_table_layout():
+    table = pa.table({"a": range(100_000), "b": [str(i) for i in range(100_000)]})
+    rechunked = pa.concat_tables(
+        (table.slice(0, 10), table.slice(10, 70_000), table.slice(70_010))
+    )
+    assert fingerprint_table(table) == fingerprint_table(rechunked)
+    assert fingerprint_table(table.slice(1)) == fingerprint_table(rechunked.slice(1))
+    assert fingerprint_table(table) != fingerprint_table(table.slice(1))
+
+
+def test_fingerprint_same_across_backends():
+    df = pd.DataFrame(
+        {"a": range(10), "b": [str(i) if i % 3 else None for i in range(10)]}
+    )
+    tables = (
+        xo.pandas.connect().create_table("t", df),
+        xo.duckdb.connect().register(pa.Table.from_pandas(df), "t"),
+        xo.datafusion.connect().register(df, "t"),
+    )
+    assert len(set(map(dask.base.tokenize, tables))) == 1
+
+
+@pytest.mark.parametrize("connect", [xo.connect, xo.datafusion.connect])
+def test_fingerprint_memoized(connect, mocker):
+    con = connect()
+    t = con.create_table("fingerprinted", pd.DataFrame({"a": range(10)}))
+    spy = mocker.spy(fingerprint_utils, "fingerprint_batches")
+
+    first = dask.base.tokenize(t)
+    assert dask.base.tokenize(t) == first
+    assert spy.call_count == 1
+
+    # other tables don't invalidate the memo
+    con.raw_sql("CREATE TABLE other AS SELECT 1 AS a").collect()
+    dask.base.tokenize(t)
+    assert spy.call_count == 1
+
+    t = con.create_table(
+        "fingerprinted", pd.DataFrame({"a": range(11)}), overwrite=True
+    )
+    assert dask.base.tokenize(t) != first
+    assert spy.call_count == 2
+
+    con.raw_sql("INSERT INTO fingerprinted VALUES (11)").collect()
+    dask.base.tokenize(t)
+    assert spy.call_count == 3
+
+
+def test_fingerprint_not_memoized(mocker):
+    # tables of other backends are read again on every call
+    con = xo.pandas.connect()
+    t = con.create_table("fingerprinted", pd.DataFrame({"a": range(10)}))
+    spy = mocker.spy(fingerprint_utils, "fingerprint_batches")
+    assert dask.base.tokenize(t) == dask.base.tokenize(t)
+    assert spy.call_count == 2
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.setattr(xo.options.cache, "default_path", tmp_path.joinpath("cache"))
+    path = tmp_path.joinpath("dataset")
+    for i in range(3):
+        path.joinpath(f"b={i}").mkdir(parents=True)
+        pq.write_table(pa.table({"a": [i] * 10}), path.joinpath(f"b={i}", "0.parquet"))
+    path.joinpath(".hidden").touch()
+    path.joinpath("_SUCCESS").touch()
+    return path
+
+
+def test_expand_paths(dataset):
+    files = expand_paths(dataset)
+    assert [path.parent.name for path in files] == ["b=0", "b=1", "b=2"]
+    assert expand_paths(str(dataset.joinpath("*", "*.parquet"))) == files
+    assert expand_paths(files[:2]) == files[:2]
+    with pytest.raises(FileNotFoundError):
+        expand_paths(dataset.joinpath("missing"))
+
+
+@pytest.mark.parametrize("method", ["footer", "content"])
+def test_fingerprint_paths_indexed(dataset, method, mocker):
+    spy = mocker.spy(fingerprint_utils, "fingerprint_file")
+    first = fingerprint_paths(dataset, method=method)
+    assert spy.call_count == 3
+    assert fingerprint_paths(dataset, method=method) == first
+    assert spy.call_count == 3
+
+    # touching a file doesn't change its fingerprint, only has it recomputed
+    (path, *_) = expand_paths(dataset)
+    os.utime(path, ns=(0, 0))
+    assert fingerprint_paths(dataset, method=method) == first
+    assert spy.call_count == 4
+
+    pq.write_table(pa.table({"a": [-1] * 10}), path)
+    assert fingerprint_paths(dataset, method=method) != first
+
+
+def test_tokenize_deferred_read_dataset(dataset):
+    con = xo.connect()
+    expr = deferred_read_parquet(con, str(dataset.joinpath("**", "*.parquet")))
+    first = dask.base.tokenize(expr.op())
+    assert dask.base.tokenize(expr.op()) == first
+
+    dataset.joinpath("b=3").mkdir()
+    pq.write_table(pa.table({"a": [3]}), dataset.joinpath("b=3", "0.parquet"))
+    assert dask.base.tokenize(expr.op()) != first
+
+
+def test_persistently_memoized(tmp_path, monkeypatch, mocker):
+    monkeypatch.setattr(xo.options.cache, "default_path", tmp_path)
+    f = mocker.Mock(return_value=("last_modified", 1))
+
+    # disabled by default
+    assert persistently_memoized("key", f) == ("last_modified", 1)
+    token = persistently_memoized("key", f, ttl=60)
+    assert token == dask.base.tokenize(("last_modified", 1))
+    # as seen by another process
+    fingerprint_utils.get_token_index.cache_clear()
+    assert persistently_memoized("key", f, ttl=60) == token
+    assert f.call_count == 2
+
+    time.sleep(0.1)
+    f.return_value = ("last_modified", 2)
+    assert persistently_memoized("key", f, ttl=0.05) != token
+    assert f.call_count == 3
+
+
+def test_fingerprint_memo_released():
+    con = xo.datafusion.connect()
+    dropped = con.create_table("dropped", pd.DataFrame({"a": range(10)}))
+    replaced = con.create_table("replaced", pd.DataFrame({"a": range(10)}))
+    kept = con.create_table("kept", pd.DataFrame({"a": range(10)}))
+    for t in (dropped, replaced, kept):
+        dask.base.tokenize(t)
+    assert set(fingerprint_utils.registered_fingerprints[con.con]) == {
+        "dropped",
+        "replaced",
+        "kept",
+    }
+
+    con.drop_table("dropped")
+    con.create_table("replaced", pd.DataFrame({"a": range(11)}), overwrite=True)
+    dask.base.tokenize(kept)
+    assert set(fingerprint_utils.registered_fingerprints[con.con]) == {"kept"}
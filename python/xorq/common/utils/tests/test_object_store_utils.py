@@ -0,0 +1,129 @@
+import hashlib
+import http.server
+import threading
+import urllib.parse
+
+import pytest
+
+from xorq.common.utils.object_store_utils import (
+    fingerprint_urls,
+    stat_cache,
+)
+
+
+class ObjectStoreHandler(http.server.BaseHTTPRequestHandler):
+    """A stand-in for an s3 compatible object store: HEAD of objects and ListObjectsV2"""
+
+    objects = {}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        self.requests.append(("HEAD", path, self.headers.get("Authorization")))
+        if (body := self.objects.get(path)) is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", f'"{hashlib.md5(body).hexdigest()}"')
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Last-Modified", "Wed, 01 Jan 2025 00:00:00 GMT")
+        self.end_headers()
+
+    def do_GET(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        self.requests.append(("GET", parsed.path, self.headers.get("Authorization")))
+        bucket = parsed.path.strip("/")
+        prefix = dict(urllib.parse.parse_qsl(parsed.query))["prefix"]
+        contents = "".join(
+            f"<Contents><Key>{key}</Key>"
+            f"<ETag>&quot;{hashlib.md5(body).hexdigest()}&quot;</ETag>"
+            f"<Size>{len(body)}</Size>"
+            "<LastModified>2025-01-01T00:00:00.000Z</LastModified></Contents>"
+            for path, body in sorted(self.objects.items())
+            if (key := path.removeprefix(f"/{bucket}/")) != path
+            and key.startswith(prefix)
+        )
+        body = (
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"{contents}<IsTruncated>false</IsTruncated></ListBucketResult>"
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def object_store(monkeypatch):
+    ObjectStoreHandler.objects = {
+        "/bucket/data/a.parquet": b"a",
+        "/bucket/data/b.parquet": b"bb",
+        "/bucket/data/_SUCCESS": b"",
+    }
+    ObjectStoreHandler.requests = []
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ObjectStoreHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    endpoint = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setenv("AWS_ENDPOINT_URL", endpoint)
+    monkeypatch.delenv("AWS_ACCESS_KEY_ID", raising=False)
+    monkeypatch.delenv("AWS_SECRET_ACCESS_KEY", raising=False)
+    stat_cache.clear()
+    yield endpoint
+    server.shutdown()
+    stat_cache.clear()
+
+
+def test_fingerprint_urls(object_store):
+    urls = (f"{object_store}/bucket/data/a.parquet", "s3://bucket/data/b.parquet")
+    actual = fingerprint_urls(urls)
+    assert [(url, size) for (url, _, size, _) in actual] == [
+        (urls[0], 1),
+        (urls[1], 2),
+    ]
+    assert len(ObjectStoreHandler.requests) == 2
+
+    # reused until the ttl expires
+    assert fingerprint_urls(urls) == actual
+    assert len(ObjectStoreHandler.requests) == 2
+
+    ObjectStoreHandler.objects["/bucket/data/b.parquet"] = b"cc"
+    assert fingerprint_urls(urls, ttl=0) != actual
+    assert fingerprint_urls(urls, ttl=0) != actual
+    assert len(ObjectStoreHandler.requests) == 6
+
+
+@pytest.mark.parametrize(
+    "url",
+    ["s3://bucket/data/", "s3://bucket/data", "s3://bucket/data/*.parquet"],
+)
+def test_fingerprint_s3_prefix(object_store, url):
+    actual = fingerprint_urls(url)
+    expected = (
+        ["s3://bucket/data/a.parquet", "s3://bucket/data/b.parquet"]
+        if url.endswith(".parquet")
+        else [
+            "s3://bucket/data/_SUCCESS",
+            "s3://bucket/data/a.parquet",
+            "s3://bucket/data/b.parquet",
+        ]
+    )
+    assert [url for (url, *_) in actual] == expected
+
+
+def test_fingerprint_s3_signed(object_store, monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "minio")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "minio123")
+    fingerprint_urls("s3://bucket/data/a.parquet")
+    ((method, _, authorization),) = ObjectStoreHandler.requests
+    assert method == "HEAD"
+    assert authorization.startswith("AWS4-HMAC-SHA256 Credential=minio/")
+
+
+def test_fingerprint_missing(object_store):
+    with pytest.raises(FileNotFoundError):
+        fingerprint_urls("s3://bucket/missing")
@@ -0,0 +1,110 @@
+import time
+
+import psycopg2.extensions
+import pytest
+
+import xorq as xo
+from xorq.caching import key_memo
+from xorq.common.utils.dask_normalize.dask_normalize_expr import (
+    get_persistent_key,
+)
+from xorq.common.utils.postgres_utils import (
+    PgADBC,
+    StatsProbe,
+    UpdatedAtProbe,
+    WALProbe,
+    get_postgres_freshness_token,
+)
+
+
+@pytest.fixture
+def to_modify(con):
+    name = "batting_to_probe"
+    con.raw_sql(f'CREATE TABLE "{name}" AS SELECT *, now() AS updated_at FROM batting')
+    yield con.table(name)
+    con.drop_table(name, force=True)
+
+
+def wait_for_change(probe, dt, token):
+    for _ in range(20):
+        # the statistics are published once the writing session is idle
+        time.sleep(0.1)
+        if (new_token := probe.get_token(dt)) != token:
+            return new_token
+    raise AssertionError("token didn't change")
+
+
+@pytest.mark.parametrize(
+    "probe",
+    [StatsProbe(), WALProbe(), UpdatedAtProbe("updated_at")],
+)
+def test_probe_detects_insert(con, to_modify, probe):
+    dt = to_modify.op()
+    token = probe.get_token(dt)
+    assert probe.get_token(dt) == token
+
+    con.raw_sql(
+        f'INSERT INTO "{dt.name}" ("playerID", updated_at) VALUES (\'x\', now())'
+    )
+    wait_for_change(probe, dt, token)
+
+
+def test_probe_detects_truncate(con, to_modify):
+    dt = to_modify.op()
+    token = StatsProbe().get_token(dt)
+    con.raw_sql(f'TRUNCATE "{dt.name}"')
+    assert StatsProbe().get_token(dt) != token
+
+
+def test_freshness_token_memoized(to_modify, mocker):
+    dt = to_modify.op()
+    spy = mocker.spy(StatsProbe, "get_token")
+    with key_memo():
+        first = get_postgres_freshness_token(dt)
+        assert get_postgres_freshness_token(dt) == first
+    assert spy.call_count == 1
+    get_postgres_freshness_token(dt)
+    assert spy.call_count == 2
+
+
+def test_updated_at_probe_fallback(con):
+    dt = con.table("batting").op()
+    assert UpdatedAtProbe("updated_at").get_token(dt) == StatsProbe().get_token(dt)
+
+
+def test_probe_leaves_no_transaction(con):
+    dt = con.table("batting").op()
+    autocommit = con.con.autocommit
+    StatsProbe().get_token(dt)
+    # statistics are cached for the whole of a transaction
+    status = con.con.info.transaction_status
+    assert status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    assert con.con.autocommit == autocommit
+
+
+def test_probe_inside_transaction(con, to_modify):
+    dt = to_modify.op()
+    token = StatsProbe().get_token(dt)
+    with con.con.cursor() as cur:
+        cur.execute("SELECT 1")
+    assert con.con.status != psycopg2.extensions.STATUS_READY
+    try:
+        assert StatsProbe().get_token(dt) == token
+        # the writes of other sessions show once they are published
+        with PgADBC(con).get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f'TRUNCATE "{dt.name}"')
+            conn.commit()
+        assert StatsProbe().get_token(dt) != token
+    finally:
+        con.con.rollback()
+
+
+def test_persistent_key_includes_probe(con, monkeypatch):
+    dt = con.table("batting").op()
+    keys = set()
+    for probe in ("stats", "wal", UpdatedAtProbe("updated_at")):
+        monkeypatch.setattr(xo.options.cache, "postgres_freshness", probe)
+        keys.add(get_persistent_key(dt))
+        assert get_persistent_key(dt) in keys
+    assert len(keys) == 3
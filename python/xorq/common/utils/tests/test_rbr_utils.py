@@ -0,0 +1,112 @@
+import gc
+import itertools
+import threading
+
+import pyarrow as pa
+
+from xorq.common.utils.rbr_utils import (
+    SpillingTee,
+    merge_readers,
+    rechunk_batches,
+)
+
+
+def make_batches(n):
+    return [
+        pa.RecordBatch.from_pydict({"a": [i] * 3, "b": [str(i)] * 3}) for i in range(n)
+    ]
+
+
+def test_spilling_tee_lagging_replica(tmp_path, mocker):
+    batches = make_batches(10)
+    first, second = SpillingTee.tee(batches, 2, max_batches=2, spill_dir=tmp_path)
+
+    assert list(first) == batches
+    # everything past the in-memory window went to disk
+    assert len(first.buffer.in_memory) == 2
+    assert len(first.buffer.spilled) == 8
+    assert list(tmp_path.iterdir())
+
+    spy = mocker.spy(pa, "memory_map")
+    assert list(second) == batches
+    # spilled batches are read back from a memory map of the file, not copied
+    assert spy.call_count >= 1
+    assert not first.buffer.in_memory and not first.buffer.spilled
+    assert not list(tmp_path.iterdir())
+
+
+def test_spilling_tee_dictionary(tmp_path):
+    batches = [
+        batch.set_column(1, "b", batch["b"].dictionary_encode())
+        for batch in make_batches(5)
+    ]
+    first, second = SpillingTee.tee(batches, 2, max_batches=1, spill_dir=tmp_path)
+    assert list(first) == batches
+    assert list(second) == batches
+
+
+def test_spilling_tee_concurrent(tmp_path):
+    batches = make_batches(100)
+    replicas = SpillingTee.tee(batches, 3, max_batches=4, spill_dir=tmp_path)
+    results = [None] * len(replicas)
+
+    def consume(i):
+        results[i] = list(replicas[i])
+
+    threads = [
+        threading.Thread(target=consume, args=(i,)) for i in range(len(replicas))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(result == batches for result in results)
+    assert not list(tmp_path.iterdir())
+
+
+def test_rechunk_batches():
+    large = pa.RecordBatch.from_pydict({"a": list(range(1000))})
+    small = make_batches(10)
+    small = [batch.select(["a"]) for batch in small]
+
+    actual = list(rechunk_batches([large], 800))
+    assert [len(batch) for batch in actual] == [100] * 10
+    assert pa.Table.from_batches(actual).equals(pa.Table.from_batches([large]))
+
+    actual = list(rechunk_batches(small, 40))
+    # 3 rows of 8 bytes each: two batches per chunk
+    assert [len(batch) for batch in actual] == [6] * 5
+    assert pa.Table.from_batches(actual).equals(pa.Table.from_batches(small))
+
+
+def test_merge_readers():
+    batches = make_batches(12)
+    parts = (batches[:4], batches[4:8], batches[8:])
+    schema = batches[0].schema
+
+    def make_reader(part):
+        return lambda: iter(part)
+
+    actual = merge_readers(tuple(map(make_reader, parts)), schema, ordered=True)
+    assert list(actual) == batches
+
+    actual = merge_readers(tuple(map(make_reader, parts)), schema, max_batches=1)
+    assert sorted(actual, key=lambda batch: batch["a"][0].as_py()) == batches
+
+
+def test_merge_readers_unconsumed():
+    (batch,) = make_batches(1)
+    released = threading.Event()
+
+    def make_reader():
+        try:
+            yield from itertools.repeat(batch)
+        finally:
+            released.set()
+
+    reader = merge_readers((make_reader,), batch.schema, max_batches=1)
+    assert not released.wait(0.2)
+    del reader
+    gc.collect()
+    assert released.wait(5)
@@ -13,12 +13,154 @@ class Cache(Config):
 
     default_path : str
 
+    key_prefix : str
+
+    max_workers : int
+        Maximum number of independent cached expressions to materialize
+        concurrently. Defaults to 1, which materializes them one at a time.
+
+    read_fingerprint : str
+        How the local files of deferred reads are fingerprinted: "stat" uses
+        their modification time and size, "footer" the metadata of parquet
+        files (row counts and row group statistics) and "content" a hash of
+        their bytes. The latter two are kept in an index under `default_path`,
+        keyed by the modification time and size of each file.
+
+    fingerprint_workers : int
+        Maximum number of threads used to stat and fingerprint the files of a
+        deferred read, or of concurrent requests for the objects of an object
+        store.
+
+    object_store_ttl : float
+        Number of seconds for which the ETags of http(s) and s3 objects are
+        reused, rather than requested again.
+
+    table_token_ttl : float
+        Number of seconds for which the tokens of warehouse tables (postgres,
+        snowflake, bigquery), which take a round-trip to compute, are kept in
+        an index under `default_path` and reused by every process sharing it.
+        0 disables the index.
+
+    leaf_workers : int
+        Maximum number of concurrent round-trips per backend (e.g. freshness
+        queries to postgres, snowflake or bigquery, or HEAD requests to an
+        object store) made to compute a cache key. Set to 1 to make them one
+        at a time.
+
+    tokenizer : str
+        How expressions are tokenized into cache keys: "sql" compiles them to
+        SQL first, "structural" hashes their op graph node by node. The keys
+        of the two differ, so switching invalidates existing cache entries.
+
+    postgres_freshness : str | FreshnessProbe
+        How to tell that the rows of a postgres table changed: "stats" uses
+        the change counters of the table's statistics, "wal" the position in
+        the write-ahead log. A `FreshnessProbe` of
+        `xorq.common.utils.postgres_utils`, such as
+        `UpdatedAtProbe("updated_at")`, can be given instead.
+        "stats" can lag a write by about a second: postgres only publishes
+        the statistics of a session once it has been idle for a moment, so
+        a cached expression run right after a write may still hit its
+        previous entry. Use "wal" or an `UpdatedAtProbe` when reads must
+        see the writes that just preceded them.
+
     """
 
     default_path: Union[str, pathlib.Path] = pathlib.Path(
         "~/.local/share/xorq"
     ).expanduser()
     key_prefix: str = "letsql_cache-"
+    max_workers: int = 1
+    read_fingerprint: str = "stat"
+    fingerprint_workers: int = 8
+    object_store_ttl: float = 60.0
+    table_token_ttl: float = 0.0
+    leaf_workers: int = 8
+    tokenizer: str = "sql"
+    postgres_freshness: Any = "stats"
+
+
+class IntoBackend(Config):
+    """Options controlling how the sources of `into_backend` are read
+
+    Attributes
+    ----------
+    prefetch : bool
+        Whether to read each remote source on its own thread, so that
+        network-bound sources are fetched concurrently.
+
+    prefetch_batches : int
+        Maximum number of record batches buffered per remote source when
+        prefetching.
+
+    tee_batches : int
+        Maximum number of record batches held in memory for a remote source
+        that is referenced more than once, the batches a slower reader still
+        needs beyond that are spilled to a temporary file.
+
+    """
+
+    prefetch: bool = False
+    prefetch_batches: int = 8
+    tee_batches: int = 16
+
+
+class ResultCache(Config):
+    """Options controlling the in-process cache of `execute` / `to_pyarrow` results
+
+    Results are keyed by a snapshot of the expression: like `SnapshotStorage`,
+    changes to the data of an unchanged table are not detected.
+
+    Attributes
+    ----------
+    enabled : bool
+        Whether to reuse the result of an identical expression.
+
+    max_bytes : int
+        Maximum total size of the cached results, the least recently used
+        results are evicted beyond it.
+
+    max_entry_bytes : int
+        Results larger than this are never cached.
+
+    """
+
+    enabled: bool = False
+    max_bytes: int = 256 * 2**20
+    max_entry_bytes: int = 64 * 2**20
+
+
+class Flight(Config):
+    """Options controlling Flight clients and the servers of `flight_expr` and `flight_udxf`
+
+    Attributes
+    ----------
+    ready_backoff : float
+        Number of seconds a client waits before sending its server a second
+        healthcheck, doubled after each one that fails.
+
+    ready_max_backoff : float
+        Maximum number of seconds a client waits between healthchecks.
+
+    ready_timeout : float
+        Number of seconds after which a client gives up on its server being
+        ready.
+
+    pool_servers : bool
+        Whether to keep the servers running between executions, with their
+        exchangers registered, rather than starting one per execution.
+
+    server_idle_timeout : float
+        Number of seconds after which a pooled server that isn't used is shut
+        down.
+
+    """
+
+    ready_backoff: float = 0.005
+    ready_max_backoff: float = 0.5
+    ready_timeout: float = 60.0
+    pool_servers: bool = False
+    server_idle_timeout: float = 60.0
 
 
 class Interactive(Config):
@@ -147,6 +289,12 @@ class Options(Config):
     ----------
     cache : Cache
         Options controlling caching.
+    into_backend : IntoBackend
+        Options controlling how the sources of `into_backend` are read.
+    result_cache : ResultCache
+        Options controlling the in-process cache of execution results.
+    flight : Flight
+        Options controlling the Flight servers of exchanges.
     backend : Optional[xorq.backends.let.Backend]
         The backend to use for execution.
     repr : Repr
@@ -154,6 +302,9 @@ class Options(Config):
     """
 
     cache: Cache = Cache()
+    into_backend: IntoBackend = IntoBackend()
+    result_cache: ResultCache = ResultCache()
+    flight: Flight = Flight()
     backend: Optional[Any] = None
     repr: Repr = Repr()
     sql: SQL = SQL()
@@ -2,27 +2,42 @@
 
 from __future__ import annotations
 
+import contextlib
+import contextvars
 import functools
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from graphlib import TopologicalSorter
 from pathlib import Path
+from time import perf_counter
 from typing import TYPE_CHECKING, Any, Mapping
 
 import pyarrow as pa
 import pyarrow.dataset as ds
 
+import xorq.vendor.ibis.expr.operations as _ops
 import xorq.vendor.ibis.expr.types as ir
 from xorq.common.utils.caching_utils import find_backend
 from xorq.common.utils.defer_utils import rbr_wrapper
+from xorq.common.utils.graph_utils import walk_nodes
+from xorq.common.utils.logging_utils import get_logger
+from xorq.common.utils.lru_utils import ArrowLRUCache
 from xorq.expr.ml import (
     calc_split_column,
     train_test_splits,
 )
 from xorq.expr.relations import (
     CachedNode,
+    FlightExpr,
+    FlightUDXF,
+    RemoteTable,
     register_and_transform_remote_tables,
+    thread_safe_backend_names,
 )
 from xorq.vendor.ibis.backends.sql.dialects import DataFusion
 from xorq.vendor.ibis.expr import api
 from xorq.vendor.ibis.expr.api import *  # noqa: F403
+from xorq.vendor.ibis.expr.operations.udf import AggUDF, ScalarUDF
 from xorq.vendor.ibis.expr.sql import SQLString
 from xorq.vendor.ibis.expr.types import Table
 
@@ -37,6 +52,9 @@ if TYPE_CHECKING:
     from xorq.vendor.ibis.expr.schema import SchemaLike
 
 
+logger = get_logger(__name__)
+
+
 __all__ = (
     "execute",
     "calc_split_column",
@@ -323,18 +341,140 @@ def to_sql(expr: ir.Expr, pretty: bool = True) -> SQLString:
     return SQLString(_cached_with_op(expr.unbind().op(), pretty))
 
 
+def _find_topmost_cached_nodes(op):
+    for node in op.find_topmost((CachedNode, RemoteTable)):
+        if isinstance(node, RemoteTable):
+            yield from _find_topmost_cached_nodes(node.remote_expr.op())
+        else:
+            yield node
+
+
+def _make_cached_node_dag(op):
+    """Map each cache node that must be visited to the cache nodes it depends on
+
+    We don't descend into nodes that are already cached: their inputs never need to be computed
+    """
+    dag = {}
+    rest = list(dict.fromkeys(_find_topmost_cached_nodes(op)))
+    while rest:
+        node = rest.pop()
+        if node in dag:
+            continue
+        if node.storage.exists(node.parent):
+            dag[node] = ()
+        else:
+            dag[node] = tuple(
+                dict.fromkeys(_find_topmost_cached_nodes(node.parent.op()))
+            )
+            rest.extend(dag[node])
+    return dag
+
+
+_backend_locks = {}
+_backend_locks_lock = threading.Lock()
+_local = threading.local()
+
+
+def _mark_worker_thread():
+    _local.is_worker = True
+
+
+def _get_backend_lock(backend):
+    with _backend_locks_lock:
+        return _backend_locks.setdefault(backend, threading.RLock())
+
+
+@contextlib.contextmanager
+def _lock_thread_unsafe_backends(node):
+    backends = {node.storage.source, *node.parent.ls.backends}
+    locks = tuple(
+        _get_backend_lock(backend)
+        for backend in sorted(backends, key=id)
+        if backend.name not in thread_safe_backend_names
+    )
+    with contextlib.ExitStack() as stack:
+        for lock in locks:
+            stack.enter_context(lock)
+        yield
+
+
+def _set_default_cached_node(node):
+    start = perf_counter()
+    uncached, storage = node.parent, node.storage
+    with _lock_thread_unsafe_backends(node):
+        result = storage.set_default(uncached, uncached.op())
+    elapsed = perf_counter() - start
+    logger.info(
+        "materialized cached node",
+        storage=type(storage).__name__,
+        elapsed=elapsed,
+    )
+    return result, elapsed
+
+
+def _materialize_cached_nodes(op, max_workers=None):
+    """Materialize the cache nodes of `op`, running independent nodes concurrently
+
+    A cache node is only submitted once all of the cache nodes nested in its parent are done
+
+    Returns
+    -------
+    tuple[dict, dict]
+        The materialized op and the elapsed seconds for each cache node
+    """
+    if max_workers is None:
+        from xorq.config import options
+
+        max_workers = options.cache.max_workers
+
+    dag = _make_cached_node_dag(op)
+    (results, timings) = ({}, {})
+    # nested materializations run inline: the worker already holds the locks for its backends
+    if max_workers == 1 or getattr(_local, "is_worker", False):
+        for node in TopologicalSorter(dag).static_order():
+            results[node], timings[node] = _set_default_cached_node(node)
+        return results, timings
+
+    sorter = TopologicalSorter(dag)
+    sorter.prepare()
+    with ThreadPoolExecutor(
+        max_workers=max_workers, initializer=_mark_worker_thread
+    ) as executor:
+        futures = {}
+        while sorter.is_active():
+            for node in sorter.get_ready():
+                # each task runs in a copy of our context so that it shares the key memo
+                context = contextvars.copy_context()
+                future = executor.submit(context.run, _set_default_cached_node, node)
+                futures[future] = node
+            (done, _) = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = futures.pop(future)
+                try:
+                    results[node], timings[node] = future.result()
+                except Exception:
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                sorter.done(node)
+    return results, timings
+
+
 def _register_and_transform_cache_tables(expr):
-    """This function will sequentially execute any cache node that is not already cached"""
+    """This function will execute any cache node that is not already cached
+
+    Independent cache nodes are materialized concurrently, nested cache nodes before their parents
+    """
+    op = expr.op()
+    (results, _) = _materialize_cached_nodes(op)
 
     def fn(node, kwargs):
         if kwargs:
             node = node.__recreate__(kwargs)
         if isinstance(node, CachedNode):
-            uncached, storage = node.parent, node.storage
-            node = storage.set_default(uncached, uncached.op())
+            node = results[node]
         return node
 
-    op = expr.op()
     out = op.replace(fn)
 
     return out.to_expr()
@@ -361,9 +501,76 @@ def _transform_deferred_reads(expr):
     return expr, dt_to_read
 
 
+# results of `execute` / `to_pyarrow`, see `options.result_cache`
+result_cache = ArrowLRUCache(max_bytes=0)
+
+
+def _is_deterministic(expr):
+    """Whether executing `expr` twice is guaranteed to produce the same result"""
+    # walk_nodes recurses into the expressions of cached nodes and remote tables
+    nodes = walk_nodes(
+        (
+            CachedNode,
+            RemoteTable,
+            _ops.Impure,
+            _ops.TimestampNow,
+            _ops.DateNow,
+            _ops.Sample,
+            ScalarUDF,
+            AggUDF,
+            FlightExpr,
+            FlightUDXF,
+        ),
+        expr,
+    )
+    for node in nodes:
+        match node:
+            case ScalarUDF() | AggUDF():
+                config = getattr(node, "__config__", {})
+                if config.get("volatility", "volatile") != "immutable":
+                    return False
+            case CachedNode() | RemoteTable():
+                continue
+            case _:
+                return False
+    return True
+
+
+def _get_result_cache_key(expr):
+    from xorq.caching import SnapshotStrategy, get_key_lock
+
+    with get_key_lock:
+        return SnapshotStrategy().get_key(expr)
+
+
+def _to_pyarrow_table(expr: ir.Expr, **kwargs: Any):
+    """Execute `expr`, reusing the result of an identical earlier execution when the result cache is enabled"""
+    from xorq.config import options
+
+    config = options.result_cache
+    # only chunk_size is known to not affect the result
+    if (
+        not config.enabled
+        or set(kwargs).difference(("chunk_size",))
+        or not _is_deterministic(expr)
+    ):
+        return to_pyarrow_batches(expr, **kwargs).read_all()
+    try:
+        key = _get_result_cache_key(expr)
+    except Exception:
+        logger.debug("result cache bypassed: expr can't be tokenized", exc_info=True)
+        return to_pyarrow_batches(expr, **kwargs).read_all()
+
+    result_cache.resize(config.max_bytes, config.max_entry_bytes)
+    if (table := result_cache.get(key)) is None:
+        table = to_pyarrow_batches(expr, **kwargs).read_all()
+        result_cache.put(key, table)
+    return table
+
+
 def execute(expr: ir.Expr, **kwargs: Any):
-    batch_reader = to_pyarrow_batches(expr, **kwargs)
-    return expr.__pandas_result__(batch_reader.read_pandas(timestamp_as_object=True))
+    table = _to_pyarrow_table(expr, **kwargs)
+    return expr.__pandas_result__(table.to_pandas(timestamp_as_object=True))
 
 
 def _transform_expr(expr):
@@ -379,12 +586,13 @@ def to_pyarrow_batches(
     chunk_size: int = 1_000_000,
     **kwargs: Any,
 ):
-    from xorq.expr.relations import FlightExpr, FlightUDXF
-
     if isinstance(expr.op(), (FlightExpr, FlightUDXF)):
         # TODO: verify correct caching behavior
         return expr.op().to_rbr()
-    (expr, created) = _transform_expr(expr)
+    from xorq.caching import key_memo
+
+    with key_memo():
+        (expr, created) = _transform_expr(expr)
     con, _ = find_backend(expr.op(), use_default=True)
 
     reader = con.to_pyarrow_batches(expr, chunk_size=chunk_size, **kwargs)
@@ -400,8 +608,7 @@ def to_pyarrow_batches(
 
 
 def to_pyarrow(expr: ir.Expr, **kwargs: Any):
-    batch_reader = to_pyarrow_batches(expr, **kwargs)
-    arrow_table = batch_reader.read_all()
+    arrow_table = _to_pyarrow_table(expr, **kwargs)
     return expr.__pyarrow_result__(arrow_table)
 
 
@@ -1,5 +1,5 @@
 import functools
-from collections import defaultdict
+from collections import Counter, defaultdict
 from typing import Any, Callable
 
 import pyarrow as pa
@@ -7,8 +7,10 @@ import toolz
 
 import xorq as xo
 from xorq.common.utils.rbr_utils import (
+    SpillingTee,
     copy_rbr_batches,
     instrument_reader,
+    prefetch_reader,
 )
 from xorq.vendor import ibis
 from xorq.vendor.ibis import Expr, Schema
@@ -18,6 +20,10 @@ from xorq.vendor.ibis.expr import operations as ops
 from xorq.vendor.ibis.expr.operations import Node, Relation
 
 
+# backends whose connections can be used from several threads at once
+thread_safe_backend_names = ("let", "postgres", "snowflake", "trino", "bigquery")
+
+
 def replace_cache_table(node, kwargs):
     if kwargs:
         node = node.__recreate__(kwargs)
@@ -34,34 +40,6 @@ def legacy_replace_cache_table(node, _, **kwargs):
     return replace_cache_table(node, (kwargs or dict(zip(node.argnames, node.args))))
 
 
-# https://stackoverflow.com/questions/6703594/is-the-result-of-itertools-tee-thread-safe-python
-class SafeTee(object):
-    """tee object wrapped to make it thread-safe"""
-
-    def __init__(self, teeobj, lock):
-        self.teeobj = teeobj
-        self.lock = lock
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        with self.lock:
-            return next(self.teeobj)
-
-    def __copy__(self):
-        return SafeTee(self.teeobj.__copy__(), self.lock)
-
-    @classmethod
-    def tee(cls, iterable, n=2):
-        """tuple of n independent thread-safe iterators"""
-        from itertools import tee
-        from threading import Lock
-
-        lock = Lock()
-        return tuple(cls(teeobj, lock) for teeobj in tee(iterable, n))
-
-
 def recursive_update(obj, replacements):
     if isinstance(obj, Node):
         if obj in replacements:
@@ -184,10 +162,10 @@ class FlightExpr(ops.DatabaseTable):
         )
 
     def to_rbr(self, do_instrument_reader=None):
-        from xorq.flight.action import AddExchangeAction
         from xorq.flight.exchanger import (
             UnboundExprExchanger,
         )
+        from xorq.flight.pool import exchange_client
 
         if do_instrument_reader is None:
             do_instrument_reader = self.do_instrument_reader
@@ -196,16 +174,10 @@ class FlightExpr(ops.DatabaseTable):
             rbr_in = flight_exchange.input_expr.to_pyarrow_batches()
             if do_instrument_reader:
                 rbr_in = instrument_reader(rbr_in, "input: ")
-            with flight_exchange.make_server() as server:
-                client = server.client
-                unbound_expr_exchanger = UnboundExprExchanger(
-                    flight_exchange.unbound_expr
-                )
-                client.do_action(
-                    AddExchangeAction.name,
-                    unbound_expr_exchanger,
-                    options=client._options,
-                )
+            unbound_expr_exchanger = UnboundExprExchanger(flight_exchange.unbound_expr)
+            with exchange_client(
+                flight_exchange.make_server, unbound_expr_exchanger
+            ) as client:
                 (fut, rbr_out) = client.do_exchange(
                     unbound_expr_exchanger.command, rbr_in
                 )
@@ -286,7 +258,7 @@ class FlightUDXF(ops.DatabaseTable):
         )
 
     def to_rbr(self, do_instrument_reader=None):
-        from xorq.flight.action import AddExchangeAction
+        from xorq.flight.pool import exchange_client
 
         if do_instrument_reader is None:
             do_instrument_reader = self.do_instrument_reader
@@ -295,13 +267,7 @@ class FlightUDXF(ops.DatabaseTable):
             rbr_in = flight_udxf.input_expr.to_pyarrow_batches()
             if do_instrument_reader:
                 rbr_in = instrument_reader(rbr_in, "input: ")
-            with flight_udxf.make_server() as server:
-                client = server.client
-                client.do_action(
-                    AddExchangeAction.name,
-                    self.udxf,
-                    options=client._options,
-                )
+            with exchange_client(flight_udxf.make_server, self.udxf) as client:
                 (fut, rbr_out) = client.do_exchange(self.udxf.command, rbr_in)
                 if do_instrument_reader:
                     rbr_out = instrument_reader(rbr_out, "output: ")
@@ -373,6 +339,25 @@ class Read(ops.Relation):
         )
 
 
+def get_prefetchable_remote_tables(remote_tables):
+    """The remote tables that can be read on their own thread
+
+    A backend that isn't thread safe can only be read from a thread if no other remote table uses it
+    """
+    if not xo.options.into_backend.prefetch:
+        return frozenset()
+    backendss = {rt: set(rt.remote_expr.ls.backends) for rt in remote_tables}
+    counts = Counter(backend for backends in backendss.values() for backend in backends)
+    return frozenset(
+        rt
+        for rt, backends in backendss.items()
+        if all(
+            backend.name in thread_safe_backend_names or counts[backend] == 1
+            for backend in backends
+        )
+    )
+
+
 def register_and_transform_remote_tables(expr):
     created = {}
 
@@ -388,15 +373,24 @@ def register_and_transform_remote_tables(expr):
                 if isinstance(arg, RemoteTable):
                     counts[arg] += 1
 
+    prefetchable = get_prefetchable_remote_tables(counts)
     batches_table = {}
     for arg, count in counts.items():
         ex = arg.remote_expr
         if not ex.op().find((RemoteTable, CachedNode, Read)):
-            batches = ex.to_pyarrow_batches()  # execute in native backend
+            make_reader = ex.to_pyarrow_batches  # execute in native backend
         else:
-            batches = xo.to_pyarrow_batches(ex)
+            make_reader = functools.partial(xo.to_pyarrow_batches, ex)
         schema = ex.as_table().schema().to_pyarrow()
-        replicas = SafeTee.tee(batches, count)
+        if arg in prefetchable:
+            batches = prefetch_reader(
+                make_reader, schema, xo.options.into_backend.prefetch_batches
+            )
+        else:
+            batches = make_reader()
+        replicas = SpillingTee.tee(
+            batches, count, max_batches=xo.options.into_backend.tee_batches
+        )
         batches_table[arg] = (schema, list(replicas))
 
     def mark_remote_table(node):
@@ -92,6 +92,11 @@ class FlightServer:
         root_certificates=None,
         auth: BasicAuth = None,
         connection=xo.connect,
+        batch_nbytes=None,
+        ticket_ttl=300,
+        keep_results=False,
+        max_result_bytes=256 * 2**20,
+        spool_dir=None,
     ):
         self.flight_url = flight_url
         self.certificate_path = certificate_path
@@ -107,6 +112,11 @@ class FlightServer:
             connection,
             flight_url.to_location(),
             verify_client=verify_client,
+            batch_nbytes=batch_nbytes,
+            ticket_ttl=ticket_ttl,
+            keep_results=keep_results,
+            max_result_bytes=max_result_bytes,
+            spool_dir=spool_dir,
             **self.auth_kwargs,
         )
 
@@ -138,6 +138,22 @@ class Backend(SQLBackend):
 
         return self.table(table_name)
 
+    def insert(
+        self,
+        table_name: str,
+        obj: pd.DataFrame | pa.Table | ir.Table,
+        schema: str | None = None,
+        database: str | None = None,
+        overwrite: bool = False,
+    ) -> None:
+        if isinstance(obj, pd.DataFrame):
+            obj = pa.Table.from_pandas(obj)
+        if isinstance(obj, pa.Table):
+            obj = obj.to_reader()
+        if isinstance(obj, ir.Table):
+            obj = obj.to_pyarrow_batches()
+        self.con.upload_batches(table_name, obj, append=not overwrite)
+
     def list_tables(
         self, like: str | None = None, database: tuple[str, str] | str | None = None
     ) -> list[str]:
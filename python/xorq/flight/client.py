@@ -1,4 +1,6 @@
+import itertools
 import logging
+import os
 import time
 from concurrent.futures import ThreadPoolExecutor
 from queue import Queue
@@ -7,6 +9,10 @@ import pyarrow as pa
 import pyarrow.flight
 from cloudpickle import dumps, loads
 
+import xorq as xo
+from xorq.common.utils.rbr_utils import merge_readers
+from xorq.flight.server import is_ready_in_process
+
 
 executor = ThreadPoolExecutor()
 
@@ -40,8 +46,9 @@ class FlightClient:
             with open(tls_roots, "rb") as root_certs:
                 kwargs["tls_root_certs"] = root_certs.read()
 
-        self._client = pa.flight.FlightClient(f"grpc://{host}:{port}", **kwargs)
-        self._wait_on_healthcheck()
+        location = f"grpc://{host}:{port}"
+        self._client = pa.flight.FlightClient(location, **kwargs)
+        self._wait_on_healthcheck(location)
 
         if username and password:
             token_pair = self._client.authenticate_basic_token(
@@ -51,28 +58,53 @@ class FlightClient:
         else:
             self._options = None
 
-    def _wait_on_healthcheck(self):
-        while True:
+    def _wait_on_healthcheck(self, location):
+        """Wait until the server at `location` is ready
+
+        A server of this process signals it directly, others are sent healthchecks
+        with an exponential backoff until `xo.options.flight.ready_timeout`.
+        """
+        start = time.perf_counter()
+        self.n_probes = 0 if is_ready_in_process(location) else self._probe(location)
+        self.time_to_ready = time.perf_counter() - start
+        logger.info(
+            f"{location} ready in {self.time_to_ready * 1000:.1f} ms"
+            f" after {self.n_probes} healthchecks"
+        )
+
+    def _probe(self, location):
+        options = xo.options.flight
+        deadline = time.perf_counter() + options.ready_timeout
+        action = pa.flight.Action("healthcheck", dumps(""))
+        delay = options.ready_backoff
+        for n_probes in itertools.count(1):
+            remaining = deadline - time.perf_counter()
             try:
-                self.do_action(
-                    "healthcheck",
-                    options=pa.flight.FlightCallOptions(timeout=1),
+                tuple(
+                    self._client.do_action(
+                        action,
+                        options=pa.flight.FlightCallOptions(
+                            timeout=max(min(remaining, 1), 0.001)
+                        ),
+                    )
                 )
-                logger.info("done healthcheck")
-                break
+                return n_probes
+            except pa.flight.FlightUnauthenticatedError:
+                # it answered
+                return n_probes
+            except (pa.flight.FlightUnavailableError, pa.flight.FlightTimedOutError):
+                pass
             except pa.ArrowIOError as e:
-                if "Deadline" in str(e):
-                    logger.info("Server is not ready, waiting...")
-                else:
+                if "Deadline" not in str(e):
                     raise e
-            except pa.flight.FlightUnavailableError:
-                pass
-            except pa.flight.FlightUnauthenticatedError:
-                break
-            finally:
-                n_seconds = 1
-                logger.info(f"Flight server unavailable, sleeping {n_seconds} seconds")
-                time.sleep(n_seconds)
+            if time.perf_counter() + delay > deadline:
+                raise TimeoutError(
+                    f"Flight server at {location} not ready after"
+                    f" {options.ready_timeout} seconds"
+                )
+            logger.info(f"Flight server unavailable, sleeping {delay} seconds")
+            time.sleep(delay)
+            delay = min(delay * 2, options.ready_max_backoff)
 
     def execute_query(self, query):
         """
@@ -88,47 +120,78 @@ class FlightClient:
         batches = self.execute_batches(query)
         return batches.read_all()
 
-    def execute_batches(self, expr, **kwargs):
-        # Get FlightInfo
+    def execute_batches(
+        self, expr, partition_by=None, n_partitions=None, ordered=False, **kwargs
+    ):
+        """
+        Execute an expression and return its results as a RecordBatchReader
+
+        Args:
+            expr: the expression to execute
+            partition_by: a column to split the query on, an endpoint per partition
+            n_partitions: the number of partitions, defaults to the number of CPUs
+            ordered: whether the batches of a partition follow those of the previous
+                one, rather than being merged as they arrive
+
+        Returns:
+            pa.RecordBatchReader
+        """
+        command = {"expr": expr, **kwargs}
+        if partition_by is not None:
+            if kwargs.get("limit") is not None:
+                raise ValueError("limit can't be applied to a partitioned query")
+            command |= {
+                "partition_by": partition_by,
+                "n_partitions": n_partitions or os.cpu_count(),
+            }
         flight_info = self._client.get_flight_info(
-            pa.flight.FlightDescriptor.for_command(
-                dumps(
-                    {
-                        "expr": expr,
-                        **kwargs,
-                    }
-                )
-            ),
+            pa.flight.FlightDescriptor.for_command(dumps(command)),
             options=self._options,
         )
+        return self.read_endpoints(flight_info.endpoints, ordered=ordered)
 
-        # Get the first endpoint
-        endpoint = flight_info.endpoints[0]
+    def read_endpoints(self, endpoints, ordered=False):
+        """Fetch `endpoints` concurrently, merging their batches into one reader"""
+        readers = tuple(
+            self._client.do_get(endpoint.ticket, options=self._options)
+            for endpoint in endpoints
+        )
+        if len(readers) == 1:
+            return readers[0]
 
-        # Get the result
-        reader = self._client.do_get(endpoint.ticket, options=self._options)
+        def make_reader(reader):
+            return lambda: (chunk.data for chunk in reader)
 
-        return reader
+        return merge_readers(
+            tuple(map(make_reader, readers)), readers[0].schema, ordered=ordered
+        )
+
+    @staticmethod
+    def _put_descriptor(table_name, append):
+        return pa.flight.FlightDescriptor.for_path(
+            table_name, "append" if append else "replace"
+        )
 
-    def upload_data(self, table_name, data):
+    def upload_data(self, table_name, data, append=False):
         """
-        Upload data to create or replace a table
+        Upload data to create, replace or append to a table
 
         Args:
             table_name: Name of the table to create
             data: pa.Table containing the data
+            append: whether to append to the table rather than replace it
         """
         writer, _ = self._client.do_put(
-            pa.flight.FlightDescriptor.for_command(table_name.encode("utf-8")),
+            self._put_descriptor(table_name, append),
             data.schema,
             options=self._options,
         )
         writer.write_table(data)
         writer.close()
 
-    def upload_batches(self, table_name, reader):
+    def upload_batches(self, table_name, reader, append=False):
         writer, _ = self._client.do_put(
-            pa.flight.FlightDescriptor.for_command(table_name.encode("utf-8")),
+            self._put_descriptor(table_name, append),
             reader.schema,
             options=self._options,
         )
@@ -1,11 +1,23 @@
+import collections
+import contextlib
 import functools
+import multiprocessing
+import os
+import threading
 import urllib
 from abc import (
     ABC,
     abstractmethod,
 )
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 from typing import Callable
 
+import cloudpickle
 import dask
 import pandas as pd
 import pyarrow as pa
@@ -63,6 +75,96 @@ def streaming_exchange(f, context, reader, writer, options=None, **kwargs):
         writer.write_batch(out)
 
 
+@functools.cache
+def loads_cached(pickled):
+    return cloudpickle.loads(pickled)
+
+
+def call_pickled(pickled_f, *args, **kwargs):
+    return loads_cached(pickled_f)(*args, **kwargs)
+
+
+# max_workers -> the pool of spawned processes the exchanges with it share
+process_pools = {}
+process_pools_lock = threading.Lock()
+
+
+def get_process_pool(max_workers):
+    """The pool of `max_workers` spawned processes, started once and reused across exchanges"""
+    with process_pools_lock:
+        pool = process_pools.get(max_workers)
+        # a pool whose worker died refuses new work: start another
+        if pool is None or pool._broken:
+            pool = process_pools[max_workers] = ProcessPoolExecutor(
+                max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return pool
+
+
+@excepts_print_exc
+def parallel_streaming_exchange(
+    f,
+    context,
+    reader,
+    writer,
+    options=None,
+    max_workers=None,
+    max_in_flight=None,
+    ordered=True,
+    use_processes=False,
+    **kwargs,
+):
+    """Like `streaming_exchange`, with `f` applied to several batches at once
+
+    At most `max_in_flight` batches are read ahead of the ones written, which
+    are written in the order they were read if `ordered`, otherwise as they
+    are done. With `use_processes`, `f` runs in (spawned) processes rather than
+    threads, which holding the GIL requires. The processes are shared by the
+    exchanges, see `get_process_pool`.
+    """
+    max_workers = max_workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * max_workers
+    if use_processes:
+        executor = get_process_pool(max_workers)
+        submit = functools.partial(executor.submit, call_pickled, cloudpickle.dumps(f))
+        # the pool outlives the exchange
+        scope = contextlib.nullcontext()
+    else:
+        executor = ThreadPoolExecutor(max_workers)
+        submit = functools.partial(executor.submit, f)
+        scope = executor
+    started = False
+    pending = collections.deque()
+
+    def write_done(block):
+        nonlocal started, pending
+        if ordered:
+            done = []
+            while pending and (block or pending[0].done()):
+                done.append(pending.popleft())
+                block = False
+        else:
+            (done, not_done) = wait(
+                pending, timeout=None if block else 0, return_when=FIRST_COMPLETED
+            )
+            pending = collections.deque(not_done)
+        for future in done:
+            out = future.result()
+            if not started:
+                writer.begin(out.schema, options=options)
+                started = True
+            writer.write_batch(out)
+
+    with scope:
+        for chunk in (chunk for chunk in reader if chunk.data):
+            if len(pending) >= max_in_flight:
+                write_done(block=True)
+            pending.append(submit(chunk.data, metadata=chunk.app_metadata))
+            write_done(block=False)
+        while pending:
+            write_done(block=True)
+
+
 @excepts_print_exc
 def streaming_expr_exchange(
     unbound_expr, make_connection, context, reader, writer, options=None, **kwargs
@@ -496,6 +598,10 @@ def make_udxf(
     description=None,
     command=None,
     do_wraps=True,
+    max_workers=1,
+    max_in_flight=None,
+    ordered=True,
+    use_processes=False,
 ):
     def process_batch(process_df, batch, metadata=None, **kwargs):
         df = batch.to_pandas()
@@ -503,10 +609,19 @@ def make_udxf(
         return pa.RecordBatch.from_pandas(out)
 
     if do_wraps:
+        exchange = (
+            streaming_exchange
+            if max_workers == 1
+            else functools.partial(
+                parallel_streaming_exchange,
+                max_workers=max_workers,
+                max_in_flight=max_in_flight,
+                ordered=ordered,
+                use_processes=use_processes,
+            )
+        )
         exchange_f = excepts_print_exc(
-            functools.partial(
-                streaming_exchange, functools.partial(process_batch, process_df)
-            ),
+            functools.partial(exchange, functools.partial(process_batch, process_df)),
             Exception,
         )
     else:
@@ -538,7 +653,22 @@ def make_udxf(
             "schema_in_condition": schema_in_condition,
             "calc_schema_out": calc_schema_out,
             "description": description or name,
-            "command": command or dask.base.tokenize(process_df),
+            "command": command
+            or dask.base.tokenize(
+                process_df,
+                # schemas aren't tokenizable, their callable counterparts are
+                *(
+                    str(maybe_schema)
+                    if isinstance(maybe_schema, pa.Schema)
+                    else maybe_schema
+                    for maybe_schema in (maybe_schema_in, maybe_schema_out)
+                ),
+                do_wraps,
+                max_workers,
+                max_in_flight,
+                ordered,
+                use_processes,
+            ),
         },
     )
     return typ
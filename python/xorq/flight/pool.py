@@ -0,0 +1,173 @@
+import atexit
+import contextlib
+import threading
+import time
+from concurrent.futures import Future
+
+import pyarrow as pa
+import pyarrow.flight
+
+import xorq as xo
+from xorq.flight.action import (
+    AddExchangeAction,
+    HealthCheckAction,
+)
+
+
+class WarmServer:
+    def __init__(self, server):
+        self.server = server
+        self.n_users = 0
+        self.used = time.monotonic()
+        # unhealthy: closed once its last user is done
+        self.retired = False
+
+    def is_healthy(self, timeout=1):
+        action = pyarrow.flight.Action(HealthCheckAction.name, b"")
+        options = pyarrow.flight.FlightCallOptions(timeout=timeout)
+        try:
+            tuple(self.server.client._client.do_action(action, options=options))
+        except pa.ArrowException:
+            return False
+        return True
+
+    def register(self, exchanger):
+        # always sent again: it's cheap, and two exchangers may share a command
+        client = self.server.client
+        client.do_action(AddExchangeAction.name, exchanger, options=client._options)
+
+    def close(self):
+        self.server.__exit__(None, None, None)
+
+
+class ServerPool:
+    """Flight servers kept running between exchanges, along with their exchangers
+
+    A server is made per `make_server` and shared by the exchanges using it, each
+    exchange registers its exchanger on it again. A server
+    idle for `xo.options.flight.server_idle_timeout` seconds is shut down, one
+    that fails its healthcheck is replaced.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.servers = {}
+        # make_server -> Future of the server being started by another thread
+        self.starting = {}
+        self.reaper = None
+
+    def take(self, make_server):
+        """The server of `make_server`, with one more user
+
+        The lock is only held for the bookkeeping: the server is started and
+        healthchecked without it, other threads wanting the same server wait for
+        the start
+        """
+        while True:
+            with self.lock:
+                warm = self.servers.get(make_server)
+                starting = self.starting.get(make_server)
+                if warm is not None:
+                    warm.n_users += 1
+                    idle = warm.n_users == 1
+                elif starting is None:
+                    starting = self.starting[make_server] = Future()
+                    break
+            if warm is None:
+                # started by another thread: look again once it is, raising if it failed
+                starting.result()
+            elif not idle or warm.is_healthy():
+                return warm
+            else:
+                self.release(make_server, warm, retire=True)
+        try:
+            warm = WarmServer(make_server())
+        except BaseException as e:
+            with self.lock:
+                del self.starting[make_server]
+            starting.set_exception(e)
+            raise
+        with self.lock:
+            warm.n_users += 1
+            self.servers[make_server] = warm
+            del self.starting[make_server]
+            self.start_reaper()
+        starting.set_result(warm)
+        return warm
+
+    def release(self, make_server, warm, retire=False):
+        with self.lock:
+            warm.n_users -= 1
+            warm.used = time.monotonic()
+            if retire and self.servers.get(make_server) is warm:
+                del self.servers[make_server]
+                warm.retired = True
+            close = warm.retired and not warm.n_users
+        if close:
+            warm.close()
+
+    @contextlib.contextmanager
+    def acquire(self, make_server, exchanger):
+        """A client of the server of `make_server`, on which `exchanger` is registered"""
+        warm = self.take(make_server)
+        try:
+            warm.register(exchanger)
+            yield warm.server.client
+        finally:
+            self.release(make_server, warm)
+
+    def expire(self):
+        """Shut down the servers that have been idle for too long"""
+        timeout = xo.options.flight.server_idle_timeout
+        now = time.monotonic()
+        with self.lock:
+            expired = tuple(
+                (make_server, warm)
+                for make_server, warm in self.servers.items()
+                if not warm.n_users and now - warm.used >= timeout
+            )
+            for make_server, _ in expired:
+                del self.servers[make_server]
+        for _, warm in expired:
+            warm.close()
+
+    def start_reaper(self):
+        def reap():
+            while True:
+                time.sleep(max(xo.options.flight.server_idle_timeout / 2, 0.1))
+                self.expire()
+                with self.lock:
+                    if not self.servers:
+                        self.reaper = None
+                        return
+
+        if self.reaper is None:
+            self.reaper = threading.Thread(target=reap, daemon=True)
+            self.reaper.start()
+
+    def close(self):
+        with self.lock:
+            (servers, self.servers) = (tuple(self.servers.values()), {})
+        for warm in servers:
+            warm.close()
+
+
+server_pool = ServerPool()
+atexit.register(server_pool.close)
+
+
+@contextlib.contextmanager
+def exchange_client(make_server, exchanger):
+    """A client of a server made by `make_server` on which `exchanger` is registered
+
+    The server is taken from `server_pool` if `xo.options.flight.pool_servers`,
+    otherwise it is made for the duration of the context.
+    """
+    if xo.options.flight.pool_servers:
+        with server_pool.acquire(make_server, exchanger) as client:
+            yield client
+    else:
+        with make_server() as server:
+            client = server.client
+            client.do_action(AddExchangeAction.name, exchanger, options=client._options)
+            yield client
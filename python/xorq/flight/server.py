@@ -1,16 +1,34 @@
 import base64
+import collections
+import contextlib
 import logging
 import secrets
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from pathlib import Path
 
 import pyarrow as pa
 import pyarrow.flight
+import pyarrow.parquet as pq
 from cloudpickle import loads
 
 import xorq.flight.action as A
 import xorq.flight.exchanger as E
+from xorq.common.utils.lru_utils import ArrowLRUCache
+from xorq.common.utils.rbr_utils import rechunk_batches
 
 
 logger = logging.getLogger(__name__)
+# the locations of the servers of this process, set once they accept calls
+ready_events = {}
+
+
+def is_ready_in_process(location):
+    """Whether a server of this process is ready at `location`, sparing a client the healthcheck"""
+    return (event := ready_events.get(location)) is not None and event.is_set()
 
 
 class BasicAuthServerMiddlewareFactory(pa.flight.ServerMiddlewareFactory):
@@ -95,7 +113,222 @@ class NoOpAuthHandler(pa.flight.ServerAuthHandler):
         return ""
 
 
+def partition_expr(expr, column, n_partitions):
+    """Split `expr` into `n_partitions` disjoint filters on the values of `column`
+
+    Integer columns are partitioned by their value modulo `n_partitions`, other
+    columns by the hash of their string representation. Nulls fall in the first
+    partition.
+    """
+    table = expr.as_table()
+    values = table[column]
+    if not values.type().is_integer():
+        values = values.cast("string").hash()
+    # the sign of a modulo follows its dividend in SQL
+    buckets = ((values % n_partitions) + n_partitions) % n_partitions
+    return tuple(
+        table.filter(
+            (buckets == i) | values.isnull() if i == 0 else buckets == i,
+        )
+        for i in range(n_partitions)
+    )
+
+
+class PendingQuery:
+    def __init__(self, expr, kwargs):
+        self.expr = expr
+        self.kwargs = kwargs
+        self.used = time.monotonic()
+
+
+class PendingQueries:
+    """The queries of the tickets minted by get_flight_info
+
+    A query is kept for `ttl` seconds after its ticket was last used. With
+    `keep_results`, so is its result once it was read in full: a retried do_get
+    is then answered without executing the query again. The kept results take
+    at most `max_result_bytes`, the least recently used are dropped beyond.
+    """
+
+    prefix = b"xorq-ticket:"
+
+    def __init__(self, ttl, keep_results=False, max_result_bytes=256 * 2**20):
+        self.ttl = ttl
+        self.keep_results = keep_results
+        self.lock = threading.Lock()
+        self.queries = {}
+        self.results = ArrowLRUCache(max_result_bytes)
+
+    def expire(self):
+        now = time.monotonic()
+        for ticket, pending in tuple(self.queries.items()):
+            if now - pending.used > self.ttl:
+                del self.queries[ticket]
+                self.results.pop(ticket)
+
+    def record(self, ticket, schema, batches):
+        """Yield `batches`, keeping them as the result of `ticket` once all are read
+
+        A result too large to be kept stops being accumulated as soon as it is.
+        """
+        (read, nbytes) = ([], 0)
+        for batch in batches:
+            if read is not None:
+                nbytes += batch.nbytes
+                if self.results.fits(nbytes):
+                    read.append(batch)
+                else:
+                    read = None
+            yield batch
+        if read is not None and ticket in self.queries:
+            self.results.put(ticket, pa.Table.from_batches(read, schema=schema))
+
+    def add(self, expr, kwargs):
+        ticket = self.prefix + secrets.token_urlsafe(16).encode()
+        with self.lock:
+            self.expire()
+            self.queries[ticket] = PendingQuery(expr, kwargs)
+        return ticket
+
+    def get(self, ticket):
+        with self.lock:
+            self.expire()
+            if (pending := self.queries.get(ticket)) is not None:
+                pending.used = time.monotonic()
+            return pending
+
+
+class TableSpool:
+    """The tables uploaded with do_put, spooled to parquet files on local disk
+
+    An upload is written as a part file a batch at a time, so the memory it
+    takes is bounded whatever its size. A table is registered as the glob of
+    its parts: appending to it adds a part, replacing it starts a new directory.
+    The directory a table is replaced from is removed once the reads that
+    started before the replace are done, see `acquire`.
+    """
+
+    def __init__(self, spool_dir=None):
+        if spool_dir is None:
+            # removed along with the spool
+            self._tmpdir = tempfile.TemporaryDirectory(prefix="xorq-flight-")
+            spool_dir = self._tmpdir.name
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.tables = {}
+        # bumped on each replace: the readers acquired at each epoch, and the
+        # directories replaced at each epoch
+        self.epoch = 0
+        self.readers = collections.Counter()
+        self.retired = []
+
+    def get_directory(self, table_name, append):
+        """The directory to write an upload to `table_name` to, and whether it is already spooled"""
+        with self.lock:
+            if append and (directory := self.tables.get(table_name)) is not None:
+                return (directory, True)
+        return (Path(tempfile.mkdtemp(dir=self.spool_dir)), False)
+
+    def write(self, directory, schema, batches):
+        if (parts := sorted(directory.glob("*.parquet"))) and not pq.read_schema(
+            parts[0]
+        ).equals(schema):
+            raise ValueError(
+                f"schema {schema} doesn't match the table's {pq.read_schema(parts[0])}"
+            )
+        path = directory / f"part-{time.time_ns()}-{secrets.token_hex(4)}.parquet"
+        # queries may glob the directory while the part is written
+        tmp = path.with_suffix(".tmp")
+        try:
+            with pq.ParquetWriter(tmp, schema) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            raise
+        tmp.rename(path)
+        return path
+
+    def commit(self, table_name, directory):
+        with self.lock:
+            previous = self.tables.get(table_name)
+            self.tables[table_name] = directory
+            if previous is not None and previous != directory:
+                self.epoch += 1
+                self.retired.append((self.epoch, previous))
+            unread = self._pop_unread()
+        for path in unread:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def acquire(self):
+        """Keep the directories spooled so far until the returned callable is called
+
+        The callable can be called more than once.
+        """
+        with self.lock:
+            epoch = self.epoch
+            self.readers[epoch] += 1
+        released = threading.Event()
+
+        def release():
+            with self.lock:
+                if released.is_set():
+                    return
+                released.set()
+                self.readers[epoch] -= 1
+                if not self.readers[epoch]:
+                    del self.readers[epoch]
+                unread = self._pop_unread()
+            for path in unread:
+                shutil.rmtree(path, ignore_errors=True)
+
+        return release
+
+    def _pop_unread(self):
+        # a directory replaced at an epoch is only read by the readers acquired before it
+        oldest = min(self.readers, default=self.epoch)
+        unread = [directory for (epoch, directory) in self.retired if epoch <= oldest]
+        self.retired = [
+            (epoch, directory) for (epoch, directory) in self.retired if epoch > oldest
+        ]
+        return unread
+
+    @staticmethod
+    def get_glob(directory):
+        return str(directory / "*.parquet")
+
+
+def release_after(batches, release):
+    try:
+        yield from batches
+    finally:
+        release()
+
+
+def get_put_target(descriptor):
+    """The table name of a do_put descriptor and whether to append to it
+
+    A command is a table name to replace, a path is a table name and either
+    "replace" or "append".
+    """
+    if descriptor.descriptor_type == pyarrow.flight.DescriptorType.CMD:
+        return (descriptor.command.decode("utf-8"), False)
+    (table_name, *rest) = (part.decode("utf-8") for part in descriptor.path)
+    match rest:
+        case [] | ["replace"]:
+            return (table_name, False)
+        case ["append"]:
+            return (table_name, True)
+        case _:
+            raise ValueError(f"Unknown do_put mode {rest}")
+
+
 class FlightServerDelegate(pyarrow.flight.FlightServerBase):
+    # backends whose connection runs one query at a time: a query's result must
+    # be read before the next one executes
+    serial_backends = ("duckdb",)
+
     def __init__(
         self,
         con_callable,
@@ -105,6 +338,11 @@ class FlightServerDelegate(pyarrow.flight.FlightServerBase):
         root_certificates=None,
         auth_handler=None,
         middleware=None,
+        batch_nbytes=None,
+        ticket_ttl=300,
+        keep_results=False,
+        max_result_bytes=256 * 2**20,
+        spool_dir=None,
     ):
         super(FlightServerDelegate, self).__init__(
             location=location,
@@ -116,27 +354,61 @@ class FlightServerDelegate(pyarrow.flight.FlightServerBase):
         )
         self._conn = con_callable()
         self._location = location
+        self.batch_nbytes = batch_nbytes
+        self._pending = PendingQueries(
+            ticket_ttl, keep_results=keep_results, max_result_bytes=max_result_bytes
+        )
+        self._lock = threading.Lock()
+        self._spool = TableSpool(spool_dir)
         self.exchangers = E.exchangers
         self.actions = A.actions
+        if location is not None:
+            # the server accepts calls once constructed
+            ready_events.setdefault(str(location), threading.Event()).set()
+
+    def _unregister(self):
+        if (event := ready_events.pop(str(self._location), None)) is not None:
+            event.clear()
+
+    def shutdown(self):
+        self._unregister()
+        super().shutdown()
+
+    def __exit__(self, *args):
+        self._unregister()
+        return super().__exit__(*args)
 
     def _make_flight_info(self, query):
         """
-        Create Flight info for a given SQL query
+        Create Flight info for a given SQL query, without executing it
+
+        With `partition_by` and `n_partitions` in the command, the query is split
+        into an endpoint per partition of `partition_by`, see `partition_expr`.
 
         Args:
             query: SQL query string
         """
-        # Execute query to get schema and metadata
         kwargs = loads(query)
         expr = kwargs.pop("expr")
-        result = self._conn.to_pyarrow_batches(expr, **kwargs).read_all()
+        partition_by = kwargs.pop("partition_by", None)
+        n_partitions = kwargs.pop("n_partitions", 1)
+        schema = expr.as_table().schema().to_pyarrow()
+        exprs = (
+            (expr,)
+            if partition_by is None
+            else partition_expr(expr, partition_by, n_partitions)
+        )
         descriptor = pyarrow.flight.FlightDescriptor.for_command(query)
 
-        endpoints = [pyarrow.flight.FlightEndpoint(query, [self._location])]
+        endpoints = [
+            pyarrow.flight.FlightEndpoint(
+                self._pending.add(expr, kwargs), [self._location]
+            )
+            for expr in exprs
+        ]
 
-        return pyarrow.flight.FlightInfo(
-            result.schema, descriptor, endpoints, result.num_rows, result.nbytes
-        )
+        # the number of rows and bytes aren't known until the query is executed
+        return pyarrow.flight.FlightInfo(schema, descriptor, endpoints, -1, -1)
 
     def get_flight_info(self, context, descriptor):
         """
@@ -149,26 +421,84 @@ class FlightServerDelegate(pyarrow.flight.FlightServerBase):
         """
         Execute SQL query and return results
         """
-        kwargs = loads(ticket.ticket)
-        expr = kwargs.pop("expr")
+        if ticket.ticket.startswith(PendingQueries.prefix):
+            pending = self._pending.get(ticket.ticket)
+            if pending is None:
+                raise pyarrow.flight.FlightServerError("Unknown or expired ticket")
+        else:
+            # a ticket made by a client: the pickled command itself
+            kwargs = loads(ticket.ticket)
+            pending = PendingQuery(kwargs.pop("expr"), kwargs)
+        if (table := self._pending.results.get(ticket.ticket)) is not None:
+            return pyarrow.flight.RecordBatchStream(table)
+        # the spooled tables the query reads must outlive a replace while it streams
+        release = self._spool.acquire()
         try:
-            # Execute query and convert to Arrow table
-            result = self._conn.to_pyarrow_batches(expr).read_all()
-            return pyarrow.flight.RecordBatchStream(result)
+            if self._conn.name in self.serial_backends:
+                # e.g. the endpoints of a partitioned query are read concurrently
+                with self._connection_lock():
+                    table = self._conn.to_pyarrow_batches(
+                        pending.expr, **pending.kwargs
+                    ).read_all()
+                reader = table.to_reader()
+                release()
+            else:
+                reader = self._conn.to_pyarrow_batches(pending.expr, **pending.kwargs)
         except Exception as e:
+            release()
             raise pyarrow.flight.FlightServerError(f"Error executing query: {str(e)}")
+        batches = (
+            reader
+            if self.batch_nbytes is None
+            else rechunk_batches(reader, self.batch_nbytes)
+        )
+        if self._pending.keep_results:
+            batches = self._pending.record(ticket.ticket, reader.schema, batches)
+        batches = release_after(batches, release)
+        # a stream the client never reads isn't run to its end
+        weakref.finalize(batches, release)
+        # batches are pulled as the client reads them: gRPC flow control bounds
+        # what is buffered, and the first is sent before the query completes
+        return pyarrow.flight.GeneratorStream(reader.schema, batches)
+
+    def _connection_lock(self):
+        return (
+            self._lock
+            if self._conn.name in self.serial_backends
+            else contextlib.nullcontext()
+        )
 
     def do_put(self, context, descriptor, reader, writer):
         """
-        Handle data upload - creates or updates a table
-        """
-        table_name = descriptor.command.decode("utf-8")
-        data = reader.read_all()
+        Handle data upload - creates, replaces or appends to a table
 
+        The batches are spooled to local disk as they are received, see `TableSpool`
+        """
         try:
-            self._conn.register(data, table_name=table_name)
+            (table_name, append) = get_put_target(descriptor)
+        except ValueError as e:
+            raise pyarrow.flight.FlightServerError(str(e))
+        (directory, spooled) = self._spool.get_directory(table_name, append)
+        try:
+            if append and not spooled and table_name in self._conn.list_tables():
+                # a table that wasn't uploaded: spool what it holds so far
+                with self._connection_lock():
+                    existing = self._conn.to_pyarrow_batches(
+                        self._conn.table(table_name)
+                    )
+                    self._spool.write(directory, existing.schema, existing)
+            self._spool.write(
+                directory, reader.schema, (chunk.data for chunk in reader)
+            )
+            with self._connection_lock():
+                self._conn.read_parquet(
+                    self._spool.get_glob(directory), table_name=table_name
+                )
         except Exception as e:
+            if not spooled:
+                shutil.rmtree(directory, ignore_errors=True)
             raise pyarrow.flight.FlightServerError(f"Error creating table: {str(e)}")
+        self._spool.commit(table_name, directory)
 
     def list_actions(self, context):
         """
@@ -1,11 +1,15 @@
+import concurrent.futures
 import operator
+import threading
 
 import pandas as pd
+import pyarrow as pa
 import pytest
 import toolz
 
 import xorq as xo
 from xorq.expr.udf import make_pandas_udf
+from xorq.flight.exchanger import make_udxf
 
 
 field_name = "price_per_carat"
@@ -98,3 +102,94 @@ def test_flight_udxf(con, diamonds, baseline):
         expected,
         check_exact=False,
     )
+
+
+@pytest.fixture
+def pool_servers():
+    from xorq.flight.pool import server_pool
+
+    (pool, timeout) = (
+        xo.options.flight.pool_servers,
+        xo.options.flight.server_idle_timeout,
+    )
+    xo.options.flight.pool_servers = True
+    yield server_pool
+    server_pool.close()
+    xo.options.flight.pool_servers = pool
+    xo.options.flight.server_idle_timeout = timeout
+
+
+def test_flight_udxf_pooled_server(con, pool_servers, mocker):
+    from xorq.flight import FlightServer, FlightUrl
+    from xorq.flight.action import AddExchangeAction
+
+    made = []
+
+    def make_server():
+        made.append(FlightServer(flight_url=FlightUrl(port=5014)))
+        return made[-1]
+
+    df = pd.DataFrame({"a": range(10), "b": range(10)})
+    t = con.register(df, table_name="pooled")
+    schema_in = t.schema().to_pyarrow()
+    expr = xo.expr.relations.flight_udxf(
+        t,
+        process_df=operator.methodcaller("assign", c=lambda df: df.a + df.b),
+        maybe_schema_in=schema_in,
+        maybe_schema_out=xo.schema(t.schema() | {"c": "int64"}).to_pyarrow(),
+        make_server=make_server,
+        make_udxf_kwargs={"name": "add_columns"},
+        con=con,
+    )
+    spy = mocker.spy(AddExchangeAction, "do_action")
+    for _ in range(3):
+        actual = expr.order_by("a").execute()
+        assert actual.c.tolist() == (df.a + df.b).tolist()
+    # a single warm server, on which the exchanger is registered by every exchange
+    assert len(made) == 1 and spy.call_count == 3
+
+    xo.options.flight.server_idle_timeout = 0.0
+    pool_servers.expire()
+    assert not pool_servers.servers
+
+
+def test_make_udxf_command():
+    schema = pa.schema({"a": pa.int64()})
+    other = pa.schema({"a": pa.int32()})
+
+    def f(df):
+        return df
+    commands = {
+        make_udxf(f, schema, schema).command,
+        make_udxf(f, schema, other).command,
+        make_udxf(f, schema, schema, max_workers=4).command,
+        make_udxf(f, schema, schema, max_workers=4, ordered=False).command,
+    }
+    assert len(commands) == 4
+    assert make_udxf(f, schema, schema).command == make_udxf(f, schema, schema).command
+
+
+def test_server_pool_starts_without_lock(mocker):
+    from xorq.flight.pool import ServerPool
+
+    pool = ServerPool()
+    started = threading.Event()
+    release = threading.Event()
+
+    def make_slow_server():
+        started.set()
+        release.wait()
+        return mocker.MagicMock()
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        slow = executor.submit(pool.take, make_slow_server)
+        started.wait()
+        # another server is made, and used, while the first one is starting
+        with pool.acquire(mocker.MagicMock, mocker.Mock()):
+            pass
+        waiting = executor.submit(pool.take, make_slow_server)
+        assert not waiting.done()
+        release.set()
+        assert slow.result() is waiting.result()
+    assert slow.result().n_users == 2
+    pool.close()
@@ -2,13 +2,16 @@ import datetime
 
 import pandas as pd
 import pyarrow as pa
+import pyarrow.flight
 import pytest
+from cloudpickle import dumps
 
 import xorq as xo
 from xorq.common.utils.rbr_utils import instrument_reader
 from xorq.flight import FlightServer, FlightUrl
 from xorq.flight.action import AddExchangeAction
-from xorq.flight.exchanger import PandasUDFExchanger
+from xorq.flight.exchanger import PandasUDFExchanger, make_udxf, process_pools
+from xorq.flight.server import PendingQueries, TableSpool
 
 
 @pytest.mark.parametrize(
@@ -160,3 +163,276 @@ def test_exchange(connection, port):
         writes_reads = fut.result()
         assert writes_reads["n_writes"] == 1000  # because
         assert writes_reads["n_reads"] == 1000
+
+
+@pytest.mark.parametrize(
+    "connection,port",
+    [
+        pytest.param(xo.duckdb.connect, 5006, id="duckdb"),
+        pytest.param(xo.connect, 5007, id="xorq"),
+    ],
+)
+def test_do_get_streams_batches(connection, port):
+    flight_url = FlightUrl.from_defaults(port=port)
+    assert not flight_url.port_in_use(), f"Port {port} already in use"
+
+    with FlightServer(
+        flight_url=flight_url,
+        verify_client=False,
+        connection=connection,
+        batch_nbytes=8 * 1000,
+    ) as main:
+        client = main.client
+        data = pa.table({"a": range(10_000)})
+        client.upload_data("streamed", data)
+        t = main.con.table("streamed")
+
+        reader = client.execute_batches(t.order_by("a"))
+        batches = [chunk.data for chunk in reader]
+        # about 1000 rows of 8 bytes each, validity bitmaps included
+        (first, *rest, last) = (len(batch) for batch in batches)
+        assert 900 < first <= 1000 and set(rest) == {first} and last <= first
+        assert pa.Table.from_batches(batches).equals(data)
+
+
+@pytest.mark.parametrize(
+    "connection,port",
+    [
+        pytest.param(xo.duckdb.connect, 5008, id="duckdb"),
+        pytest.param(xo.connect, 5009, id="xorq"),
+    ],
+)
+def test_flight_info_doesnt_execute(connection, port, monkeypatch):
+    flight_url = FlightUrl.from_defaults(port=port)
+    assert not flight_url.port_in_use(), f"Port {port} already in use"
+
+    with FlightServer(
+        flight_url=flight_url,
+        verify_client=False,
+        connection=connection,
+        keep_results=True,
+    ) as main:
+        client = main.client
+        data = pa.table({"a": range(100)})
+        client.upload_data("executed_once", data)
+        t = main.con.table("executed_once")
+
+        calls = []
+        con = main.server._conn
+        to_pyarrow_batches = con.to_pyarrow_batches
+
+        def spy(*args, **kwargs):
+            calls.append(args)
+            return to_pyarrow_batches(*args, **kwargs)
+
+        monkeypatch.setattr(con, "to_pyarrow_batches", spy)
+        descriptor = pyarrow.flight.FlightDescriptor.for_command(dumps({"expr": t}))
+        info = client._client.get_flight_info(descriptor, options=client._options)
+        assert info.schema == data.schema
+        assert not calls
+
+        ticket = info.endpoints[0].ticket
+        for _ in range(2):
+            # a retry is answered with the kept result
+            actual = client._client.do_get(ticket, options=client._options).read_all()
+            assert actual.equals(data)
+            assert len(calls) == 1
+
+
+@pytest.mark.parametrize(
+    "connection,port",
+    [
+        pytest.param(xo.duckdb.connect, 5010, id="duckdb"),
+        pytest.param(xo.connect, 5011, id="xorq"),
+    ],
+)
+@pytest.mark.parametrize("partition_by", ["a", "b"])
+def test_partitioned_endpoints(connection, port, partition_by):
+    flight_url = FlightUrl.from_defaults(port=port)
+    assert not flight_url.port_in_use(), f"Port {port} already in use"
+
+    with FlightServer(
+        flight_url=flight_url,
+        verify_client=False,
+        connection=connection,
+    ) as main:
+        client = main.client
+        data = pa.table(
+            {
+                "a": range(-500, 500),
+                "b": [None if i % 7 == 0 else str(i) for i in range(1000)],
+            }
+        )
+        client.upload_data("partitioned", data)
+        t = main.con.table("partitioned")
+
+        command = {"expr": t, "partition_by": partition_by, "n_partitions": 4}
+        flight_info = client._client.get_flight_info(
+            pyarrow.flight.FlightDescriptor.for_command(dumps(command))
+        )
+        assert len(flight_info.endpoints) == 4
+
+        for ordered in (False, True):
+            actual = client.execute_batches(
+                t, partition_by=partition_by, n_partitions=4, ordered=ordered
+            ).read_all()
+            assert actual.sort_by("a").equals(data)
+        if partition_by == "a":
+            # the partitions of an integer column follow their value modulo n
+            assert [a % 4 for a in actual["a"].to_pylist()] == sorted(
+                a % 4 for a in range(-500, 500)
+            )
+
+
+@pytest.mark.parametrize(
+    "connection,port",
+    [
+        pytest.param(xo.duckdb.connect, 5012, id="duckdb"),
+        pytest.param(xo.connect, 5013, id="xorq"),
+    ],
+)
+def test_upload_append(connection, port, tmp_path):
+    flight_url = FlightUrl.from_defaults(port=port)
+    assert not flight_url.port_in_use(), f"Port {port} already in use"
+
+    with FlightServer(
+        flight_url=flight_url,
+        verify_client=False,
+        connection=connection,
+        spool_dir=tmp_path,
+    ) as main:
+        client = main.client
+        data = pa.table({"a": range(100)})
+        client.upload_data("appended", data.slice(0, 60))
+        client.upload_batches("appended", data.slice(60).to_reader(10), append=True)
+        t = main.con.table("appended")
+        assert client.execute_batches(t.order_by("a")).read_all().equals(data)
+
+        # replacing drops the parts uploaded so far
+        client.upload_data("appended", data.slice(0, 10))
+        assert t.count().execute() == 10
+        assert len(tuple(tmp_path.glob("*/*.parquet"))) == 1
+
+        with pytest.raises(pyarrow.flight.FlightServerError, match="schema"):
+            client.upload_data("appended", pa.table({"b": [1]}), append=True)
+        assert t.count().execute() == 10
+
+        # a table that wasn't uploaded is spooled before it is appended to
+        main.server._conn.read_parquet(
+            next(tmp_path.glob("*/*.parquet")), table_name="existing"
+        )
+        main.con.insert("existing", data.slice(10))
+        assert main.con.table("existing").count().execute() == 100
+
+
+def test_kept_results_bounded():
+    data = pa.table({"a": range(1000)})
+    pending = PendingQueries(60, keep_results=True, max_result_bytes=data.nbytes)
+    (first, second, large) = (pending.add(None, {}) for _ in range(3))
+
+    def read(ticket, table):
+        return tuple(pending.record(ticket, table.schema, table.to_batches(100)))
+
+    read(first, data)
+    assert pending.results.get(first).equals(data)
+    read(second, data)
+    # the least recently used is dropped
+    assert first not in pending.results and second in pending.results
+    read(large, pa.concat_tables((data, data)))
+    assert large not in pending.results and second in pending.results
+
+
+def test_spool_replace_while_reading(tmp_path):
+    spool = TableSpool(tmp_path)
+    data = pa.table({"a": [1]})
+
+    def upload():
+        (directory, _) = spool.get_directory("t", append=False)
+        spool.write(directory, data.schema, data.to_batches())
+        spool.commit("t", directory)
+        return directory
+
+    first = upload()
+    release = spool.acquire()
+    second = upload()
+    # a read started before the replace may still glob the first directory
+    assert first.exists()
+    release_later = spool.acquire()
+    release()
+    release()
+    assert not first.exists() and second.exists()
+    release_later()
+    upload()
+    assert not second.exists()
+
+
+def test_client_ready(monkeypatch):
+    from xorq.flight.client import FlightClient
+
+    flight_url = FlightUrl.from_defaults(port=5016)
+    assert not flight_url.port_in_use(), "Port 5016 already in use"
+
+    with FlightServer(flight_url=flight_url, verify_client=False) as main:
+        # signaled by the server of this process
+        assert main.client.n_probes == 0
+
+        monkeypatch.setattr(
+            "xorq.flight.client.is_ready_in_process", lambda location: False
+        )
+        client = FlightClient(port=5016)
+        assert client.n_probes == 1 and client.time_to_ready < 1
+
+
+def test_client_ready_timeout(monkeypatch):
+    from xorq.flight.client import FlightClient
+
+    assert not FlightUrl.from_defaults(port=5017).port_in_use()
+    monkeypatch.setattr(xo.options.flight, "ready_timeout", 0.1)
+    with pytest.raises(TimeoutError):
+        FlightClient(port=5017)
+
+
+@pytest.mark.parametrize(
+    "make_udxf_kwargs,port",
+    [
+        pytest.param({"max_workers": 4}, 5018, id="threads"),
+        pytest.param({"max_workers": 4, "ordered": False}, 5019, id="unordered"),
+        pytest.param({"max_workers": 2, "use_processes": True}, 5020, id="processes"),
+    ],
+)
+def test_parallel_udxf(make_udxf_kwargs, port):
+    flight_url = FlightUrl.from_defaults(port=port)
+    assert not flight_url.port_in_use(), f"Port {port} already in use"
+
+    def process_df(df):
+        return df.assign(c=df.a * 2)
+
+    schema_in = pa.schema((pa.field("a", pa.int64()),))
+    udxf = make_udxf(
+        process_df,
+        schema_in,
+        schema_in.append(pa.field("c", pa.int64())),
+        **make_udxf_kwargs,
+    )
+    with FlightServer(flight_url=flight_url, verify_client=False) as main:
+        client = main.client
+        client.do_action(AddExchangeAction.name, udxf, options=client._options)
+        df_in = pd.DataFrame({"a": range(5_000)})
+        pools = []
+        for _ in range(2):
+            fut, rbr = client.do_exchange_batches(
+                udxf.command,
+                pa.Table.from_pandas(df_in).to_reader(max_chunksize=100),
+            )
+            df_out = rbr.read_pandas()
+            assert fut.result()["n_reads"] == 50
+            pools.append(process_pools.get(make_udxf_kwargs["max_workers"]))
+        if make_udxf_kwargs.get("use_processes"):
+            # the processes are started by the first exchange only
+            assert pools[0] is not None and pools[0] is pools[1]
+
+    if make_udxf_kwargs.get("ordered", True):
+        assert df_out.a.tolist() == df_in.a.tolist()
+    else:
+        df_out = df_out.sort_values("a", ignore_index=True)
+    assert df_out.c.tolist() == (df_in.a * 2).tolist()
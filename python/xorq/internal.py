@@ -1,3 +1,5 @@
+import functools
+import threading
 from abc import ABCMeta, abstractmethod
 from typing import List
 
@@ -23,6 +25,7 @@ from xorq._internal import (
 
 __all__ = [
     "SessionContext",
+    "SynchronizedSessionContext",
     "SessionState",
     "SessionConfig",
     "ContextProvider",
@@ -43,6 +46,39 @@ __all__ = [
 ]
 
 
+def synchronized(method):
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return locked
+
+
+class SynchronizedSessionContext(SessionContext):
+    """A SessionContext that can be shared between threads
+
+    The native context stays borrowed while it plans a query or registers a table with the
+    GIL released, so calls from another thread meanwhile fail with "Already borrowed":
+    we serialize the calls of its methods instead
+    """
+
+    def __init__(self, *args, **kwargs):
+        # the native context is initialized by __new__
+        super().__init__()
+        self._lock = threading.RLock()
+
+
+for name in dir(SessionContext):
+    if not name.startswith("_") and callable(getattr(SessionContext, name)):
+        setattr(
+            SynchronizedSessionContext,
+            name,
+            synchronized(getattr(SessionContext, name)),
+        )
+del name
+
+
 class Accumulator(metaclass=ABCMeta):
     @abstractmethod
     def state(self) -> List[pa.Scalar]:
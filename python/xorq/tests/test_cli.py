@@ -118,3 +118,31 @@ def test_build_command_bad_expr_name(
     # Check output
     captured = capsys.readouterr()
     assert message in captured.err
+
+
+def test_explain_key_command(monkeypatch, tmp_path, capsys):
+    script_path = tmp_path / "cached.py"
+    script_path.write_text(
+        "import pandas as pd\n"
+        "import xorq as xo\n"
+        "from xorq.caching import ParquetStorage\n"
+        "con = xo.connect()\n"
+        f"data = pd.DataFrame({{'a': [1, 2]}})\n"
+        "t = con.register(data, 'explained')\n"
+        f"expr = t.cache(storage=ParquetStorage(source=con, path={str(tmp_path)!r}))\n"
+    )
+    json_path = tmp_path / "key.json"
+
+    args = ["xorq", "explain-key", str(script_path), "-e", "expr"]
+    monkeypatch.setattr(sys, "argv", [*args, "--json", str(json_path)])
+    main()
+    captured = capsys.readouterr()
+    assert captured.out.startswith("key ")
+    assert "DatabaseTable(explained)" in captured.out
+
+    script_path.write_text(script_path.read_text().replace("[1, 2]", "[1, 3]"))
+    monkeypatch.setattr(sys, "argv", [*args, "--diff", str(json_path)])
+    main()
+    captured = capsys.readouterr()
+    assert "key / " in captured.out
+    assert "No differences" not in captured.out
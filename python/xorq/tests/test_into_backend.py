@@ -6,7 +6,11 @@ import pytest
 
 import xorq as xo
 from xorq.caching import ParquetStorage, SourceStorage
-from xorq.expr.relations import register_and_transform_remote_tables
+from xorq.expr.relations import (
+    RemoteTable,
+    get_prefetchable_remote_tables,
+    register_and_transform_remote_tables,
+)
 from xorq.vendor import ibis
 from xorq.vendor.ibis import _
 
@@ -282,3 +286,34 @@ def test_to_pyarrow_batches_simple(pg):
 
     df = expr.to_pyarrow_batches().read_pandas()
     assert not df.empty
+
+
+def test_into_backend_prefetch(monkeypatch):
+    monkeypatch.setattr(xo.options.into_backend, "prefetch", True)
+    monkeypatch.setattr(xo.options.into_backend, "prefetch_batches", 1)
+    (left_con, right_con) = (xo.duckdb.connect(), xo.duckdb.connect())
+    con = xo.connect()
+    left = left_con.create_table(
+        "left", pd.DataFrame({"a": range(100), "b": range(100)})
+    ).into_backend(con, "ls_left")
+    right = right_con.create_table(
+        "right", pd.DataFrame({"a": range(50), "c": range(50)})
+    ).into_backend(con, "ls_right")
+    expr = left.join(right, "a").order_by("a")
+
+    (_, created) = register_and_transform_remote_tables(expr)
+    assert all(source is con for source in created.values())
+    actual = expr.execute()
+    assert len(actual) == 50
+    assert actual.a.tolist() == list(range(50))
+
+
+def test_into_backend_prefetch_shared_unsafe_backend(monkeypatch):
+    monkeypatch.setattr(xo.options.into_backend, "prefetch", True)
+    ddb = xo.duckdb.connect()
+    con = xo.connect()
+    t = ddb.create_table("t", pd.DataFrame({"a": range(10)}))
+    (left, right) = (t.into_backend(con), t.filter(t.a > 5).into_backend(con))
+    remote_tables = left.join(right, "a").op().find(RemoteTable)
+    # both reads use the same duckdb connection: they can't run on their own threads
+    assert not get_prefetchable_remote_tables(remote_tables)